@@ -2,6 +2,7 @@ from rest_framework import authentication
 from rest_framework import exceptions
 from django.conf import settings
 import jwt
+from core.metrics import JWT_AUTH_FAILURES
 from .models import User
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -17,9 +18,13 @@ class JWTAuthentication(authentication.BaseAuthentication):
             # Allow verification tokens to pass through
             token_type = payload.get('token_type')
             if token_type not in ['access', 'verification']:
+                JWT_AUTH_FAILURES.labels('wrong_type').inc()
                 raise exceptions.AuthenticationFailed('Invalid token type')
             
             user = User.objects.get(id=payload['user_id'])
+            if not user.is_active:
+                JWT_AUTH_FAILURES.labels('inactive').inc()
+                raise exceptions.AuthenticationFailed('User is inactive')
             
             # For verification tokens, authenticate but mark as verification
             if token_type == 'verification':
@@ -27,8 +32,13 @@ class JWTAuthentication(authentication.BaseAuthentication):
             
             return (user, token)
         except jwt.ExpiredSignatureError:
+            JWT_AUTH_FAILURES.labels('expired').inc()
             raise exceptions.AuthenticationFailed('Token has expired')
-        except (jwt.InvalidTokenError, User.DoesNotExist):
+        except jwt.InvalidTokenError:
+            JWT_AUTH_FAILURES.labels('invalid').inc()
+            raise exceptions.AuthenticationFailed('Invalid token')
+        except User.DoesNotExist:
+            JWT_AUTH_FAILURES.labels('unknown_user').inc()
             raise exceptions.AuthenticationFailed('Invalid token')
 
     def authenticate_header(self, request):
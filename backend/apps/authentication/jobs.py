@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import transaction
+from apps.files.blobs import enqueue_blob_deletions
+from apps.files.kms import enqueue_key_deletions
+from apps.files.models import File, FileShareLink
+from apps.jobs.registry import job
+from .models import User
+
+
+@job('delete_user', concurrency=1)
+def delete_user(user_id):
+    """Delete a user with their files, share links and keys.
+
+    Files are removed in batches of ``USER_DELETE_BATCH_SIZE``, each in its
+    own transaction, so a large library doesn't hold the database lock for
+    the whole deletion. A retry picks up where a failed attempt stopped.
+    """
+    if not User.objects.filter(id=user_id).exists():
+        return
+
+    while True:
+        with transaction.atomic():
+            files = list(
+                File.objects.filter(owner_id=user_id).values_list('id', 'file')[:settings.USER_DELETE_BATCH_SIZE]
+            )
+            if not files:
+                break
+            file_ids = [file_id for file_id, _ in files]
+            # Share links hold a copy of the file key, so purge those too
+            key_ids = [*file_ids, *FileShareLink.objects.filter(file_id__in=file_ids).values_list('id', flat=True)]
+            File.objects.filter(id__in=file_ids).delete()
+            enqueue_key_deletions(key_ids)
+            enqueue_blob_deletions([path for _, path in files])
+
+    with transaction.atomic():
+        # Links the user created for files of others go with the user
+        enqueue_key_deletions(FileShareLink.objects.filter(created_by_id=user_id).values_list('id', flat=True))
+        User.objects.filter(id=user_id).delete()
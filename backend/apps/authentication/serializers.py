@@ -14,6 +14,16 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'email', 'is_totp_enabled', 'role')
 
+def iter_user_entries(users, chunk_size):
+    """Yield the ``UserSerializer`` representation of each user.
+
+    Rows are read through a server-side cursor, so memory use does not
+    depend on the number of users.
+    """
+    fields = UserSerializer.Meta.fields
+    for row in users.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield dict(zip(fields, row))
+
 class SignupSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
     email = serializers.EmailField(required=True)
@@ -3,15 +3,19 @@ import pyotp
 import jwt
 from datetime import timedelta, datetime, timezone
 from django.conf import settings
+from django.db import transaction
 from rest_framework import status, serializers
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .permissions import IsAdmin
 from django.contrib.auth.hashers import make_password
-from .serializers import SignupSerializer, UserSerializer
+from .serializers import SignupSerializer, UserSerializer, iter_user_entries
 from .models import User
 from rest_framework.views import APIView
+from apps.jobs.queue import enqueue
+from core.cache import USERS, cached_list_response, user_scope
+from core.renderers import get_stream_format, streaming_json_response
 from core.constants import (
     APP_NAME,
     VERIFICATION_TOKEN_LIFETIME,
@@ -138,8 +142,9 @@ def verify_2fa(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def me(request):
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+    return cached_list_response(
+        request, 'me', [user_scope(request.user.id)], lambda: UserSerializer(request.user).data
+    )
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -275,8 +280,19 @@ def update_user_role(request, user_id):
 @api_view(['GET'])
 @permission_classes([IsAdmin])
 def list_users(request):
-    users = User.objects.all()
-    return Response(UserSerializer(users, many=True).data)
+    # Users being deleted by the delete_user job are gone for the admins already
+    users = User.objects.filter(is_active=True)
+
+    try:
+        stream_format = get_stream_format(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if stream_format:
+        return streaming_json_response(
+            request, 'list_users', [USERS], stream_format,
+            lambda: iter_user_entries(users, settings.LIST_STREAM_CHUNK_SIZE),
+        )
+    return cached_list_response(request, 'list_users', [USERS], lambda: UserSerializer(users, many=True).data)
 
 @api_view(['DELETE'])
 @permission_classes([IsAdmin])
@@ -296,23 +312,13 @@ def delete_user(request, user_id):
                 'error': 'Cannot delete admin user'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Delete user's files
-        from apps.files.models import File
-        import os
-        
-        try:
-            # Get all files owned by the user
-            user_files = File.objects.filter(owner=user)
-            user_files.delete()
-        except Exception as e:
-            print(f"Error during user file cleanup: {e}")
-            return Response({
-                'error': f'Error cleaning up user files: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # Finally delete the user
-        user.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        # The user is locked out right away; their files and the account
+        # itself are removed by a background job
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            enqueue('delete_user', user_id=user.id)
+        return Response(status=status.HTTP_202_ACCEPTED)
     except User.DoesNotExist:
         return Response({
             'error': 'User not found'
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .models import BlobDeletion
+from .outbox import drain_outbox
+
+
+def enqueue_blob_deletions(paths):
+    """Record stored blobs to unlink once the current transaction commits.
+
+    Call this inside the transaction that deletes the owning rows. Paths that
+    are already pending are ignored.
+    """
+    BlobDeletion.objects.bulk_create(
+        [BlobDeletion(path=path) for path in paths if path],
+        ignore_conflicts=True,
+    )
+
+
+def purge_blob_deletions(storage=None, batch_size=None, max_batches=None):
+    """Unlink due blobs from storage.
+
+    Returns a ``(deleted, failed)`` tuple. Blobs that are already gone count
+    as deleted, so an entry can safely be processed twice.
+    """
+    storage = storage or default_storage
+
+    def delete_batch(entries):
+        errors = {}
+        for entry in entries:
+            try:
+                storage.delete(entry.path)
+            except OSError as e:
+                errors[entry.pk] = e
+        return errors
+
+    return drain_outbox(
+        BlobDeletion,
+        delete_batch,
+        batch_size or settings.BLOB_DELETE_BATCH_SIZE,
+        max_batches=max_batches,
+    )
@@ -0,0 +1,104 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from core.pubsub import ALL_USERS, get_broker, user_channel
+from .models import ChangeEvent, File
+from .serializers import FileSerializer
+
+# Events after which the file is visible to the user and its data is included
+VISIBLE_KINDS = {ChangeEvent.CREATED, ChangeEvent.SHARED}
+
+
+def record_changes(events):
+    """Append events to the feed and wake the affected event streams.
+
+    Streams are notified once the current transaction commits, so they never
+    look for events that are not visible yet.
+    """
+    ChangeEvent.objects.bulk_create(events)
+    channels = {ALL_USERS}
+    for event in events:
+        channels.add(user_channel(event.owner_id))
+        if event.recipient_id is not None:
+            channels.add(user_channel(event.recipient_id))
+    # A broker outage must not fail a request whose data is already committed
+    transaction.on_commit(lambda: get_broker().publish(channels), robust=True)
+
+
+def get_changes(user, since, limit):
+    """Return the events a user has not seen since sequence number ``since``.
+
+    When events after ``since`` may already have been compacted, or
+    ``since`` is ahead of the feed, ``resync_required`` is set and the client
+    should refetch its lists and continue from the returned cursor.
+    """
+    bounds = ChangeEvent.objects.aggregate(first=Min('id'), last=Max('id'))
+    last = bounds['last'] or 0
+    if since > last or (bounds['first'] is not None and since < bounds['first'] - 1):
+        return {'resync_required': True, 'cursor': last, 'has_more': False, 'changes': []}
+
+    events = ChangeEvent.objects.filter(id__gt=since)
+    if not user.is_admin():
+        events = events.filter(Q(owner_id=user.id) | Q(recipient_id=user.id))
+    events = list(events[:limit + 1])
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    visible_ids = {event.file_id for event in events if event.kind in VISIBLE_KINDS}
+    files = (
+        File.objects.filter(id__in=visible_ids)
+        .select_related('owner')
+        .prefetch_related('shares__shared_with')
+    )
+    file_data = {data['id']: data for data in FileSerializer(files, many=True).data} if visible_ids else {}
+
+    return {
+        'resync_required': False,
+        # Without further events for this user the cursor can skip to the
+        # end of the feed, which keeps idle clients clear of compaction
+        'cursor': events[-1].id if has_more else max([last, since] + [event.id for event in events[-1:]]),
+        'has_more': has_more,
+        'changes': [
+            {
+                'seq': event.id,
+                'type': event.kind,
+                'file_id': str(event.file_id),
+                'recipient_id': event.recipient_id,
+                'created_at': event.created_at,
+                # Omitted when the file has been deleted since
+                'file': file_data.get(str(event.file_id)) if event.kind in VISIBLE_KINDS else None,
+            }
+            for event in events
+        ],
+    }
+
+
+def compact_changes(retention=None, batch_size=None):
+    """Delete events older than ``retention`` seconds in batches.
+
+    The newest event is always kept so the sequence never restarts, which
+    SQLite would otherwise do once the table is empty. Returns the number of
+    events deleted.
+    """
+    retention = settings.CHANGE_FEED_RETENTION if retention is None else retention
+    batch_size = batch_size or settings.CHANGE_FEED_COMPACT_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(seconds=retention)
+
+    newest = ChangeEvent.objects.aggregate(last=Max('id'))['last']
+    watermark = (
+        ChangeEvent.objects.filter(created_at__lt=cutoff, id__lt=newest or 0)
+        .aggregate(watermark=Max('id'))['watermark']
+    )
+    if watermark is None:
+        return 0
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(ChangeEvent.objects.filter(id__lte=watermark).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += ChangeEvent.objects.filter(id__in=ids).delete()[0]
+    return deleted
@@ -0,0 +1,87 @@
+"""
+Chunked encrypted-blob format.
+
+A chunked blob is a sequence of independently authenticated AES-GCM
+segments. Every chunk but the last encrypts ``chunk_size`` bytes of
+plaintext, and every chunk carries a 16-byte tag, so chunk ``i`` starts at
+``i * (chunk_size + 16)`` in the ciphertext. The client derives the nonce of
+chunk ``i`` from the file's base IV by XORing ``i`` into its last four bytes,
+and authenticates a final-chunk flag as associated data so a truncated blob
+fails to decrypt (see ``frontend/src/utils/encryption.ts``).
+
+The server never decrypts anything: it only needs ``chunk_size`` and the
+ciphertext size to serve any range of chunks, which lets clients seek and
+stream-decrypt without downloading the whole file.
+"""
+
+from django.conf import settings
+
+TAG_SIZE = 16  # bytes of the AES-GCM authentication tag ending every chunk
+
+
+class InvalidChunkRange(Exception):
+    pass
+
+
+def get_chunk_count(size, chunk_size):
+    """Return the number of chunks of a ``size`` byte chunked blob.
+
+    Raises ``ValueError`` if no plaintext split into ``chunk_size`` chunks
+    encrypts to ``size`` bytes.
+    """
+    if not settings.CHUNK_SIZE_MIN <= chunk_size <= settings.CHUNK_SIZE_MAX:
+        raise ValueError(
+            f'chunk_size must be between {settings.CHUNK_SIZE_MIN} and {settings.CHUNK_SIZE_MAX} bytes'
+        )
+    stride = chunk_size + TAG_SIZE
+    count = max(-(-size // stride), 1)
+    if size - (count - 1) * stride < TAG_SIZE:
+        raise ValueError('File size does not match the chunk size')
+    return count
+
+
+def get_chunk_manifest(file):
+    """Return the chunk layout of a chunked file, or ``None`` for a single-message blob."""
+    if file.chunk_size is None:
+        return None
+    stride = file.chunk_size + TAG_SIZE
+    return {
+        'chunk_size': file.chunk_size,
+        'chunk_count': file.chunk_count,
+        'tag_size': TAG_SIZE,
+        'offsets': [index * stride for index in range(file.chunk_count)],
+        'ciphertext_size': file.size,
+    }
+
+
+def parse_chunk_range(value, count):
+    """Parse ``"3"`` or ``"3-7"`` (inclusive) into a ``(first, last)`` chunk index pair."""
+    try:
+        first, _, last = value.partition('-')
+        first = int(first)
+        last = int(last) if last else first
+    except ValueError:
+        raise InvalidChunkRange('chunks must be an index or an inclusive range like 3-7')
+    if not 0 <= first <= last < count:
+        raise InvalidChunkRange(f'Chunk indexes must be between 0 and {count - 1}')
+    return first, last
+
+
+def get_byte_range(file, first, last):
+    """Return the ``(offset, length)`` of chunks ``first`` to ``last`` in the blob."""
+    stride = file.chunk_size + TAG_SIZE
+    offset = first * stride
+    end = min((last + 1) * stride, file.size)
+    return offset, end - offset
+
+
+def read_range(blob, offset, length):
+    """Yield ``length`` bytes of an open blob from ``offset``, a block at a time."""
+    with blob:
+        blob.seek(offset)
+        while length > 0:
+            data = blob.read(min(length, settings.CHUNK_READ_BLOCK_SIZE))
+            if not data:
+                break
+            length -= len(data)
+            yield data
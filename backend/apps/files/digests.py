@@ -0,0 +1,36 @@
+"""
+SHA-256 digests of stored blobs.
+
+The digest covers the ciphertext exactly as stored, so it is computed from
+the upload without any key and lets ``scrub_blobs`` detect corrupted or
+truncated blobs, and downloads send a strong ``ETag``, without rehashing on
+every request.
+"""
+
+import hashlib
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def compute_digest(blocks):
+    """Return the hex SHA-256 digest of an iterable of byte strings."""
+    digest = hashlib.sha256()
+    for block in blocks:
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def read_blocks(blob, rate_limiter=None, block_size=READ_BLOCK_SIZE):
+    """Yield ``blob`` in blocks, charging the bytes read to ``rate_limiter``.
+
+    Reads are charged after the fact, so small blobs cost what they are
+    rather than a whole block, and the debt left by a large read is paid
+    before the next one.
+    """
+    while True:
+        block = blob.read(block_size)
+        if not block:
+            break
+        if rate_limiter is not None:
+            rate_limiter.acquire(len(block))
+        yield block
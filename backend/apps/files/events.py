@@ -0,0 +1,102 @@
+"""
+Server-Sent Events stream of a user's change feed.
+
+The stream must be served by the ASGI application (``core.asgi``): every
+open connection is a coroutine parked on its subscription, so idle clients
+cost a few kilobytes and no thread. Each event carries the change feed
+sequence number as its id, so a reconnecting ``EventSource`` resumes from
+``Last-Event-ID`` through the same replay path as live delivery.
+"""
+
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from apps.authentication.auth import JWTAuthentication
+from core.metrics import EVENT_STREAMS_OPEN
+from core.pubsub import ALL_USERS, get_broker, user_channel
+from .changes import get_changes
+from .models import ChangeEvent
+
+
+def format_event(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def get_latest_cursor():
+    return ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+# Feed reads run on a thread pool rather than the single thread shared by sync
+# views, so many streams woken at once don't queue behind each other.
+read_changes = sync_to_async(get_changes, thread_sensitive=False)
+read_latest_cursor = sync_to_async(get_latest_cursor, thread_sensitive=False)
+
+
+async def stream_changes(user, cursor):
+    channels = [ALL_USERS] if user.is_admin() else [user_channel(user.id)]
+    EVENT_STREAMS_OPEN.inc()
+    try:
+        async with get_broker().subscribe(channels) as subscription:
+            yield f'retry: {settings.EVENTS_RETRY_INTERVAL * 1000}\n\n'
+            if cursor is None:
+                cursor = await read_latest_cursor()
+                yield format_event('ready', {'cursor': cursor}, cursor)
+
+            while True:
+                subscription.clear()
+                page = await read_changes(user, cursor, settings.CHANGE_FEED_PAGE_SIZE)
+                if page['resync_required']:
+                    yield format_event('resync', {'cursor': page['cursor']}, page['cursor'])
+                for change in page['changes']:
+                    yield format_event(change['type'], change, change['seq'])
+                cursor = page['cursor']
+                if page['has_more']:
+                    continue
+
+                # The feed is only read again once notified, so idle streams
+                # cost no queries between heartbeats
+                while not await subscription.wait(settings.EVENTS_HEARTBEAT_INTERVAL):
+                    # Keeps proxies from closing the idle connection
+                    yield ': heartbeat\n\n'
+    finally:
+        EVENT_STREAMS_OPEN.dec()
+
+
+@require_GET
+async def event_stream(request):
+    """Push the user's file and share changes as they happen.
+
+    Resumes after ``Last-Event-ID`` (or ``?since=``) when given; otherwise
+    starts at the current end of the feed with a ``ready`` event.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The event stream is only served over ASGI'}, status=501)
+
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'error': str(e.detail)}, status=401)
+    if result is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+    user = result[0]
+
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    if cursor is not None:
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            return JsonResponse({'error': 'Last-Event-ID must be an integer'}, status=400)
+
+    response = StreamingHttpResponse(stream_changes(user, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Tell nginx not to buffer the stream
+    return response
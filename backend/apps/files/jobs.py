@@ -0,0 +1,38 @@
+from apps.jobs.registry import job
+from . import blobs, changes, kms, share_links, stats, upload_keys
+
+
+@job('purge_blobs', concurrency=1, interval=5)
+def purge_blobs():
+    """Unlink the stored blobs of deleted files."""
+    blobs.purge_blob_deletions()
+
+
+@job('purge_kms_keys', concurrency=1, interval=10)
+def purge_kms_keys():
+    """Delete the keys of deleted files and share links from the KMS."""
+    kms.purge_key_deletions()
+
+
+@job('sweep_share_links', concurrency=1, interval=60)
+def sweep_share_links():
+    """Delete expired share links and queue their keys for removal from the KMS."""
+    share_links.sweep_expired_share_links()
+
+
+@job('sweep_upload_keys', concurrency=1, interval=600)
+def sweep_upload_keys():
+    """Delete upload Idempotency-Keys older than ``UPLOAD_KEY_TTL``."""
+    upload_keys.sweep_upload_keys()
+
+
+@job('compact_changes', concurrency=1, interval=3600)
+def compact_changes():
+    """Delete change feed events older than ``CHANGE_FEED_RETENTION``."""
+    changes.compact_changes()
+
+
+@job('rollup_activity', concurrency=1, interval=300)
+def rollup_activity():
+    """Roll up the activity of closed hours and days for the admin statistics."""
+    stats.rollup_activity()
@@ -0,0 +1,121 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .models import KeyDeletion
+from .outbox import drain_outbox
+
+
+class KMSError(Exception):
+    """Raised when the KMS could not complete a request."""
+
+
+class KMSClient:
+    """Thin HTTP client for the Key Management Service.
+
+    A single ``requests.Session`` is shared per process so connections to the
+    KMS are pooled and kept alive between calls. Transient gateway errors and
+    connection failures are retried by the transport adapter.
+    """
+
+    def __init__(self, base_url, token, timeout=5, pool_size=10, retries=3):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': f'Bearer {token}'})
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'POST', 'DELETE'}),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def store_key(self, key_id, encryption_key):
+        """Store a base64 encoded key for a file or share link."""
+        try:
+            response = self.session.post(
+                f'{self.base_url}/keys/{key_id}',
+                json={'encryption_key': encryption_key},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise KMSError(str(e)) from e
+
+    def delete_keys(self, key_ids):
+        """Delete a batch of keys, returning the KMS ``deleted``/``not_found`` lists."""
+        try:
+            response = self.session.post(
+                f'{self.base_url}/delete',
+                json={'file_ids': [str(key_id) for key_id in key_ids]},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise KMSError(str(e)) from e
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_kms_client():
+    global _client
+    if not settings.KMS_API_TOKEN:
+        raise ImproperlyConfigured('KMS_API_TOKEN must be set to the service token of the KMS')
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = KMSClient(
+                    settings.KMS_URL,
+                    settings.KMS_API_TOKEN,
+                    timeout=settings.KMS_TIMEOUT,
+                    pool_size=settings.KMS_POOL_SIZE,
+                )
+    return _client
+
+
+def enqueue_key_deletions(key_ids):
+    """Record keys to purge from the KMS.
+
+    Call this inside the transaction that deletes the owning rows so the
+    outbox entries are committed (or rolled back) together with them.
+    Enqueueing an id that is already pending is a no-op.
+    """
+    KeyDeletion.objects.bulk_create(
+        [KeyDeletion(key_id=str(key_id)) for key_id in key_ids],
+        ignore_conflicts=True,
+    )
+
+
+def purge_key_deletions(client=None, batch_size=None, max_batches=None):
+    """Send due outbox entries to the KMS in batches.
+
+    Returns a ``(purged, failed)`` tuple with the number of entries removed
+    from the outbox and the number rescheduled for a later retry. Keys the
+    KMS no longer knows about count as purged, so replays are harmless.
+    """
+    client = client or get_kms_client()
+
+    def delete_batch(entries):
+        try:
+            client.delete_keys([entry.key_id for entry in entries])
+        except KMSError as e:
+            return {entry.pk: e for entry in entries}
+        return {}
+
+    return drain_outbox(
+        KeyDeletion,
+        delete_batch,
+        batch_size or settings.KMS_DELETE_BATCH_SIZE,
+        max_batches=max_batches,
+    )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.files.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete old change feed events; clients behind the compacted range are asked to resync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention', type=int, help='Keep events newer than this many seconds')
+        parser.add_argument('--batch-size', type=int, help='Events deleted per transaction')
+
+    def handle(self, *args, **options):
+        deleted = compact_changes(retention=options['retention'], batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} change feed events')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.files.blobs import purge_blob_deletions
+
+
+class Command(BaseCommand):
+    help = 'Unlink the stored blobs of deleted files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Blobs unlinked per batch')
+
+    def handle(self, *args, **options):
+        deleted, failed = purge_blob_deletions(batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} blobs, {failed} rescheduled')
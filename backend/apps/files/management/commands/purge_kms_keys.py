@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.files.kms import purge_key_deletions
+
+
+class Command(BaseCommand):
+    help = 'Delete encryption keys of removed files and share links from the KMS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Keys sent to the KMS per request')
+
+    def handle(self, *args, **options):
+        purged, failed = purge_key_deletions(batch_size=options['batch_size'])
+        self.stdout.write(f'Purged {purged} keys, {failed} rescheduled')
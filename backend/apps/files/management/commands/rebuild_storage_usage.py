@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.files.usage import rebuild_storage_usage
+
+
+class Command(BaseCommand):
+    help = 'Recompute every user\'s storage usage counters from their files, fixing any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Users recomputed per transaction')
+
+    def handle(self, *args, **options):
+        users, drifted = rebuild_storage_usage(chunk_size=options['chunk_size'])
+        self.stdout.write(f'Checked {users} users, corrected {drifted} usage counters')
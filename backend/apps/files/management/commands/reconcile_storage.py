@@ -0,0 +1,228 @@
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from apps.files.models import File
+from core.utils.ratelimit import RateLimiter
+
+UPLOADS_DIR = 'uploads'
+SORT_RUN_SIZE = 100000  # Directory entries sorted in memory before spilling to a temporary file
+
+
+def spill_run(names):
+    run = tempfile.TemporaryFile()
+    for name in names:
+        data = os.fsencode(name)
+        run.write(len(data).to_bytes(4, 'big') + data)
+    run.seek(0)
+    return run
+
+
+def read_run(run):
+    with run:
+        while header := run.read(4):
+            yield os.fsdecode(run.read(int.from_bytes(header, 'big')))
+
+
+def sorted_file_names(path):
+    """Yield the names of the regular files in ``path`` in sorted order.
+
+    Names are sorted in runs of ``SORT_RUN_SIZE``; every full run is spilled
+    to a temporary file and the runs are merged, so memory stays bounded
+    however many files the directory holds.
+    """
+    runs, names = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    names.append(entry.name)
+                    if len(names) == SORT_RUN_SIZE:
+                        runs.append(spill_run(sorted(names)))
+                        names = []
+    except FileNotFoundError:
+        pass
+    names.sort()
+    yield from heapq.merge(*map(read_run, runs), names)
+
+
+class Command(BaseCommand):
+    help = (
+        'Find blobs in storage that no File row points to (orphans) and File rows '
+        'whose blob is missing, optionally deleting the orphans'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete orphaned blobs')
+        parser.add_argument('--dry-run', action='store_true', help='With --delete, only report what would be deleted')
+        parser.add_argument('--workers', type=int, default=4, help='Upload directories scanned in parallel')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument('--max-deletes-per-second', type=float, default=100,
+                            help='Upper bound on orphan deletions per second (0 for no limit)')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Ignore blobs modified less than this many seconds ago, e.g. uploads in progress')
+        parser.add_argument('--report', help='Write every orphan and missing blob to this file as JSON lines')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.delete = options['delete'] and not options['dry_run']
+        self.rate_limiter = RateLimiter(options['max_deletes_per_second'])
+        self.cutoff = time.time() - options['min_age']
+        # Rows created during the run may point at blobs the listing missed
+        self.started_at = timezone.now()
+        self.lock = threading.Lock()
+        self.totals = {'scanned': 0, 'orphaned': 0, 'deleted': 0, 'missing': 0}
+        self.report = open(options['report'], 'w') if options['report'] else None
+
+        uploads_root = os.path.join(settings.MEDIA_ROOT, UPLOADS_DIR)
+        try:
+            with os.scandir(uploads_root) as entries:
+                directories = [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            directories = []
+
+        # Owners with files in the database but no directory on disk are
+        # still checked, so their blobs are reported as missing.
+        seen = set(directories)
+        owners = File.objects.order_by().values_list('owner_id', flat=True).distinct()
+        directories += [str(owner) for owner in owners if str(owner) not in seen]
+        self.directories = frozenset(directories)
+
+        try:
+            if options['workers'] > 1:
+                with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                    list(executor.map(self.reconcile_directory_threaded, directories))
+            else:
+                for directory in directories:
+                    self.reconcile_directory(directory)
+        finally:
+            if self.report:
+                self.report.close()
+
+        action = 'deleted' if self.delete else 'would delete' if options['delete'] else 'not deleted'
+        self.stdout.write(
+            f"Scanned {self.totals['scanned']} blobs: {self.totals['orphaned']} orphaned "
+            f"({self.totals['deleted'] if self.delete else self.totals['orphaned']} {action}), "
+            f"{self.totals['missing']} missing"
+        )
+
+    def reconcile_directory_threaded(self, directory):
+        try:
+            self.reconcile_directory(directory)
+        finally:
+            connection.close()  # Each worker thread has its own connection
+
+    def reconcile_directory(self, directory):
+        """Compare one upload directory with the rows pointing into it.
+
+        The rows, in name order, are merged with the sorted directory
+        listing, so neither side is held in memory. Rows of any owner are
+        matched, so a blob referenced from outside its owner's directory
+        is never taken for an orphan.
+        """
+        prefix = f'{UPLOADS_DIR}/{directory}/'
+        path = os.path.join(settings.MEDIA_ROOT, UPLOADS_DIR, directory)
+        stored = self.iter_stored_names(prefix)
+        on_disk = sorted_file_names(path)
+
+        scanned = orphaned = deleted = 0
+        name, entry = next(stored, None), next(on_disk, None)
+        while name is not None or entry is not None:
+            if entry is None or (name is not None and name < entry):
+                self.record('missing', prefix + name)
+                name = next(stored, None)
+                continue
+
+            scanned += 1
+            if name == entry:
+                name = next(stored, None)
+            elif self.is_orphan(os.path.join(path, entry)):
+                orphaned += 1
+                self.record('orphan', prefix + entry)
+                if self.delete:
+                    self.rate_limiter.acquire()
+                    try:
+                        os.unlink(os.path.join(path, entry))
+                        deleted += 1
+                    except FileNotFoundError:
+                        pass
+            entry = next(on_disk, None)
+
+        if directory.isdigit():
+            self.check_foreign_rows(int(directory), prefix)
+
+        with self.lock:
+            self.totals['scanned'] += scanned
+            self.totals['orphaned'] += orphaned
+            self.totals['deleted'] += deleted
+
+    def iter_stored_names(self, prefix):
+        """Yield the names of the blobs directly in ``prefix`` that rows point to.
+
+        Rows are read in name order with keyset pagination over the storage
+        name index. Names in a subdirectory are outside the listing being
+        merged with, so they are checked on their own.
+        """
+        # Every name starting with the prefix sorts in [prefix, upper)
+        upper = prefix[:-1] + chr(ord('/') + 1)
+        last = None
+        while True:
+            rows = File.objects.filter(file__gte=prefix, file__lt=upper, created_at__lt=self.started_at)
+            if last is not None:
+                rows = rows.filter(file__gt=last)
+            names = list(rows.order_by('file').values_list('file', flat=True)[:self.options['chunk_size']])
+            if not names:
+                return
+            for name in names:
+                if name == last:
+                    continue  # Several rows sharing a blob
+                if '/' in name[len(prefix):]:
+                    self.check_exists(name)
+                else:
+                    yield name[len(prefix):]
+                last = name
+
+    def check_foreign_rows(self, owner_id, prefix):
+        """Check the rows of an owner whose blob is outside the owner's directory.
+
+        Those under another directory being reconciled are matched there;
+        the rest, e.g. names outside ``uploads/<directory>/``, are looked up
+        one by one.
+        """
+        upper = prefix[:-1] + chr(ord('/') + 1)
+        rows = (
+            File.objects.filter(owner_id=owner_id, created_at__lt=self.started_at)
+            .exclude(file__gte=prefix, file__lt=upper)
+            .values_list('file', flat=True)
+            .iterator(chunk_size=self.options['chunk_size'])
+        )
+        for name in rows:
+            directory, separator, _ = name.removeprefix(f'{UPLOADS_DIR}/').partition('/')
+            if not (name.startswith(f'{UPLOADS_DIR}/') and separator and directory in self.directories):
+                self.check_exists(name)
+
+    def check_exists(self, name):
+        if not os.path.lexists(os.path.join(settings.MEDIA_ROOT, name)):
+            self.record('missing', name)
+
+    def is_orphan(self, path):
+        try:
+            return os.stat(path, follow_symlinks=False).st_mtime <= self.cutoff
+        except FileNotFoundError:
+            return False  # Deleted since the listing
+
+    def record(self, kind, path):
+        with self.lock:
+            if kind == 'missing':
+                self.totals['missing'] += 1
+            if self.report:
+                self.report.write(json.dumps({'type': kind, 'path': path}) + '\n')
+            elif self.options['verbosity'] > 1:
+                self.stdout.write(f'{kind}: {path}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.files.stats import rollup_activity
+
+
+class Command(BaseCommand):
+    help = 'Aggregate upload, share and share link activity of closed hours and days for the admin statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settle-delay', type=int, help='Seconds to wait after a period ends before rolling it up')
+
+    def handle(self, *args, **options):
+        rolled_up = rollup_activity(settle_delay=options['settle_delay'])
+        self.stdout.write(f'Rolled up {rolled_up} periods')
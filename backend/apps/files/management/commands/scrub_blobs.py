@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.files.digests import read_blocks
+from apps.files.models import File
+from core.utils.ratelimit import RateLimiter
+
+TOTALS = ('checked', 'bytes', 'verified', 'backfilled', 'mismatched', 'missing')
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-read every blob and compare it with its recorded SHA-256 digest, reporting '
+        'mismatched and missing blobs and recording digests for files that have none. '
+        'Files uploaded before digests were recorded only get one from this command, so '
+        'run a first full scrub before relying on it to detect corruption'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Blobs read in parallel')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Files fetched per database round trip and per checkpoint')
+        parser.add_argument('--max-bytes-per-second', type=float, default=32 * 1024 * 1024,
+                            help='Upper bound on bytes read from storage per second (0 for no limit)')
+        parser.add_argument('--dry-run', action='store_true', help='Do not record digests for files that have none')
+        parser.add_argument('--checkpoint',
+                            help='Resume from and record progress in this file; it is removed once the scrub completes')
+        parser.add_argument('--progress-interval', type=float, default=30,
+                            help='Seconds between progress lines')
+        parser.add_argument('--report', help='Write every mismatched and missing blob to this file as JSON lines')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rate_limiter = RateLimiter(options['max_bytes_per_second'])
+        self.totals = dict.fromkeys(TOTALS, 0)
+        after = None
+        if options['checkpoint'] and os.path.exists(options['checkpoint']):
+            with open(options['checkpoint']) as f:
+                checkpoint = json.load(f)
+            after = checkpoint['after']
+            self.totals.update(checkpoint['totals'])
+            self.stdout.write(f'Resuming after file {after}')
+
+        # A resumed scrub adds to the report of the interrupted one
+        self.report = open(options['report'], 'a' if after else 'w') if options['report'] else None
+        last_progress = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                while True:
+                    # Keyset pagination on the primary key, which is also the resume point
+                    files = File.objects.order_by('id')
+                    if after is not None:
+                        files = files.filter(id__gt=after)
+                    rows = list(files.values_list('id', 'file', 'size', 'sha256')[:options['chunk_size']])
+                    if not rows:
+                        break
+
+                    self.record(rows, list(executor.map(self.scrub, rows)))
+                    after = str(rows[-1][0])
+                    if options['checkpoint']:
+                        self.save_checkpoint(after)
+                    if time.monotonic() - last_progress >= options['progress_interval']:
+                        self.stdout.write(self.format_totals())
+                        last_progress = time.monotonic()
+        finally:
+            if self.report:
+                self.report.close()
+
+        if options['checkpoint'] and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        self.stdout.write(self.format_totals())
+
+    def scrub(self, row):
+        """Read one blob and return ``(outcome, digest, bytes_read)``.
+
+        Runs on the worker threads, which only read storage; the results are
+        written to the database by the main thread.
+        """
+        file_id, name, size, expected = row
+        digest = hashlib.sha256()
+        read = 0
+        try:
+            with default_storage.open(name, 'rb') as blob:
+                for block in read_blocks(blob, self.rate_limiter):
+                    digest.update(block)
+                    read += len(block)
+        except FileNotFoundError:
+            return 'missing', None, 0
+
+        digest = digest.hexdigest()
+        # A blob of the wrong size is truncated or overwritten, so its digest
+        # isn't worth recording either
+        if read != size or (expected is not None and digest != expected):
+            return 'mismatched', digest, read
+        return ('verified' if expected is not None else 'backfilled'), digest, read
+
+    def record(self, rows, results):
+        # Files deleted since the chunk was read have lost their blob on purpose
+        missing = [row[0] for row, (outcome, _, _) in zip(rows, results) if outcome == 'missing']
+        if missing:
+            missing = set(File.objects.filter(id__in=missing).values_list('id', flat=True))
+
+        backfill = []
+        for (file_id, name, size, expected), (outcome, digest, read) in zip(rows, results):
+            self.totals['checked'] += 1
+            self.totals['bytes'] += read
+            if outcome == 'missing':
+                if file_id in missing:
+                    self.totals['missing'] += 1
+                    self.write_problem({'type': 'missing', 'id': str(file_id), 'path': name})
+            elif outcome == 'mismatched':
+                self.totals['mismatched'] += 1
+                self.write_problem({
+                    'type': 'mismatch', 'id': str(file_id), 'path': name,
+                    'size': size, 'read': read, 'expected': expected, 'actual': digest,
+                })
+            elif outcome == 'backfilled':
+                backfill.append((file_id, digest))
+            else:
+                self.totals['verified'] += 1
+
+        if backfill and not self.options['dry_run']:
+            with transaction.atomic():
+                for file_id, digest in backfill:
+                    # Skips files whose digest was recorded in the meantime
+                    self.totals['backfilled'] += File.objects.filter(
+                        id=file_id, sha256__isnull=True
+                    ).update(sha256=digest)
+
+    def write_problem(self, entry):
+        if self.report:
+            self.report.write(json.dumps(entry) + '\n')
+        else:
+            self.stdout.write(f"{entry['type']}: {entry['path']} (file {entry['id']})")
+
+    def save_checkpoint(self, after):
+        # The report must hold every problem found before the resume point
+        if self.report:
+            self.report.flush()
+        # Written to a temporary file and renamed, so an interrupted write
+        # never leaves a truncated checkpoint behind
+        path = self.options['checkpoint']
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'after': after, 'totals': self.totals}, f)
+        os.replace(f'{path}.tmp', path)
+
+    def format_totals(self):
+        totals = self.totals
+        return (
+            f"Checked {totals['checked']} blobs ({totals['bytes']} bytes): {totals['verified']} verified, "
+            f"{totals['backfilled']} digests recorded, {totals['mismatched']} mismatched, {totals['missing']} missing"
+        )
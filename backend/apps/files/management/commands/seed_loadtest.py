@@ -0,0 +1,172 @@
+import base64
+import hashlib
+import json
+import random
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from apps.authentication.models import User
+from apps.files.kms import KMSClient, KMSError
+from apps.files.models import ActivityEvent, File, FileShare, FileShareLink
+from apps.files.stats import record_activity
+from apps.files.usage import rebuild_storage_usage
+from core.cache import ALL_FILES, USERS, invalidate, user_scope
+
+LOADTEST_PASSWORD = 'LoadTest#2024'
+LOADTEST_EMAIL_DOMAIN = 'loadtest.example.com'
+
+
+class Command(BaseCommand):
+    help = 'Seed users, files, shares and share links for the load-test harness'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of users to create')
+        parser.add_argument('--admins', type=int, default=1, help='How many of the users are admins')
+        parser.add_argument('--guest-ratio', type=float, default=0.3, help='Fraction of non-admin users that are guests')
+        parser.add_argument('--files-per-user', type=int, default=20, help='Files owned by each admin and regular user')
+        parser.add_argument('--file-size', type=int, default=16 * 1024, help='Ciphertext size of each seeded file in bytes')
+        parser.add_argument('--shares-per-file', type=int, default=2, help='Users each file is shared with')
+        parser.add_argument('--link-ratio', type=float, default=0.2, help='Fraction of files that get a share link')
+        parser.add_argument('--kms-url', help='Also store a key for every file and share link in this KMS')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, so runs are reproducible')
+        parser.add_argument('--output', default='loadtest_manifest.json', help='Where to write the manifest for the driver')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(email__endswith=f'@{LOADTEST_EMAIL_DOMAIN}').exists():
+            raise CommandError('Load-test data already exists, start from an empty database')
+
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            users = self.create_users(rng, options)
+            files = self.create_files(rng, users, options)
+            shares = self.create_shares(rng, users, files, options)
+            links = self.create_links(rng, files, options)
+            # bulk_create sends no signals and skips the usage counters, so
+            # log the activity, invalidate the cached lists and recompute the
+            # counters here
+            self.record_activity(users, files, shares, links)
+            invalidate(ALL_FILES, USERS, *(user_scope(user.id) for user in users))
+            rebuild_storage_usage()
+
+        if options['kms_url']:
+            self.store_keys(rng, options['kms_url'], files, links)
+
+        manifest = {
+            'seed': options['seed'],
+            'password': LOADTEST_PASSWORD,
+            'users': [
+                {'id': user.id, 'email': user.email, 'role': user.role, 'totp_secret': user.totp_secret}
+                for user in users
+            ],
+            'files': [{'id': str(file.id), 'owner_id': file.owner_id} for file in files],
+            'shares': [{'file_id': str(share.file_id), 'user_id': share.shared_with_id} for share in shares],
+            'links': [str(link.id) for link in links],
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        self.stdout.write(
+            f'Seeded {len(users)} users, {len(files)} files, {len(shares)} shares and '
+            f'{len(links)} share links; manifest written to {options["output"]}'
+        )
+
+    def create_users(self, rng, options):
+        password = make_password(LOADTEST_PASSWORD)  # Hash once, it is deliberately slow
+        users = []
+        for i in range(options['users']):
+            if i < options['admins']:
+                role = User.ADMIN
+            elif rng.random() < options['guest_ratio']:
+                role = User.GUEST
+            else:
+                role = User.REGULAR
+            email = f'{role}{i}@{LOADTEST_EMAIL_DOMAIN}'
+            users.append(User(
+                username=email,
+                email=email,
+                password=password,
+                role=role,
+                totp_secret=base64.b32encode(rng.randbytes(20)).decode(),
+                is_totp_enabled=True,
+            ))
+        User.objects.bulk_create(users)
+        # bulk_create only returns primary keys on some backends
+        return list(User.objects.filter(email__endswith=f'@{LOADTEST_EMAIL_DOMAIN}').order_by('id'))
+
+    def create_files(self, rng, users, options):
+        files = []
+        for owner in users:
+            if owner.role == User.GUEST:
+                continue
+            for i in range(options['files_per_user']):
+                name = f'document-{owner.id}-{i}.pdf'
+                data = rng.randbytes(options['file_size'])
+                files.append(File(
+                    name=name,
+                    file=ContentFile(data, name=name),
+                    mime_type='application/pdf',
+                    size=options['file_size'],
+                    owner=owner,
+                    iv=base64.b64encode(rng.randbytes(12)).decode(),
+                    sha256=hashlib.sha256(data).hexdigest(),
+                ))
+        return File.objects.bulk_create(files, batch_size=500)
+
+    def create_shares(self, rng, users, files, options):
+        shares = []
+        for file in files:
+            candidates = [user for user in users if user.id != file.owner_id]
+            for recipient in rng.sample(candidates, min(options['shares_per_file'], len(candidates))):
+                shares.append(FileShare(file=file, shared_by_id=file.owner_id, shared_with=recipient))
+        return FileShare.objects.bulk_create(shares, batch_size=500)
+
+    def create_links(self, rng, files, options):
+        expires_at = timezone.now() + timedelta(days=7)
+        links = [
+            FileShareLink(
+                file=file,
+                created_by_id=file.owner_id,
+                expires_at=expires_at,
+                iv=file.iv,
+                name=file.name,
+                mime_type=file.mime_type,
+            )
+            for file in files if rng.random() < options['link_ratio']
+        ]
+        return FileShareLink.objects.bulk_create(links, batch_size=500)
+
+    def record_activity(self, users, files, shares, links):
+        roles = {user.id: user.role for user in users}
+        record_activity(
+            [
+                ActivityEvent(
+                    kind=ActivityEvent.UPLOAD, actor_id=file.owner_id, role=roles[file.owner_id], size=file.size
+                )
+                for file in files
+            ]
+            + [
+                ActivityEvent(kind=ActivityEvent.SHARE, actor_id=share.shared_by_id, role=roles[share.shared_by_id])
+                for share in shares
+            ]
+            + [
+                ActivityEvent(kind=ActivityEvent.LINK, actor_id=link.created_by_id, role=roles[link.created_by_id])
+                for link in links
+            ]
+        )
+
+    def store_keys(self, rng, kms_url, files, links):
+        client = KMSClient(kms_url, 'loadtest')
+        keys = {}
+        try:
+            for file in files:
+                keys[file.id] = base64.b64encode(rng.randbytes(32)).decode()
+                client.store_key(file.id, keys[file.id])
+            for link in links:
+                client.store_key(link.id, keys[link.file_id])
+        except KMSError as e:
+            raise CommandError(f'Failed to store keys in the KMS: {e}')
+        finally:
+            client.close()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.files.share_links import sweep_expired_share_links
+
+
+class Command(BaseCommand):
+    help = 'Delete expired share links and queue their keys for removal from the KMS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Links deleted per transaction')
+        parser.add_argument('--grace', type=int, help='Only delete links expired for at least this many seconds')
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired_share_links(batch_size=options['batch_size'], grace=options['grace'])
+        self.stdout.write(f'Deleted {deleted} expired share links')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.files.upload_keys import sweep_upload_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete upload Idempotency-Keys older than UPLOAD_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Keys deleted per transaction')
+
+    def handle(self, *args, **options):
+        deleted = sweep_upload_keys(batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} upload keys')
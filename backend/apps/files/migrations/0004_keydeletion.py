@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0003_filesharelink_iv_filesharelink_mime_type_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KeyDeletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key_id", models.CharField(max_length=36, unique=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "ordering": ["next_attempt_at"],
+            },
+        ),
+    ]
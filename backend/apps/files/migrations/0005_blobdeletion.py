@@ -0,0 +1,42 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0004_keydeletion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BlobDeletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("path", models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                "ordering": ["next_attempt_at"],
+                "abstract": False,
+            },
+        ),
+    ]
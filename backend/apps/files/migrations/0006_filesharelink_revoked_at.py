@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0005_blobdeletion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="filesharelink",
+            name="revoked_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
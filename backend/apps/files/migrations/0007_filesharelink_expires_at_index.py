@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0006_filesharelink_revoked_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="filesharelink",
+            name="expires_at",
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0007_filesharelink_expires_at_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("deleted", "Deleted"),
+                            ("shared", "Shared"),
+                            ("unshared", "Unshared"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("file_id", models.UUIDField()),
+                ("owner_id", models.IntegerField()),
+                ("recipient_id", models.IntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["owner_id", "id"], name="files_chang_owner_i_463187_idx"
+                    ),
+                    models.Index(
+                        fields=["recipient_id", "id"],
+                        name="files_chang_recipie_b606bf_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
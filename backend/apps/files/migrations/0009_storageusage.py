@@ -0,0 +1,49 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_storage_usage(apps, schema_editor):
+    File = apps.get_model("files", "File")
+    StorageUsage = apps.get_model("files", "StorageUsage")
+    totals = File.objects.values("owner_id").annotate(file_count=Count("id"), total_bytes=Sum("size"))
+    StorageUsage.objects.bulk_create(
+        [
+            StorageUsage(user_id=row["owner_id"], file_count=row["file_count"], total_bytes=row["total_bytes"])
+            for row in totals.order_by()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0002_user_role"),
+        ("files", "0008_changeevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StorageUsage",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="storage_usage",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("file_count", models.BigIntegerField(default=0)),
+                ("total_bytes", models.BigIntegerField(default=0)),
+                ("quota_bytes", models.BigIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_storage_usage, migrations.RunPython.noop),
+    ]
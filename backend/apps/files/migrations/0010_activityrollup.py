@@ -0,0 +1,59 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0009_storageusage"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="file",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="fileshare",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="filesharelink",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="ActivityRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("role", models.CharField(max_length=10)),
+                ("uploads", models.PositiveIntegerField(default=0)),
+                ("upload_bytes", models.BigIntegerField(default=0)),
+                ("shares", models.PositiveIntegerField(default=0)),
+                ("links_created", models.PositiveIntegerField(default=0)),
+                ("active_users", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["period", "bucket", "role"],
+                "unique_together": {("period", "bucket", "role")},
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Indexes for searching files by name: (owner, name, id) for walking a
+# user's files in name order, and an FTS5 trigram index over File.name kept
+# in sync by triggers.
+#
+# The FTS index is an external content table keyed by the rowid of files_file.
+# SQLite drops the triggers and renumbers rowids when Django rebuilds a
+# table, so a migration that rebuilds files_file must run
+# create_search_index again afterwards.
+#
+# Migration 0017 replaces this index with one keyed by a stable id.
+
+from django.db import migrations, models
+
+CREATE_SEARCH_INDEX = [
+    "DROP TABLE IF EXISTS files_file_search",
+    "CREATE VIRTUAL TABLE files_file_search USING fts5(name, content='files_file', tokenize='trigram')",
+    """
+    CREATE TRIGGER IF NOT EXISTS files_file_search_insert AFTER INSERT ON files_file BEGIN
+        INSERT INTO files_file_search(rowid, name) VALUES (new.rowid, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_file_search_delete AFTER DELETE ON files_file BEGIN
+        INSERT INTO files_file_search(files_file_search, rowid, name) VALUES ('delete', old.rowid, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_file_search_update AFTER UPDATE OF name ON files_file BEGIN
+        INSERT INTO files_file_search(files_file_search, rowid, name) VALUES ('delete', old.rowid, old.name);
+        INSERT INTO files_file_search(rowid, name) VALUES (new.rowid, new.name);
+    END
+    """,
+    "INSERT INTO files_file_search(files_file_search) VALUES ('rebuild')",
+]
+
+DROP_SEARCH_INDEX = [
+    "DROP TRIGGER IF EXISTS files_file_search_insert",
+    "DROP TRIGGER IF EXISTS files_file_search_delete",
+    "DROP TRIGGER IF EXISTS files_file_search_update",
+    "DROP TABLE IF EXISTS files_file_search",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Other databases search with a plain LIKE scan, see apps.files.search
+        if schema_editor.connection.vendor == "sqlite":
+            for statement in statements:
+                schema_editor.execute(statement)
+    return operation
+
+
+create_search_index = run(CREATE_SEARCH_INDEX)
+drop_search_index = run(DROP_SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0010_activityrollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(fields=["owner", "name", "id"], name="files_file_owner_i_bde68a_idx"),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
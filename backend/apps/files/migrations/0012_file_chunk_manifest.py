@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0011_file_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="chunk_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="chunk_size",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0013_uploadkey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="sha256",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-19 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0014_file_sha256"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(fields=["file"], name="files_file_file_fb6e81_idx"),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.0.3 on 2026-10-19 19:12
+
+import django.utils.timezone
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import Max, Value
+
+
+def backfill_activity(apps, schema_editor):
+    """Log the rows of the periods not rolled up yet, which are aggregated from the log from now on."""
+    ActivityRollup = apps.get_model("files", "ActivityRollup")
+    ActivityEvent = apps.get_model("files", "ActivityEvent")
+    lengths = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+    watermarks = []
+    for period, length in lengths.items():
+        last = ActivityRollup.objects.filter(period=period).aggregate(last=Max("bucket"))["last"]
+        if last is None:
+            watermarks = []  # A period never rolled up needs every row
+            break
+        watermarks.append(last + length)
+    since = {"created_at__gte": min(watermarks)} if watermarks else {}
+
+    File = apps.get_model("files", "File")
+    FileShare = apps.get_model("files", "FileShare")
+    FileShareLink = apps.get_model("files", "FileShareLink")
+    sources = [
+        ("upload", File.objects.values_list("owner_id", "owner__role", "size", "created_at")),
+        ("share", FileShare.objects.annotate(size=Value(0)).values_list(
+            "shared_by_id", "shared_by__role", "size", "created_at"
+        )),
+        ("link", FileShareLink.objects.annotate(size=Value(0)).values_list(
+            "created_by_id", "created_by__role", "size", "created_at"
+        )),
+    ]
+    for kind, rows in sources:
+        ActivityEvent.objects.bulk_create(
+            [
+                ActivityEvent(kind=kind, actor_id=actor_id, role=role, size=size, created_at=created_at)
+                for actor_id, role, size, created_at in rows.filter(**since).order_by().iterator()
+            ],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0015_file_storage_name_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("upload", "Upload"),
+                            ("share", "Share"),
+                            ("link", "Share link"),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                ("actor_id", models.IntegerField()),
+                ("role", models.CharField(max_length=10)),
+                ("size", models.BigIntegerField(default=0)),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Re-keys the FTS5 filename index of migration 0011, which was an external
+# content table over the implicit rowid of files_file. Those rowids are not
+# stable, VACUUM may renumber them since the primary key is a UUID, so the
+# index could point at the wrong files.
+#
+# The names are now copied to files_file_search_content, whose INTEGER
+# PRIMARY KEY is the rowid of the index and is kept by VACUUM, and which
+# maps it to the file id. The triggers on files_file keep both in sync.
+# SQLite drops those triggers when Django rebuilds files_file, so a
+# migration that rebuilds the table must run create_search_index again
+# afterwards.
+
+from importlib import import_module
+from django.db import migrations
+
+CREATE_SEARCH_INDEX = [
+    "DROP TRIGGER IF EXISTS files_file_search_insert",
+    "DROP TRIGGER IF EXISTS files_file_search_delete",
+    "DROP TRIGGER IF EXISTS files_file_search_update",
+    "DROP TABLE IF EXISTS files_file_search",
+    "DROP TABLE IF EXISTS files_file_search_content",
+    """
+    CREATE TABLE files_file_search_content (
+        id INTEGER PRIMARY KEY,
+        file_id char(32) NOT NULL UNIQUE,
+        name TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE files_file_search USING fts5(
+        name, content='files_file_search_content', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER files_file_search_insert AFTER INSERT ON files_file BEGIN
+        INSERT INTO files_file_search_content(file_id, name) VALUES (new.id, new.name);
+        INSERT INTO files_file_search(rowid, name) VALUES (last_insert_rowid(), new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER files_file_search_delete AFTER DELETE ON files_file BEGIN
+        INSERT INTO files_file_search(files_file_search, rowid, name)
+            SELECT 'delete', id, name FROM files_file_search_content WHERE file_id = old.id;
+        DELETE FROM files_file_search_content WHERE file_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER files_file_search_update AFTER UPDATE OF name ON files_file BEGIN
+        INSERT INTO files_file_search(files_file_search, rowid, name)
+            SELECT 'delete', id, name FROM files_file_search_content WHERE file_id = old.id;
+        UPDATE files_file_search_content SET name = new.name WHERE file_id = old.id;
+        INSERT INTO files_file_search(rowid, name)
+            SELECT id, name FROM files_file_search_content WHERE file_id = old.id;
+    END
+    """,
+    "INSERT INTO files_file_search_content(file_id, name) SELECT id, name FROM files_file",
+    "INSERT INTO files_file_search(files_file_search) VALUES ('rebuild')",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Other databases search with a plain LIKE scan, see apps.files.search
+        if schema_editor.connection.vendor == "sqlite":
+            for statement in statements:
+                schema_editor.execute(statement)
+    return operation
+
+
+def restore_rowid_index(apps, schema_editor):
+    previous = import_module("apps.files.migrations.0011_file_search_index")
+    previous.drop_search_index(apps, schema_editor)
+    run(["DROP TABLE IF EXISTS files_file_search_content"])(apps, schema_editor)
+    previous.create_search_index(apps, schema_editor)
+
+
+create_search_index = run(CREATE_SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0016_activityevent"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, restore_rowid_index),
+    ]
@@ -18,12 +18,22 @@ class File(models.Model):
     mime_type = models.CharField(max_length=255)
     size = models.BigIntegerField()
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='files')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     iv = models.TextField()  # Store base64 encoded IV
+    # Chunk manifest of blobs in the chunked format (see apps.files.chunks);
+    # both are null for blobs encrypted as a single message
+    chunk_size = models.PositiveIntegerField(null=True, blank=True)  # Plaintext bytes per chunk
+    chunk_count = models.PositiveIntegerField(null=True, blank=True)
+    # Null for files uploaded before digests were recorded until scrub_blobs backfills them
+    sha256 = models.CharField(max_length=64, null=True, blank=True)  # Hex digest of the stored ciphertext
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', 'name', 'id']),  # Walked in order by search
+            models.Index(fields=['file']),  # Walked in order by reconcile_storage
+        ]
 
     def __str__(self):
         return self.name
@@ -35,7 +45,7 @@ class FileShare(models.Model):
     file = models.ForeignKey('File', on_delete=models.CASCADE, related_name='shares')
     shared_by = models.ForeignKey('authentication.User', on_delete=models.CASCADE, related_name='shared_files')
     shared_with = models.ForeignKey('authentication.User', on_delete=models.CASCADE, related_name='received_files')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         unique_together = ('file', 'shared_with')
@@ -48,14 +58,192 @@ class FileShareLink(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file = models.ForeignKey('File', on_delete=models.CASCADE, related_name='share_links')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
     iv = models.TextField()  # Store the IV
     name = models.CharField(max_length=255)  # Store the filename
     mime_type = models.CharField(max_length=255)  # Store the MIME type
+    revoked_at = models.DateTimeField(null=True, blank=True)
 
     def is_expired(self):
         return timezone.now() > self.expires_at
 
+    def is_revoked(self):
+        return self.revoked_at is not None
+
     def __str__(self):
         return f"Share link for {self.name} (expires: {self.expires_at})"
+
+
+class OutboxEntry(models.Model):
+    """Base for work recorded in a transaction and carried out later.
+
+    Entries are drained in batches by ``apps.files.outbox.drain_outbox`` and
+    rescheduled with exponential backoff when they fail.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['next_attempt_at']
+
+class KeyDeletion(OutboxEntry):
+    """Outbox entry for an encryption key that must be removed from the KMS.
+
+    Rows are written in the same transaction that deletes the file, and are
+    drained in batches by the ``purge_kms_keys`` management command.
+    """
+    key_id = models.CharField(max_length=36, unique=True)  # File or share link id
+
+    def __str__(self):
+        return f"Pending KMS key deletion for {self.key_id}"
+
+class BlobDeletion(OutboxEntry):
+    """Outbox entry for a stored file blob that must be unlinked.
+
+    Drained by the ``purge_blobs`` management command, so request handlers
+    don't wait on disk I/O.
+    """
+    path = models.CharField(max_length=255, unique=True)  # Storage name of the blob
+
+    def __str__(self):
+        return f"Pending blob deletion for {self.path}"
+
+class ChangeEvent(models.Model):
+    """Entry in the change feed clients use to sync their file lists by delta.
+
+    The primary key is the feed's sequence number. User ids are stored as
+    plain integers, not foreign keys, so events recorded while a user and
+    their files are being deleted outlive the rows they refer to.
+    """
+    CREATED = 'created'
+    DELETED = 'deleted'
+    SHARED = 'shared'
+    UNSHARED = 'unshared'
+
+    KIND_CHOICES = [
+        (CREATED, 'Created'),
+        (DELETED, 'Deleted'),
+        (SHARED, 'Shared'),
+        (UNSHARED, 'Unshared'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    file_id = models.UUIDField()
+    owner_id = models.IntegerField()  # Owner of the file
+    recipient_id = models.IntegerField(null=True, blank=True)  # User a share was added or removed for
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['owner_id', 'id']),
+            models.Index(fields=['recipient_id', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.file_id} (#{self.id})"
+
+class StorageUsage(models.Model):
+    """Running totals of the files a user owns.
+
+    Updated in the same transactions that insert and delete File rows, so
+    quota checks read one row instead of summing file sizes. The
+    ``rebuild_storage_usage`` command recomputes the totals if they drift.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='storage_usage'
+    )
+    file_count = models.BigIntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+    quota_bytes = models.BigIntegerField(null=True, blank=True)  # Overrides STORAGE_QUOTA_BYTES when set
+
+    def __str__(self):
+        return f"{self.file_count} files, {self.total_bytes} bytes used by user {self.user_id}"
+
+
+class ActivityEvent(models.Model):
+    """Upload, share or share link creation, recorded as it happens.
+
+    The rollups are aggregated from these rather than from the file, share
+    and link tables, so activity is still counted when the rows are deleted
+    or swept before their period is rolled up. Events are pruned once every
+    period they fall in has been rolled up.
+    """
+    UPLOAD = 'upload'
+    SHARE = 'share'
+    LINK = 'link'
+
+    KIND_CHOICES = [
+        (UPLOAD, 'Upload'),
+        (SHARE, 'Share'),
+        (LINK, 'Share link'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=6, choices=KIND_CHOICES)
+    actor_id = models.IntegerField()  # Not a foreign key, so events outlive deleted users
+    role = models.CharField(max_length=10)  # Role of the actor at the time
+    size = models.BigIntegerField(default=0)  # Bytes uploaded
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} by user {self.actor_id} at {self.created_at}"
+
+
+class ActivityRollup(models.Model):
+    """Upload, share and link activity of one role over one hour or day.
+
+    Filled in by the ``rollup_activity`` command once a period has closed,
+    so the admin statistics read a handful of rows instead of aggregating
+    the file tables. Every closed period has a row per role, even when
+    there was no activity, which makes the latest bucket the watermark.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+
+    PERIOD_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()  # Start of the period
+    role = models.CharField(max_length=10)
+    uploads = models.PositiveIntegerField(default=0)
+    upload_bytes = models.BigIntegerField(default=0)
+    shares = models.PositiveIntegerField(default=0)
+    links_created = models.PositiveIntegerField(default=0)
+    active_users = models.PositiveIntegerField(default=0)  # Users who uploaded, shared or created a link
+
+    class Meta:
+        unique_together = ('period', 'bucket', 'role')
+        ordering = ['period', 'bucket', 'role']
+
+    def __str__(self):
+        return f"{self.role} activity for the {self.period} starting {self.bucket}"
+
+
+class UploadKey(models.Model):
+    """An ``Idempotency-Key`` sent with an upload, and the file it created.
+
+    ``file_id`` stays empty while the upload is in progress. Keys are kept
+    for ``UPLOAD_KEY_TTL`` seconds, after which ``sweep_upload_keys`` deletes
+    them and the key may be reused.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_keys', db_index=False
+    )
+    key = models.CharField(max_length=64)
+    file_id = models.UUIDField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"Upload key {self.key} of user {self.user_id}"
@@ -0,0 +1,47 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from core.constants import OUTBOX_RETRY_BASE_DELAY, OUTBOX_RETRY_MAX_DELAY
+
+
+def get_retry_delay(attempts):
+    delay = OUTBOX_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(delay, OUTBOX_RETRY_MAX_DELAY))
+
+
+def drain_outbox(model, handler, batch_size, max_batches=None):
+    """Process due entries of an ``OutboxEntry`` model in batches.
+
+    ``handler`` receives a list of entries and returns a ``{pk: error}`` dict
+    for the ones that failed. Successful entries are deleted, failed ones are
+    rescheduled with exponential backoff. Draining stops early when a whole
+    batch fails, since the downstream service is most likely unavailable.
+
+    Returns a ``(done, failed)`` tuple of entry counts.
+    """
+    done = failed = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        now = timezone.now()
+        batch = list(model.objects.filter(next_attempt_at__lte=now)[:batch_size])
+        if not batch:
+            break
+        batches += 1
+
+        errors = handler(batch)
+        with transaction.atomic():
+            model.objects.filter(pk__in=[entry.pk for entry in batch if entry.pk not in errors]).delete()
+            for entry in batch:
+                if entry.pk in errors:
+                    model.objects.filter(pk=entry.pk).update(
+                        attempts=entry.attempts + 1,
+                        next_attempt_at=now + get_retry_delay(entry.attempts + 1),
+                        last_error=str(errors[entry.pk])[:1000],
+                    )
+
+        done += len(batch) - len(errors)
+        failed += len(errors)
+        if len(errors) == len(batch):
+            break
+
+    return done, failed
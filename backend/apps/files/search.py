@@ -0,0 +1,101 @@
+"""
+Filename search over the files a user owns or has been shared.
+
+On SQLite, queries of three or more characters that few names contain are
+looked up in the ``files_file_search`` FTS5 trigram index (migration 0017)
+instead of reading every file the user can see. Common and shorter queries,
+and other databases, walk the user's files in name order with ``LIKE``,
+which fills a page quickly precisely because many names match. Results are
+paginated with a keyset cursor on ``(name, id)``.
+"""
+
+import base64
+import binascii
+import heapq
+import uuid
+import orjson
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import File, FileShare
+from .serializers import FILE_LIST_COLUMNS, build_file_entries, get_shared_with
+
+TRIGRAM_LENGTH = 3  # Shortest query the trigram index can answer
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(name, file_id):
+    return base64.urlsafe_b64encode(orjson.dumps([name, str(file_id)])).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    try:
+        name, file_id = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(name), uuid.UUID(file_id)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise InvalidCursor()
+
+
+def get_match_phrase(query):
+    # A quoted phrase of trigrams matches the query anywhere in the name
+    return 'name:"' + query.replace('"', '""') + '"'
+
+
+def match_names(query):
+    """Return the ids of the files whose name contains ``query``, or ``None``.
+
+    ``None`` means the index can't narrow the search down: the query is too
+    short for a trigram, the database isn't SQLite, or more than
+    ``SEARCH_INDEX_MAX_MATCHES`` names match. Walking the user's files in
+    name order finds a page of a common query sooner than intersecting them
+    with all of its matches, so the lookup stops there.
+    """
+    if connection.vendor != 'sqlite' or len(query) < TRIGRAM_LENGTH:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.file_id FROM files_file_search s JOIN files_file_search_content c ON c.id = s.rowid '
+            'WHERE files_file_search MATCH %s LIMIT %s',
+            [get_match_phrase(query), settings.SEARCH_INDEX_MAX_MATCHES + 1],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    return ids if len(ids) <= settings.SEARCH_INDEX_MAX_MATCHES else None
+
+
+def search_files(user, query, prefix=False, cursor=None, limit=50):
+    """Return a ``(entries, next_cursor)`` page of matching files.
+
+    Entries have the ``FileSerializer`` shape. ``prefix`` matches names that
+    start with ``query`` instead of containing it; both are case-insensitive.
+    Raises ``InvalidCursor`` for a malformed cursor.
+    """
+    files = File.objects.filter(name__istartswith=query) if prefix else File.objects.filter(name__icontains=query)
+    if cursor:
+        name, file_id = decode_cursor(cursor)
+        files = files.filter(Q(name__gt=name) | Q(name=name, id__gt=file_id))
+    ids = match_names(query)
+    if ids is not None:
+        files = files.filter(pk__in=ids)
+
+    # Owned and shared files are read separately so the owned ones come off
+    # the (owner, name, id) index in order, then the two pages are merged
+    pages = [
+        files.filter(owner=user),
+        files.filter(pk__in=FileShare.objects.filter(shared_with=user).values('file_id')),
+    ]
+    pages = [page.order_by('name', 'id').values_list(*FILE_LIST_COLUMNS)[:limit + 1] for page in pages]
+    rows = []
+    for row in heapq.merge(*pages, key=lambda row: (row[1], row[0])):
+        if not rows or rows[-1][0] != row[0]:
+            rows.append(row)
+    rows = rows[:limit + 1]
+
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    shared_with = get_shared_with(FileShare.objects.filter(file_id__in=[row[0] for row in rows]))
+    return build_file_entries(rows, shared_with, timezone.get_current_timezone()), next_cursor
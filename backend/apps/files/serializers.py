@@ -1,4 +1,8 @@
+from collections import defaultdict
+from itertools import islice
+from django.utils import timezone
 from rest_framework import serializers
+from core.renderers import render_json
 from .models import File, FileShare, FileShareLink
 
 class FileShareSerializer(serializers.ModelSerializer):
@@ -33,4 +37,59 @@ class FileSerializer(serializers.ModelSerializer):
 class FileShareLinkSerializer(serializers.ModelSerializer):
     class Meta:
         model = FileShareLink
-        fields = ('id', 'created_at', 'expires_at') 
\ No newline at end of file
+        fields = ('id', 'created_at', 'expires_at') 
+
+def format_datetime(value, tz):
+    # Same output as DRF's DateTimeField with the default ISO 8601 format
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+FILE_LIST_COLUMNS = ('id', 'name', 'mime_type', 'size', 'created_at', 'updated_at', 'owner_id', 'owner__email')
+
+def get_shared_with(shares):
+    shared_with = defaultdict(list)
+    for file_id, user_id, email in shares.values_list('file_id', 'shared_with_id', 'shared_with__email'):
+        shared_with[file_id].append({'id': user_id, 'email': email})
+    return shared_with
+
+def build_file_entries(rows, shared_with, tz):
+    return [
+        {
+            'id': str(file_id),
+            'name': name,
+            'mime_type': mime_type,
+            'size': size,
+            'created_at': format_datetime(created_at, tz),
+            'updated_at': format_datetime(updated_at, tz),
+            'url': f'/api/files/{file_id}/download/',
+            'shared_with': shared_with.get(file_id, []),
+            'owner': {'id': owner_id, 'email': owner_email},
+        }
+        for file_id, name, mime_type, size, created_at, updated_at, owner_id, owner_email in rows
+    ]
+
+def render_file_list(files):
+    """Render a File queryset to the JSON bytes ``FileSerializer`` would produce.
+
+    Fetches only the needed columns with two queries, one for the files with
+    their owners and one for their shares, and encodes with orjson instead of
+    building model instances and running DRF fields for every row.
+    """
+    shared_with = get_shared_with(FileShare.objects.filter(file__in=files))
+    rows = files.values_list(*FILE_LIST_COLUMNS)
+    return render_json(build_file_entries(rows, shared_with, timezone.get_current_timezone()))
+
+def iter_file_entries(files, chunk_size):
+    """Yield the ``FileSerializer`` representation of each file in ``files``.
+
+    Rows are read through a server-side cursor and the shares are loaded one
+    chunk of files at a time, so memory use does not depend on the number
+    of files.
+    """
+    tz = timezone.get_current_timezone()
+    rows = files.values_list(*FILE_LIST_COLUMNS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        shared_with = get_shared_with(FileShare.objects.filter(file_id__in=[row[0] for row in chunk]))
+        yield from build_file_entries(chunk, shared_with, tz)
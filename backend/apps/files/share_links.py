@@ -0,0 +1,96 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from core.metrics import SHARE_LINK_SWEEP_BATCH_SECONDS, SHARE_LINKS_SWEPT
+from .kms import enqueue_key_deletions
+from .models import FileShareLink
+
+
+def share_link_cache_key(link_id):
+    return f'share_link:{link_id}'
+
+
+def get_share_link(link_id):
+    """Return what is needed to serve a share link, or ``None``.
+
+    ``None`` means the link does not exist, has expired or was revoked. The
+    result comes from the link row and the file's blob path, cached until
+    the link expires, so repeat hits on a popular link skip the database.
+    Entries are dropped when the link is deleted or revoked.
+    """
+    key = share_link_cache_key(link_id)
+    entry = cache.get(key)
+    if entry is None:
+        # Expired and revoked links are filtered out by the query, so an
+        # expired link never loads the file
+        share_link = (
+            FileShareLink.objects.select_related('file')
+            .filter(id=link_id, expires_at__gt=timezone.now(), revoked_at__isnull=True)
+            .only('iv', 'name', 'mime_type', 'expires_at', 'file__file', 'file__chunk_size', 'file__chunk_count')
+            .first()
+        )
+        if share_link is None:
+            return None
+        entry = {
+            'iv': share_link.iv,
+            'name': share_link.name,
+            'mime_type': share_link.mime_type,
+            'path': share_link.file.file.name,
+            'chunk_size': share_link.file.chunk_size,
+            'chunk_count': share_link.file.chunk_count,
+            'expires_at': share_link.expires_at.timestamp(),
+        }
+        ttl = entry['expires_at'] - time.time()
+        if ttl > 0:
+            cache.set(key, entry, timeout=ttl)
+
+    # An entry may outlive the link by a fraction of a second
+    if entry['expires_at'] <= time.time():
+        return None
+    return entry
+
+
+def invalidate_share_link(link_id):
+    cache.delete(share_link_cache_key(link_id))
+
+
+def sweep_expired_share_links(batch_size=None, max_batches=None, grace=None):
+    """Delete share links that expired more than ``grace`` seconds ago.
+
+    Links are removed oldest first in batches of ``batch_size``, each in its
+    own short transaction, so the sweeper never holds locks on a large part
+    of the table. The keys copied to the link ids are queued for deletion
+    from the KMS in the same transaction.
+
+    Returns the number of links deleted.
+    """
+    batch_size = batch_size or settings.SHARE_LINK_SWEEP_BATCH_SIZE
+    grace = settings.SHARE_LINK_SWEEP_GRACE if grace is None else grace
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    deleted = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        start = time.perf_counter()
+        with transaction.atomic():
+            # Served by the expires_at index
+            link_ids = list(
+                FileShareLink.objects.filter(expires_at__lte=cutoff)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not link_ids:
+                break
+            FileShareLink.objects.filter(id__in=link_ids).delete()
+            enqueue_key_deletions(link_ids)
+        SHARE_LINK_SWEEP_BATCH_SECONDS.observe(time.perf_counter() - start)
+        SHARE_LINKS_SWEPT.inc(len(link_ids))
+
+        deleted += len(link_ids)
+        batches += 1
+        if len(link_ids) < batch_size:
+            break
+
+    return deleted
@@ -0,0 +1,134 @@
+"""
+Stateless share-link tokens.
+
+A token carries the share link id, the file id and the expiry time, signed
+with an HMAC derived from ``SECRET_KEY``. Resolving a token checks the
+signature and the expiry in memory; revoked links are rejected through a
+deny-set of revoked, not yet expired link ids that each process refreshes
+from the database every ``SHARE_LINK_REVOCATION_REFRESH`` seconds.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from django.conf import settings
+from django.utils import timezone
+from .models import FileShareLink
+
+TOKEN_SALT = b'apps.files.share_tokens'
+PAYLOAD_FORMAT = '>16s16sQ'  # link id, file id, expiry as a unix timestamp
+PAYLOAD_SIZE = struct.calcsize(PAYLOAD_FORMAT)
+SIGNATURE_SIZE = 16  # bytes of the HMAC-SHA256 digest kept in the token
+
+
+class InvalidShareToken(Exception):
+    pass
+
+
+class ExpiredShareToken(Exception):
+    pass
+
+
+class RevokedShareToken(Exception):
+    pass
+
+
+@lru_cache(maxsize=4)
+def _signing_key(secret_key):
+    return hashlib.sha256(TOKEN_SALT + secret_key.encode()).digest()
+
+
+def _sign(payload):
+    return hmac.digest(_signing_key(settings.SECRET_KEY), payload, 'sha256')[:SIGNATURE_SIZE]
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def make_share_token(share_link):
+    payload = struct.pack(
+        PAYLOAD_FORMAT,
+        share_link.id.bytes,
+        share_link.file_id.bytes,
+        int(share_link.expires_at.timestamp()),
+    )
+    return _b64encode(payload + _sign(payload))
+
+
+def resolve_share_token(token):
+    """Return the ``(link_id, file_id, expires_at)`` a token grants access to.
+
+    Raises ``InvalidShareToken``, ``ExpiredShareToken`` or
+    ``RevokedShareToken`` without touching the database, apart from the
+    periodic deny-set refresh.
+    """
+    try:
+        data = _b64decode(token)
+    except (binascii.Error, ValueError):
+        raise InvalidShareToken()
+    if len(data) != PAYLOAD_SIZE + SIGNATURE_SIZE:
+        raise InvalidShareToken()
+
+    payload, signature = data[:PAYLOAD_SIZE], data[PAYLOAD_SIZE:]
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidShareToken()
+
+    link_bytes, file_bytes, expires = struct.unpack(PAYLOAD_FORMAT, payload)
+    if time.time() > expires:
+        raise ExpiredShareToken()
+
+    link_id = uuid.UUID(bytes=link_bytes)
+    if revocations.is_revoked(link_id):
+        raise RevokedShareToken()
+    return link_id, uuid.UUID(bytes=file_bytes), datetime.fromtimestamp(expires, dt_timezone.utc)
+
+
+class RevocationList:
+    """Periodically refreshed set of revoked share link ids.
+
+    Only links that are revoked and not yet expired are loaded, since expired
+    tokens are rejected anyway, so the set stays small.
+    """
+
+    def __init__(self):
+        self.revoked = frozenset()
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def is_revoked(self, link_id):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > settings.SHARE_LINK_REVOCATION_REFRESH:
+            self.refresh()
+        return link_id in self.revoked
+
+    def refresh(self):
+        with self.lock:
+            self.revoked = frozenset(
+                FileShareLink.objects.filter(revoked_at__isnull=False, expires_at__gt=timezone.now())
+                .values_list('id', flat=True)
+            )
+            self.loaded_at = time.monotonic()
+
+    def add(self, link_id):
+        """Apply a revocation made in this process without waiting for a refresh."""
+        with self.lock:
+            self.revoked = self.revoked | {link_id}
+
+    def clear(self):
+        with self.lock:
+            self.revoked = frozenset()
+            self.loaded_at = None
+
+
+revocations = RevocationList()
@@ -0,0 +1,101 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from apps.authentication.models import User
+from core.cache import ALL_FILES, invalidate, user_scope
+from .changes import record_changes
+from .models import ActivityEvent, ChangeEvent, File, FileShare, FileShareLink
+from .share_links import invalidate_share_link
+from .stats import record_activity
+from .usage import release_storage
+
+
+@receiver(post_save, sender=FileShareLink)
+def share_link_saved(sender, instance, created, **kwargs):
+    if created:
+        record_activity([ActivityEvent(
+            kind=ActivityEvent.LINK, actor_id=instance.created_by_id, role=instance.created_by.role
+        )])
+
+
+@receiver(post_delete, sender=FileShareLink)
+def share_link_deleted(sender, instance, **kwargs):
+    # Also fires for links removed along with their file
+    invalidate_share_link(instance.id)
+
+
+@receiver(post_save, sender=File)
+def file_saved(sender, instance, created, **kwargs):
+    scopes = [ALL_FILES, user_scope(instance.owner_id)]
+    if created:
+        record_changes([ChangeEvent(kind=ChangeEvent.CREATED, file_id=instance.id, owner_id=instance.owner_id)])
+        record_activity([ActivityEvent(
+            kind=ActivityEvent.UPLOAD, actor_id=instance.owner_id, role=instance.owner.role, size=instance.size
+        )])
+    else:
+        # Recipients see the file in their shared_with_me list
+        scopes += [user_scope(user_id) for user_id in instance.shares.values_list('shared_with_id', flat=True)]
+    invalidate(*scopes)
+
+
+@receiver(post_delete, sender=File)
+def file_deleted(sender, instance, **kwargs):
+    # Recipients are covered by the signals of the shares deleted with it
+    record_changes([ChangeEvent(kind=ChangeEvent.DELETED, file_id=instance.id, owner_id=instance.owner_id)])
+    release_storage(instance.owner_id, 1, instance.size)
+    invalidate(ALL_FILES, user_scope(instance.owner_id))
+
+
+def get_file_owner_id(share, origin=None):
+    if FileShare.file.is_cached(share):
+        return share.file.owner_id
+    if isinstance(origin, File):
+        return origin.owner_id
+    # Shares are deleted before their file, so the row is still there
+    return File.objects.filter(pk=share.file_id).values_list('owner_id', flat=True).first()
+
+
+@receiver(post_save, sender=FileShare)
+def file_share_saved(sender, instance, created, **kwargs):
+    owner_id = get_file_owner_id(instance)
+    if created:
+        record_changes([ChangeEvent(
+            kind=ChangeEvent.SHARED, file_id=instance.file_id, owner_id=owner_id, recipient_id=instance.shared_with_id
+        )])
+        record_activity([ActivityEvent(
+            kind=ActivityEvent.SHARE, actor_id=instance.shared_by_id, role=instance.shared_by.role
+        )])
+    invalidate(ALL_FILES, user_scope(owner_id), user_scope(instance.shared_with_id))
+
+
+@receiver(post_delete, sender=FileShare)
+def file_share_deleted(sender, instance, origin=None, **kwargs):
+    owner_id = get_file_owner_id(instance, origin)
+    record_changes([ChangeEvent(
+        kind=ChangeEvent.UNSHARED, file_id=instance.file_id, owner_id=owner_id, recipient_id=instance.shared_with_id
+    )])
+    invalidate(ALL_FILES, user_scope(owner_id), user_scope(instance.shared_with_id))
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    # Saves that can't change the email, e.g. of last_login, skip the lookup
+    if instance.pk is not None and (update_fields is None or 'email' in update_fields):
+        instance._saved_email = User.objects.filter(pk=instance.pk).values_list('email', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """Invalidate the cached lists of everyone who sees the user's email.
+
+    Owners see it among the recipients of their files, and recipients as the
+    owner or a fellow recipient of the files shared with them.
+    """
+    if created or vars(instance).pop('_saved_email', instance.email) == instance.email:
+        return
+    files = File.objects.filter(Q(owner_id=instance.id) | Q(shares__shared_with_id=instance.id))
+    shares = FileShare.objects.filter(file__in=files).values_list('file__owner_id', 'shared_with_id')
+    user_ids = set()
+    for owner_id, recipient_id in shares:
+        user_ids.update((owner_id, recipient_id))
+    invalidate(ALL_FILES, *(user_scope(user_id) for user_id in user_ids))
@@ -0,0 +1,138 @@
+"""
+Hourly and daily activity rollups behind the admin statistics.
+
+Uploads, shares and share links are logged as ``ActivityEvent`` rows when
+they are created, and ``rollup_activity`` aggregates each closed period once
+from that log and stores a row per role. Files, shares and links deleted or
+swept before their period is rolled up are still counted. Periods are only
+rolled up ``STATS_ROLLUP_SETTLE_DELAY`` seconds after they end, so events
+from transactions that were still open at the boundary are counted. Activity
+is attributed to the actor's role at the time, and events are pruned once
+every period they fall in has been rolled up.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import ActivityEvent, ActivityRollup
+
+PERIOD_LENGTHS = {
+    ActivityRollup.HOUR: timedelta(hours=1),
+    ActivityRollup.DAY: timedelta(days=1),
+}
+COUNTERS = ['uploads', 'upload_bytes', 'shares', 'links_created', 'active_users']
+PRUNE_BATCH_SIZE = 1000
+
+
+def record_activity(events):
+    """Log activity for the rollups; call in the transaction creating the rows."""
+    ActivityEvent.objects.bulk_create(events)
+
+
+def get_roles():
+    return [role for role, _ in get_user_model().ROLE_CHOICES]
+
+
+def truncate(value, period):
+    value = value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if period == ActivityRollup.DAY else value
+
+
+def get_first_bucket(period):
+    """Return the first period not rolled up yet, or ``None`` if there is no activity at all."""
+    last = ActivityRollup.objects.filter(period=period).aggregate(last=Max('bucket'))['last']
+    if last is not None:
+        return last + PERIOD_LENGTHS[period]
+
+    first = ActivityEvent.objects.aggregate(first=Min('created_at'))['first']
+    return truncate(first, period) if first is not None else None
+
+
+def aggregate_period(period, start):
+    end = start + PERIOD_LENGTHS[period]
+    rows = {role: ActivityRollup(period=period, bucket=start, role=role) for role in get_roles()}
+
+    totals = (
+        ActivityEvent.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values('role')
+        .annotate(
+            uploads=Count('id', filter=Q(kind=ActivityEvent.UPLOAD)),
+            upload_bytes=Coalesce(Sum('size', filter=Q(kind=ActivityEvent.UPLOAD)), 0),
+            shares=Count('id', filter=Q(kind=ActivityEvent.SHARE)),
+            links_created=Count('id', filter=Q(kind=ActivityEvent.LINK)),
+            active_users=Count('actor_id', distinct=True),
+        )
+    )
+    for entry in totals.order_by():
+        if entry['role'] in rows:
+            for counter in COUNTERS:
+                setattr(rows[entry['role']], counter, entry[counter])
+
+    return list(rows.values())
+
+
+def prune_activity(before):
+    """Delete events older than ``before`` in batches."""
+    while True:
+        with transaction.atomic():
+            # Served by the created_at index
+            ids = list(
+                ActivityEvent.objects.filter(created_at__lt=before)
+                .order_by('created_at')
+                .values_list('id', flat=True)[:PRUNE_BATCH_SIZE]
+            )
+            if not ids:
+                break
+            ActivityEvent.objects.filter(id__in=ids).delete()
+
+
+def rollup_activity(settle_delay=None):
+    """Roll up every closed hour and day since the last run.
+
+    Returns the number of periods rolled up.
+    """
+    settle_delay = settings.STATS_ROLLUP_SETTLE_DELAY if settle_delay is None else settle_delay
+    cutoff = timezone.now() - timedelta(seconds=settle_delay)
+    rolled_up = 0
+
+    for period, length in PERIOD_LENGTHS.items():
+        start = get_first_bucket(period)
+        while start is not None and start + length <= cutoff:
+            with transaction.atomic():
+                ActivityRollup.objects.bulk_create(aggregate_period(period, start), ignore_conflicts=True)
+            start += length
+            rolled_up += 1
+
+    # Events are kept until both the hour and the day they fall in are rolled up
+    watermarks = [get_first_bucket(period) for period in PERIOD_LENGTHS]
+    if None not in watermarks:
+        prune_activity(min(watermarks))
+
+    return rolled_up
+
+
+def get_activity(period, limit):
+    """Return the latest ``limit`` rolled up periods, oldest first.
+
+    Reads ``limit`` rows per role off the end of the rollup index, however
+    much activity is recorded.
+    """
+    roles = get_roles()
+    rows = list(ActivityRollup.objects.filter(period=period).order_by('-bucket', 'role')[:limit * len(roles)])
+
+    buckets = {}
+    for row in reversed(rows):
+        bucket = buckets.setdefault(row.bucket, {
+            'start': row.bucket,
+            **{counter: 0 for counter in COUNTERS},
+            'by_role': {},
+        })
+        counters = {counter: getattr(row, counter) for counter in COUNTERS}
+        bucket['by_role'][row.role] = counters
+        for counter, value in counters.items():
+            bucket[counter] += value  # Every user has one role, so active users add up too
+    return list(buckets.values())
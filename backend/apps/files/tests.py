@@ -1,3 +1,1116 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from io import StringIO
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.conf import settings
+from django.db import connection
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from asgiref.sync import sync_to_async
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from apps.authentication.models import User
+from apps.authentication.views import create_full_access_token
+from apps.jobs.worker import Worker
+from . import events
+from .blobs import purge_blob_deletions
+from .kms import KMSClient, purge_key_deletions
+from .models import (
+    ActivityEvent,
+    ActivityRollup,
+    BlobDeletion,
+    ChangeEvent,
+    File,
+    FileShare,
+    FileShareLink,
+    KeyDeletion,
+    StorageUsage,
+    UploadKey,
+)
+from .serializers import FileSerializer, render_file_list
+from .share_links import sweep_expired_share_links
+from .share_tokens import revocations
 
-# Create your tests here.
+
+class FakeKMS:
+    """In-process stand-in for the KMS ``/delete`` route."""
+
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+        self.requests = []
+        self.connections = set()
+        self.fail = False
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                fake.connections.add(self.client_address)
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                fake.requests.append(body['file_ids'])
+                if fake.fail:
+                    return self.reply(500, {'detail': 'Failed to delete keys'})
+                deleted = [key_id for key_id in body['file_ids'] if key_id in fake.keys]
+                fake.keys.difference_update(deleted)
+                self.reply(200, {
+                    'status': 'success',
+                    'deleted': deleted,
+                    'not_found': [key_id for key_id in body['file_ids'] if key_id not in deleted],
+                })
+
+            def reply(self, status, data):
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FileTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.admin = User.objects.create_user(
+            username='admin@example.com', email='admin@example.com', password='x', role=User.ADMIN
+        )
+        self.user = User.objects.create_user(
+            username='user@example.com', email='user@example.com', password='x', role=User.REGULAR
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_file(self, owner=None, name='report.pdf'):
+        owner = owner or self.user
+        return File.objects.create(
+            name=name,
+            file=ContentFile(b'ciphertext', name=name),
+            mime_type='application/pdf',
+            size=10,
+            owner=owner,
+            iv='aXY=',
+        )
+
+
+class KMSKeyPurgeTests(FileTestCase):
+    def test_delete_file_enqueues_file_and_share_link_keys(self):
+        file = self.create_file()
+        link = FileShareLink.objects.create(
+            file=file, created_by=self.user, expires_at=timezone.now(),
+            iv=file.iv, name=file.name, mime_type=file.mime_type,
+        )
+
+        response = self.client.delete(f'/api/files/{file.id}/', secure=True)
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            set(KeyDeletion.objects.values_list('key_id', flat=True)),
+            {str(file.id), str(link.id)},
+        )
+
+    def test_delete_user_enqueues_all_file_keys(self):
+        files = [self.create_file(name=f'{i}.pdf') for i in range(3)]
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.delete(f'/api/auth/users/{self.user.id}/', secure=True)
+
+        # The account is disabled at once and removed by the job worker
+        self.assertEqual(response.status_code, 202)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(Worker().run(burst=True), 1)
+
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+        self.assertEqual(
+            set(KeyDeletion.objects.values_list('key_id', flat=True)),
+            {str(file.id) for file in files},
+        )
+        self.assertEqual(
+            set(BlobDeletion.objects.values_list('path', flat=True)),
+            {file.file.name for file in files},
+        )
+
+    def test_purge_sends_batches_over_one_connection(self):
+        key_ids = [f'key-{i}' for i in range(5)]
+        KeyDeletion.objects.bulk_create(KeyDeletion(key_id=key_id) for key_id in key_ids)
+
+        with FakeKMS(keys=key_ids[:3]) as kms:
+            client = KMSClient(kms.url, 'token')
+            purged, failed = purge_key_deletions(client=client, batch_size=2)
+            client.close()
+
+        self.assertEqual((purged, failed), (5, 0))
+        self.assertEqual([len(batch) for batch in kms.requests], [2, 2, 1])
+        self.assertEqual(len(kms.connections), 1)
+        self.assertEqual(kms.keys, set())
+        self.assertFalse(KeyDeletion.objects.exists())
+
+    @override_settings(KMS_API_TOKEN=None)
+    def test_purge_refuses_to_run_without_a_service_token(self):
+        KeyDeletion.objects.create(key_id='key-1')
+        with self.assertRaises(ImproperlyConfigured):
+            purge_key_deletions()
+        self.assertTrue(KeyDeletion.objects.exists())
+
+    def test_purge_reschedules_failed_batch(self):
+        KeyDeletion.objects.create(key_id='key-1')
+
+        with FakeKMS(keys=['key-1']) as kms:
+            kms.fail = True
+            client = KMSClient(kms.url, 'token')
+            purged, failed = purge_key_deletions(client=client)
+
+            self.assertEqual((purged, failed), (0, 1))
+            entry = KeyDeletion.objects.get()
+            self.assertEqual(entry.attempts, 1)
+            self.assertGreater(entry.next_attempt_at, timezone.now())
+            self.assertIn('500', entry.last_error)
+
+            # Entries are only retried once their backoff has elapsed
+            kms.fail = False
+            self.assertEqual(purge_key_deletions(client=client), (0, 0))
+            KeyDeletion.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(purge_key_deletions(client=client), (1, 0))
+            client.close()
+
+        self.assertEqual(kms.keys, set())
+
+
+@override_settings(METRICS_ENABLED=1, METRICS_TOKEN='metrics-token')
+class MetricsTests(FileTestCase):
+    def test_metrics_endpoint_reports_view_latency(self):
+        self.client.get('/api/files/', secure=True)
+
+        response = self.client.get('/metrics', secure=True, HTTP_AUTHORIZATION='Bearer metrics-token')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            b'django_view_latency_seconds_count{method="GET",view="list_files"}',
+            response.content,
+        )
+
+    def test_metrics_endpoint_requires_the_token(self):
+        self.assertEqual(self.client.get('/metrics', secure=True).status_code, 401)
+        response = self.client.get('/metrics', secure=True, HTTP_AUTHORIZATION='Bearer other')
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN=None):
+            response = self.client.get('/metrics', secure=True, HTTP_AUTHORIZATION='Bearer metrics-token')
+            self.assertEqual(response.status_code, 403)
+        # Not exempt from the HTTPS redirect
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer metrics-token').status_code, 301)
+        with override_settings(METRICS_ENABLED=0):
+            response = self.client.get('/metrics', secure=True, HTTP_AUTHORIZATION='Bearer metrics-token')
+            self.assertEqual(response.status_code, 404)
+
+
+class BatchUploadTests(FileTestCase):
+    def test_batch_upload_reports_per_file_results(self):
+        response = self.client.post('/api/files/upload/batch/', {
+            'files': [
+                SimpleUploadedFile('a.pdf', b'aaa', content_type='application/pdf'),
+                SimpleUploadedFile('b.exe', b'bbb', content_type='application/x-msdownload'),
+                SimpleUploadedFile('c.png', b'ccc', content_type='image/png'),
+            ],
+            'ivs': ['aXYx', 'aXYy', 'aXYz'],
+        }, secure=True)
+
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'created'])
+        self.assertEqual(results[1]['error'], 'Invalid file type')
+
+        files = {str(file.id): file for file in File.objects.filter(owner=self.user)}
+        self.assertEqual(set(files), {results[0]['file']['id'], results[2]['file']['id']})
+        file = files[results[2]['file']['id']]
+        self.assertEqual((file.name, file.iv, file.size), ('c.png', 'aXYz', 3))
+        with file.file.open('rb') as f:
+            self.assertEqual(f.read(), b'ccc')
+
+    def test_failed_batch_removes_the_stored_blobs(self):
+        with mock.patch('apps.files.views.record_changes', side_effect=RuntimeError('Feed down')):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/files/upload/batch/', {
+                    'files': [
+                        SimpleUploadedFile('a.pdf', b'aaa', content_type='application/pdf'),
+                        SimpleUploadedFile('b.pdf', b'bbb', content_type='application/pdf'),
+                    ],
+                    'ivs': ['aXYx', 'aXYy'],
+                }, secure=True)
+
+        self.assertFalse(File.objects.exists())
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.media_root)), 0)
+
+    def test_batch_upload_requires_one_iv_per_file(self):
+        response = self.client.post('/api/files/upload/batch/', {
+            'files': [SimpleUploadedFile('a.pdf', b'aaa', content_type='application/pdf')],
+            'ivs': [],
+        }, secure=True)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(File.objects.exists())
+
+
+class ChunkedBlobTests(FileTestCase):
+    CHUNK_SIZE = 16 * 1024
+
+    def encrypt_chunked(self, plaintext, key, iv):
+        # Same construction as encryptFileChunked in the frontend
+        count = max(-(-len(plaintext) // self.CHUNK_SIZE), 1)
+        chunks = []
+        for index in range(count):
+            nonce = iv[:8] + (int.from_bytes(iv[8:], 'big') ^ index).to_bytes(4, 'big')
+            chunk = plaintext[index * self.CHUNK_SIZE:(index + 1) * self.CHUNK_SIZE]
+            chunks.append(AESGCM(key).encrypt(nonce, chunk, bytes([index == count - 1])))
+        return b''.join(chunks)
+
+    def test_chunk_ranges_decrypt_independently(self):
+        key, iv = AESGCM.generate_key(bit_length=256), os.urandom(12)
+        plaintext = os.urandom(self.CHUNK_SIZE * 3 + 100)
+        response = self.client.post('/api/files/upload/', {
+            'file': SimpleUploadedFile('movie.mp4', self.encrypt_chunked(plaintext, key, iv), content_type='video/mp4'),
+            'iv': base64.b64encode(iv).decode(),
+            'chunk_size': self.CHUNK_SIZE,
+        }, secure=True)
+        self.assertEqual(response.status_code, 201)
+        file_id = response.data['id']
+
+        manifest = self.client.get(f'/api/files/{file_id}/chunks/', secure=True).data
+        self.assertEqual((manifest['chunk_count'], manifest['offsets'][1]), (4, self.CHUNK_SIZE + 16))
+
+        response = self.client.get(f'/api/files/{file_id}/chunks/', {'chunks': '2-3'}, secure=True)
+        self.assertEqual(response['X-Chunk-Range'], '2-3')
+        data = b''.join(response.streaming_content)
+        stride = self.CHUNK_SIZE + 16
+        nonce = iv[:8] + (int.from_bytes(iv[8:], 'big') ^ 3).to_bytes(4, 'big')
+        self.assertEqual(AESGCM(key).decrypt(nonce, data[stride:], b'\x01'), plaintext[self.CHUNK_SIZE * 3:])
+
+        response = self.client.get(f'/api/files/{file_id}/chunks/', {'chunks': '4'}, secure=True)
+        self.assertEqual(response.status_code, 416)
+
+    def test_chunk_size_must_match_the_blob(self):
+        response = self.client.post('/api/files/upload/', {
+            'file': SimpleUploadedFile('a.pdf', b'x' * 10, content_type='application/pdf'),
+            'iv': 'aXY=',
+            'chunk_size': self.CHUNK_SIZE,
+        }, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'File size does not match the chunk size')
+
+
+class UploadKeyTests(FileTestCase):
+    def upload(self, key, data=None):
+        data = data if data is not None else {
+            'file': SimpleUploadedFile('a.pdf', b'aaa', content_type='application/pdf'),
+            'iv': 'aXY=',
+        }
+        return self.client.post('/api/files/upload/', data, HTTP_IDEMPOTENCY_KEY=key, secure=True)
+
+    def test_retry_replays_the_original_file(self):
+        first = self.upload('key-1')
+        self.assertEqual(first.status_code, 201)
+
+        # The replay is answered before the body is read, so it may even be empty
+        retry = self.upload('key-1', {})
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(File.objects.filter(owner=self.user).count(), 1)
+
+        self.assertEqual(self.upload('key-2').status_code, 201)
+        self.assertEqual(File.objects.filter(owner=self.user).count(), 2)
+
+    def test_duplicate_of_an_upload_in_progress_is_rejected(self):
+        UploadKey.objects.create(user=self.user, key='key-1')
+
+        response = self.upload('key-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(File.objects.exists())
+
+        # Abandoned keys are taken over once the pending timeout has passed
+        UploadKey.objects.update(created_at=timezone.now() - timedelta(seconds=settings.UPLOAD_KEY_PENDING_TIMEOUT))
+        self.assertEqual(self.upload('key-1').status_code, 201)
+
+    def test_failed_upload_releases_the_key(self):
+        response = self.upload('key-1', {'iv': 'aXY='})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadKey.objects.exists())
+        self.assertEqual(self.upload('key-1').status_code, 201)
+
+    def test_sweep_deletes_expired_keys(self):
+        self.upload('key-1')
+        UploadKey.objects.update(created_at=timezone.now() - timedelta(seconds=settings.UPLOAD_KEY_TTL + 1))
+        self.upload('key-2')
+
+        out = StringIO()
+        call_command('sweep_upload_keys', stdout=out)
+        self.assertIn('Deleted 1 upload keys', out.getvalue())
+        self.assertEqual(list(UploadKey.objects.values_list('key', flat=True)), ['key-2'])
+
+
+class BulkDeleteTests(FileTestCase):
+    def test_bulk_delete_returns_per_id_results_and_defers_blob_removal(self):
+        own = self.create_file()
+        other = self.create_file(owner=self.admin)
+        missing = '00000000-0000-0000-0000-000000000000'
+
+        response = self.client.post('/api/files/bulk-delete/', {
+            'ids': [str(own.id), str(other.id), missing, 'not-a-uuid'],
+        }, format='json', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], {
+            str(own.id): 'deleted',
+            str(other.id): 'not_found',
+            missing: 'not_found',
+            'not-a-uuid': 'invalid',
+        })
+        self.assertEqual(list(File.objects.all()), [other])
+        self.assertEqual(list(KeyDeletion.objects.values_list('key_id', flat=True)), [str(own.id)])
+
+        # The blob is only unlinked by the background worker
+        self.assertTrue(own.file.storage.exists(own.file.name))
+        self.assertEqual(purge_blob_deletions(), (1, 0))
+        self.assertFalse(own.file.storage.exists(own.file.name))
+        self.assertFalse(BlobDeletion.objects.exists())
+
+    def test_failed_blob_deletion_is_retried(self):
+        class BrokenStorage:
+            def delete(self, name):
+                raise PermissionError('Read-only file system')
+
+        BlobDeletion.objects.create(path='uploads/1/a.pdf')
+
+        self.assertEqual(purge_blob_deletions(storage=BrokenStorage()), (0, 1))
+        entry = BlobDeletion.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        self.assertEqual(entry.last_error, 'Read-only file system')
+
+
+class StorageUsageTests(FileTestCase):
+    def upload(self, name='a.pdf', content=b'aaa'):
+        return self.client.post('/api/files/upload/', {
+            'file': SimpleUploadedFile(name, content, content_type='application/pdf'),
+            'iv': 'aXY=',
+        }, secure=True)
+
+    def test_uploads_and_deletes_update_usage(self):
+        self.assertEqual(self.upload().status_code, 201)
+        response = self.upload(content=b'bbbbb')
+        self.assertEqual(response.status_code, 201)
+
+        usage = StorageUsage.objects.get(user=self.user)
+        self.assertEqual((usage.file_count, usage.total_bytes), (2, 8))
+
+        self.client.delete(f"/api/files/{response.data['id']}/", secure=True)
+        response = self.client.get('/api/files/usage/', secure=True)
+        self.assertEqual(response.data, {'file_count': 1, 'used_bytes': 3, 'quota_bytes': 1024 ** 3})
+
+    def test_upload_over_quota_is_rejected(self):
+        StorageUsage.objects.create(user=self.user, quota_bytes=5)
+        self.assertEqual(self.upload(content=b'aaa').status_code, 201)
+
+        response = self.upload(content=b'bbb')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['used_bytes'], 3)
+        self.assertEqual(File.objects.count(), 1)
+
+        # A batch that doesn't fit as a whole is rejected as a whole
+        response = self.client.post('/api/files/upload/batch/', {
+            'files': [
+                SimpleUploadedFile('b.pdf', b'b', content_type='application/pdf'),
+                SimpleUploadedFile('c.pdf', b'cc', content_type='application/pdf'),
+            ],
+            'ivs': ['aXYx', 'aXYy'],
+        }, secure=True)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(File.objects.count(), 1)
+        self.assertEqual(StorageUsage.objects.get(user=self.user).total_bytes, 3)
+
+    def test_rebuild_fixes_drift(self):
+        self.create_file()
+        self.create_file(owner=self.admin)
+        StorageUsage.objects.create(user=self.user, file_count=5, total_bytes=500, quota_bytes=100)
+
+        out = StringIO()
+        call_command('rebuild_storage_usage', chunk_size=1, stdout=out)
+
+        self.assertEqual(out.getvalue().strip(), 'Checked 2 users, corrected 2 usage counters')
+        usage = {usage.user_id: usage for usage in StorageUsage.objects.all()}
+        self.assertEqual((usage[self.user.id].file_count, usage[self.user.id].total_bytes), (1, 10))
+        self.assertEqual(usage[self.user.id].quota_bytes, 100)
+        self.assertEqual((usage[self.admin.id].file_count, usage[self.admin.id].total_bytes), (1, 10))
+
+
+class ActivityStatsTests(FileTestCase):
+    def test_closed_periods_are_rolled_up_once(self):
+        guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+        files = [self.create_file(), self.create_file(), self.create_file(owner=self.admin)]
+        FileShare.objects.create(file=files[0], shared_by=self.user, shared_with=guest)
+        ActivityEvent.objects.update(created_at=hour + timedelta(minutes=5))
+        self.create_file()  # In the current hour, which is still open
+
+        call_command('rollup_activity', settle_delay=0, stdout=StringIO())
+        # Nothing is counted twice on the next run
+        call_command('rollup_activity', settle_delay=0, stdout=StringIO())
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/files/stats/', {'period': 'hour', 'limit': 3}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        buckets = response.data['buckets']
+        self.assertEqual([bucket['start'] for bucket in buckets], [hour, hour + timedelta(hours=1)])
+        self.assertEqual(
+            {key: buckets[0][key] for key in ('uploads', 'upload_bytes', 'shares', 'active_users')},
+            {'uploads': 3, 'upload_bytes': 30, 'shares': 1, 'active_users': 2},
+        )
+        self.assertEqual(buckets[0]['by_role'][User.REGULAR]['uploads'], 2)
+        self.assertEqual(buckets[0]['by_role'][User.GUEST]['active_users'], 0)
+        self.assertEqual(buckets[1]['uploads'], 0)
+        self.assertEqual(ActivityRollup.objects.filter(period=ActivityRollup.HOUR).count(), 6)
+
+    def test_rows_deleted_before_the_rollup_are_counted(self):
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=2)
+        file = self.create_file()
+        FileShareLink.objects.create(
+            file=file, created_by=self.user, expires_at=timezone.now() - timedelta(seconds=1),
+            iv=file.iv, name=file.name, mime_type=file.mime_type,
+        )
+        ActivityEvent.objects.update(created_at=hour + timedelta(minutes=5))
+        self.assertEqual(sweep_expired_share_links(grace=0), 1)
+        file.delete()
+
+        call_command('rollup_activity', settle_delay=0, stdout=StringIO())
+
+        rollup = ActivityRollup.objects.get(period=ActivityRollup.HOUR, bucket=hour, role=User.REGULAR)
+        self.assertEqual((rollup.uploads, rollup.links_created, rollup.active_users), (1, 1, 1))
+        # Pruned once both the hour and the day are rolled up
+        self.assertFalse(ActivityEvent.objects.exists())
+
+    def test_stats_are_admin_only(self):
+        response = self.client.get('/api/files/stats/', secure=True)
+        self.assertEqual(response.status_code, 403)
+
+
+class SearchTests(FileTestCase):
+    def search(self, **params):
+        response = self.client.get('/api/files/search/', params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_covers_owned_and_shared_files(self):
+        self.create_file(name='Quarterly report.pdf')
+        self.create_file(name='notes.txt')
+        shared = self.create_file(owner=self.admin, name='annual REPORT.pdf')
+        FileShare.objects.create(file=shared, shared_by=self.admin, shared_with=self.user)
+        self.create_file(owner=self.admin, name='private report.pdf')
+
+        names = [entry['name'] for entry in self.search(q='report')['results']]
+        self.assertEqual(names, ['Quarterly report.pdf', 'annual REPORT.pdf'])
+        self.assertEqual(self.search(q='port')['results'][1]['shared_with'], [
+            {'id': self.user.id, 'email': self.user.email},
+        ])
+        # Prefix queries, including ones too short for the trigram index
+        self.assertEqual([entry['name'] for entry in self.search(q='ann', prefix='1')['results']],
+                         ['annual REPORT.pdf'])
+        self.assertEqual([entry['name'] for entry in self.search(q='n', prefix='1')['results']], ['notes.txt'])
+
+    def test_index_follows_renames_and_deletes(self):
+        file = self.create_file(name='draft.pdf')
+        File.objects.filter(pk=file.pk).update(name='final.pdf')
+        self.assertEqual(self.search(q='draft')['results'], [])
+        self.assertEqual(len(self.search(q='final')['results']), 1)
+
+        file.delete()
+        self.assertEqual(self.search(q='final')['results'], [])
+
+    def test_keyset_pagination(self):
+        for i in range(5):
+            self.create_file(name=f'scan {i}.pdf')
+            self.create_file(name='scan.pdf')  # Same name, ordered by id
+
+        names = []
+        cursor = None
+        while True:
+            page = self.search(q='scan', limit=3, **({'cursor': cursor} if cursor else {}))
+            names += [entry['name'] for entry in page['results']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(names, [f'scan {i}.pdf' for i in range(5)] + ['scan.pdf'] * 5)
+
+        response = self.client.get('/api/files/search/', {'q': 'scan', 'cursor': 'bogus'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchIndexVacuumTests(TransactionTestCase):
+    def test_index_survives_vacuum(self):
+        user = User.objects.create_user(
+            username='user@example.com', email='user@example.com', password='x', role=User.REGULAR
+        )
+        files = [
+            File.objects.create(
+                name=name, file=f'uploads/{name}', mime_type='application/pdf', size=10, owner=user, iv='aXY=',
+            )
+            for name in ('first draft.pdf', 'second draft.pdf', 'third draft.pdf')
+        ]
+        files[0].delete()
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+            # VACUUM may renumber the implicit rowids of a table without an
+            # INTEGER PRIMARY KEY, as a table rebuild does; do so explicitly
+            cursor.execute('UPDATE files_file SET rowid = rowid + 100')
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/files/search/', {'q': 'third'}, secure=True)
+        self.assertEqual([entry['id'] for entry in response.json()['results']], [str(files[2].id)])
+
+
+class ReconcileStorageTests(FileTestCase):
+    def write_blob(self, path):
+        full_path = os.path.join(self.media_root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(b'ciphertext')
+        return full_path
+
+    def reconcile(self, *args):
+        report = os.path.join(self.media_root, 'report.jsonl')
+        out = StringIO()
+        call_command('reconcile_storage', '--workers=1', '--min-age=0', f'--report={report}', *args, stdout=out)
+        with open(report) as f:
+            return out.getvalue(), sorted((entry['type'], entry['path']) for entry in map(json.loads, f))
+
+    def test_reports_orphans_and_missing_blobs(self):
+        kept = self.create_file()
+        lost = self.create_file(name='lost.pdf')
+        os.remove(lost.file.path)
+        orphan = self.write_blob(f'uploads/{self.user.id}/orphan.pdf')
+        self.write_blob('uploads/999/deleted-user.pdf')
+
+        output, entries = self.reconcile()
+
+        self.assertEqual(entries, sorted([
+            ('missing', lost.file.name),
+            ('orphan', 'uploads/999/deleted-user.pdf'),
+            ('orphan', f'uploads/{self.user.id}/orphan.pdf'),
+        ]))
+        self.assertIn('2 orphaned', output)
+        self.assertTrue(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(kept.file.path))
+
+    def test_delete_removes_only_orphans(self):
+        kept = self.create_file()
+        orphan = self.write_blob(f'uploads/{self.user.id}/orphan.pdf')
+
+        self.reconcile('--delete', '--dry-run')
+        self.assertTrue(os.path.exists(orphan))
+
+        self.reconcile('--delete')
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(kept.file.path))
+
+    def test_rows_outside_the_owners_directory(self):
+        shared = self.write_blob('uploads/999/shared.pdf')
+        for name in ['uploads/999/shared.pdf', 'uploads/elsewhere.pdf', 'uploads/999/nested/lost.pdf']:
+            File.objects.create(name='a.pdf', file=name, mime_type='application/pdf', size=10, owner=self.user, iv='aXY=')
+
+        output, entries = self.reconcile('--delete')
+
+        self.assertEqual(entries, [('missing', 'uploads/999/nested/lost.pdf'), ('missing', 'uploads/elsewhere.pdf')])
+        self.assertTrue(os.path.exists(shared))
+
+    def test_directory_listing_is_merged_in_sorted_runs(self):
+        kept = [self.create_file(name=f'{i}.pdf') for i in range(5)]
+        os.remove(kept[2].file.path)
+        orphans = [self.write_blob(f'uploads/{self.user.id}/orphan-{i}.pdf') for i in range(3)]
+
+        with mock.patch('apps.files.management.commands.reconcile_storage.SORT_RUN_SIZE', 2):
+            output, entries = self.reconcile('--chunk-size=2')
+
+        self.assertEqual(entries, sorted(
+            [('missing', kept[2].file.name)]
+            + [('orphan', f'uploads/{self.user.id}/{os.path.basename(path)}') for path in orphans]
+        ))
+        self.assertIn('Scanned 7 blobs: 3 orphaned', output)
+
+
+class ScrubBlobsTests(FileTestCase):
+    def scrub(self, *args):
+        report = os.path.join(self.media_root, 'report.jsonl')
+        out = StringIO()
+        call_command('scrub_blobs', '--workers=2', '--max-bytes-per-second=0', f'--report={report}', *args, stdout=out)
+        with open(report) as f:
+            return out.getvalue(), sorted((entry['type'], entry['path']) for entry in map(json.loads, f))
+
+    def test_upload_records_digest_used_as_etag(self):
+        response = self.client.post('/api/files/upload/', {
+            'file': SimpleUploadedFile('a.pdf', b'aaa', content_type='application/pdf'),
+            'iv': 'aXY=',
+        }, secure=True)
+        digest = hashlib.sha256(b'aaa').hexdigest()
+        self.assertEqual(File.objects.get(id=response.data['id']).sha256, digest)
+
+        url = f"/api/files/{response.data['id']}/download/"
+        self.assertEqual(self.client.get(url, secure=True)['ETag'], f'"{digest}"')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{digest}"', secure=True)
+        self.assertEqual(response.status_code, 304)
+
+    def test_reports_mismatched_and_missing_blobs_and_backfills_digests(self):
+        unhashed = self.create_file()
+        intact = self.create_file(name='intact.pdf')
+        corrupted = self.create_file(name='corrupted.pdf')
+        lost = self.create_file(name='lost.pdf')
+        File.objects.exclude(id=unhashed.id).update(sha256=hashlib.sha256(b'ciphertext').hexdigest())
+        with open(corrupted.file.path, 'wb') as f:
+            f.write(b'ciphertexT')
+        os.remove(lost.file.path)
+
+        output, entries = self.scrub()
+
+        self.assertEqual(entries, sorted([('mismatch', corrupted.file.name), ('missing', lost.file.name)]))
+        self.assertNotIn(intact.file.name, [path for _, path in entries])
+        self.assertIn('Checked 4 blobs (30 bytes): 1 verified, 1 digests recorded, 1 mismatched, 1 missing', output)
+        unhashed.refresh_from_db()
+        self.assertEqual(unhashed.sha256, hashlib.sha256(b'ciphertext').hexdigest())
+
+    def test_resumes_from_checkpoint(self):
+        files = sorted([self.create_file(name=f'{i}.pdf') for i in range(3)], key=lambda file: file.id)
+        checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+        with open(checkpoint, 'w') as f:
+            json.dump({'after': str(files[0].id), 'totals': {'checked': 1, 'bytes': 10, 'backfilled': 1}}, f)
+
+        output, _ = self.scrub(f'--checkpoint={checkpoint}', '--chunk-size=1')
+
+        self.assertIn('Checked 3 blobs (30 bytes): 0 verified, 3 digests recorded', output)
+        self.assertEqual(File.objects.filter(sha256__isnull=True).get(), files[0])
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class BulkShareTests(FileTestCase):
+    def test_bulk_share_returns_result_matrix(self):
+        guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        own = self.create_file()
+        shared = self.create_file(name='shared.pdf')
+        FileShare.objects.create(file=shared, shared_by=self.user, shared_with=guest)
+        other = self.create_file(owner=self.admin)
+
+        # Three lookups, then the share, change feed and activity inserts in a savepoint
+        with self.assertNumQueries(8):
+            response = self.client.post('/api/files/bulk-share/', {
+                'file_ids': [str(own.id), str(shared.id), str(other.id)],
+                'emails': ['Guest@Example.com', 'user@example.com', 'nobody@example.com', 'bad'],
+            }, format='json', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], {
+            str(own.id): {
+                'Guest@Example.com': 'shared',
+                'user@example.com': 'cannot_share_with_self',
+                'nobody@example.com': 'user_not_found',
+                'bad': 'invalid_email',
+            },
+            str(shared.id): {
+                'Guest@Example.com': 'already_shared',
+                'user@example.com': 'cannot_share_with_self',
+                'nobody@example.com': 'user_not_found',
+                'bad': 'invalid_email',
+            },
+            str(other.id): {
+                'Guest@Example.com': 'file_not_found',
+                'user@example.com': 'file_not_found',
+                'nobody@example.com': 'file_not_found',
+                'bad': 'file_not_found',
+            },
+        })
+        self.assertEqual(
+            set(FileShare.objects.values_list('file_id', 'shared_with_id')),
+            {(own.id, guest.id), (shared.id, guest.id)},
+        )
+
+
+class SignedShareLinkTests(FileTestCase):
+    def setUp(self):
+        super().setUp()
+        revocations.clear()
+        self.addCleanup(revocations.clear)
+
+    def create_signed_link(self, file, ttl=60):
+        response = self.client.post(
+            f'/api/files/{file.id}/create-share-link/', {'ttl': ttl, 'signed': True}, format='json', secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_signed_link_resolves_with_file_lookup_only(self):
+        file = self.create_file()
+        link = self.create_signed_link(file, ttl=3600)
+        self.assertAlmostEqual(
+            FileShareLink.objects.get(id=link['id']).expires_at,
+            timezone.now() + timedelta(seconds=3600), delta=timedelta(seconds=5),
+        )
+        revocations.refresh()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/files/shared/t/{link['token']}/?metadata=1", secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['filename'], file.name)
+        self.assertEqual(response.data['share_id'], link['id'])
+
+        tampered = link['token'][:-2] + ('AA' if not link['token'].endswith('AA') else 'BB')
+        response = self.client.get(f'/api/files/shared/t/{tampered}/?metadata=1', secure=True)
+        self.assertEqual(response.status_code, 404)
+
+    def test_revoked_and_expired_links_are_rejected(self):
+        file = self.create_file()
+        link = self.create_signed_link(file)
+
+        response = self.client.post(f"/api/files/shared/{link['id']}/revoke/", secure=True)
+        self.assertEqual(response.status_code, 204)
+        for url in (f"/api/files/shared/t/{link['token']}/", f"/api/files/shared/{link['id']}/"):
+            self.assertEqual(self.client.get(url, {'metadata': 1}, secure=True).status_code, 410)
+
+        # Other processes pick the revocation up on their next refresh
+        revocations.clear()
+        response = self.client.get(f"/api/files/shared/t/{link['token']}/?metadata=1", secure=True)
+        self.assertEqual(response.status_code, 410)
+
+        expired = self.create_signed_link(file)
+        FileShareLink.objects.filter(id=expired['id']).update(expires_at=timezone.now() - timedelta(seconds=1))
+        with override_settings(SHARE_LINK_DEFAULT_TTL=-1):
+            response = self.client.post(f'/api/files/{file.id}/create-share-link/', secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+class ShareLinkTests(FileTestCase):
+    def create_link(self, file, expires_in):
+        return FileShareLink.objects.create(
+            file=file, created_by=self.user, expires_at=timezone.now() + timedelta(seconds=expires_in),
+            iv=file.iv, name=file.name, mime_type=file.mime_type,
+        )
+
+    def test_expired_link_is_rejected_without_loading_the_file(self):
+        file = self.create_file()
+        link = self.create_link(file, expires_in=-5)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/files/shared/{link.id}/', {'metadata': 1}, secure=True)
+        self.assertEqual(response.status_code, 410)
+
+        link = self.create_link(file, expires_in=60)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/files/shared/{link.id}/', {'metadata': 1}, secure=True)
+        self.assertEqual(response.status_code, 200)
+
+    def test_sweep_deletes_expired_links_in_batches(self):
+        file = self.create_file()
+        expired = [self.create_link(file, expires_in=-7200) for _ in range(5)]
+        recent = self.create_link(file, expires_in=-60)
+        active = self.create_link(file, expires_in=60)
+
+        out = StringIO()
+        call_command('sweep_share_links', '--batch-size', '2', stdout=out)
+
+        self.assertIn('Deleted 5 expired share links', out.getvalue())
+        self.assertEqual(set(FileShareLink.objects.values_list('id', flat=True)), {recent.id, active.id})
+        self.assertEqual(
+            set(KeyDeletion.objects.values_list('key_id', flat=True)),
+            {str(link.id) for link in expired},
+        )
+
+    def test_repeat_hits_are_served_from_cache_until_file_is_deleted(self):
+        file = self.create_file()
+        link = self.create_link(file, expires_in=60)
+        self.client.get(f'/api/files/shared/{link.id}/', {'metadata': 1}, secure=True)
+
+        with self.assertNumQueries(0):
+            metadata = self.client.get(f'/api/files/shared/{link.id}/', {'metadata': 1}, secure=True)
+            content = self.client.get(f'/api/files/shared/{link.id}/', secure=True)
+        self.assertEqual(metadata.data['filename'], file.name)
+        self.assertEqual(b''.join(content.streaming_content), b'ciphertext')
+
+        self.client.delete(f'/api/files/{file.id}/', secure=True)
+        response = self.client.get(f'/api/files/shared/{link.id}/', {'metadata': 1}, secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+class ListCacheTests(FileTestCase):
+    def test_lists_are_cached_until_a_write_invalidates_them(self):
+        guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        guest_client = APIClient()
+        guest_client.force_authenticate(guest)
+        file = self.create_file()
+
+        self.client.get('/api/files/', secure=True)
+        guest_client.get('/api/files/shared_with_me/', secure=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get('/api/files/', secure=True).json()), 1)
+            self.assertEqual(guest_client.get('/api/files/shared_with_me/', secure=True).json(), [])
+
+        self.client.post(
+            '/api/files/bulk-share/', {'file_ids': [str(file.id)], 'emails': [guest.email]},
+            format='json', secure=True,
+        )
+        self.assertEqual(
+            self.client.get('/api/files/', secure=True).json()[0]['shared_with'],
+            [{'id': guest.id, 'email': guest.email}],
+        )
+        self.assertEqual(len(guest_client.get('/api/files/shared_with_me/', secure=True).json()), 1)
+
+        # Deleting the file also removes it from the recipient's list
+        self.client.delete(f'/api/files/{file.id}/', secure=True)
+        self.assertEqual(self.client.get('/api/files/', secure=True).json(), [])
+        self.assertEqual(guest_client.get('/api/files/shared_with_me/', secure=True).json(), [])
+
+    def test_email_change_invalidates_the_lists_showing_it(self):
+        guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        guest_client = APIClient()
+        guest_client.force_authenticate(guest)
+        admin_client = APIClient()
+        admin_client.force_authenticate(self.admin)
+        owned = self.create_file()
+        FileShare.objects.create(file=owned, shared_by=self.user, shared_with=guest)
+        received = self.create_file(owner=self.admin)
+        FileShare.objects.create(file=received, shared_by=self.admin, shared_with=self.user)
+        FileShare.objects.create(file=received, shared_by=self.admin, shared_with=guest)
+
+        def emails():
+            return (
+                guest_client.get('/api/files/shared_with_me/', secure=True).json(),
+                admin_client.get('/api/files/', secure=True).json(),
+            )
+
+        emails()
+        self.user.email = 'renamed@example.com'
+        self.user.save()
+
+        shared_with_guest, admin_files = emails()
+        shared_with_guest = {entry['id']: entry for entry in shared_with_guest}
+        # As the owner of a file shared with the guest, and as a fellow recipient
+        self.assertEqual(shared_with_guest[str(owned.id)]['owner']['email'], 'renamed@example.com')
+        self.assertIn({'id': self.user.id, 'email': 'renamed@example.com'},
+                      shared_with_guest[str(received.id)]['shared_with'])
+        # As a recipient of the admin's file
+        received_entry = next(entry for entry in admin_files if entry['id'] == str(received.id))
+        self.assertIn({'id': self.user.id, 'email': 'renamed@example.com'}, received_entry['shared_with'])
+
+    def test_unchanged_lists_return_304(self):
+        response = self.client.get('/api/files/', secure=True)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/files/', secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.create_file()
+        response = self.client.get('/api/files/', secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        me = self.client.get('/api/auth/me/', secure=True)
+        response = self.client.get('/api/auth/me/', secure=True, HTTP_IF_NONE_MATCH=me['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class FileListRenderingTests(FileTestCase):
+    def test_fast_path_matches_file_serializer_output(self):
+        guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        names = ['report.pdf', 'Été – "quoted" \\ back.pdf', 'line\u2028sep\u2029.txt', 'tab\tctl\x01.bin', '😀.png']
+        files = [self.create_file(name=name) for name in names]
+        files.append(self.create_file(owner=self.admin, name='admin.pdf'))
+        FileShare.objects.create(file=files[0], shared_by=self.user, shared_with=guest)
+        FileShare.objects.create(file=files[0], shared_by=self.user, shared_with=self.admin)
+        FileShare.objects.create(file=files[5], shared_by=self.admin, shared_with=guest)
+        # Whole seconds drop the fraction from the ISO format
+        File.objects.filter(id=files[1].id).update(created_at=timezone.now().replace(microsecond=0))
+
+        for queryset in (
+            File.objects.all(),
+            File.objects.filter(owner=self.user),
+            File.objects.filter(shares__shared_with=guest),
+            File.objects.none(),
+        ):
+            with self.subTest(query=str(queryset.query) if queryset.exists() else 'empty'):
+                expected = JSONRenderer().render(FileSerializer(queryset, many=True).data)
+                self.assertEqual(render_file_list(queryset), expected)
+
+    @override_settings(LIST_STREAM_CHUNK_SIZE=2)
+    def test_streamed_admin_listing_matches_regular_response(self):
+        guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        files = [self.create_file(name=f'{i}.pdf') for i in range(5)]
+        for file in files[1::2]:
+            FileShare.objects.create(file=file, shared_by=self.user, shared_with=guest)
+        admin_client = APIClient()
+        admin_client.force_authenticate(self.admin)
+        expected = admin_client.get('/api/files/', secure=True)
+
+        response = admin_client.get('/api/files/', {'stream': 'json'}, secure=True)
+        self.assertEqual(b''.join(response.streaming_content), expected.content)
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+        response = admin_client.get('/api/files/', {'stream': 'ndjson'}, secure=True)
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected.json())
+
+
+class ChangeFeedTests(FileTestCase):
+    def test_changes_since_cursor(self):
+        guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        guest_client = APIClient()
+        guest_client.force_authenticate(guest)
+
+        cursor = guest_client.get('/api/files/changes/', secure=True).data['cursor']
+        file = self.create_file()
+        self.create_file(name='private.pdf')
+        FileShare.objects.create(file=file, shared_by=self.user, shared_with=guest)
+        self.client.delete(f'/api/files/{file.id}/', secure=True)
+
+        response = guest_client.get('/api/files/changes/', {'since': cursor}, secure=True)
+        self.assertFalse(response.data['resync_required'])
+        self.assertEqual([change['type'] for change in response.data['changes']], ['shared', 'unshared'])
+        self.assertIsNone(response.data['changes'][0]['file'])  # Deleted since
+
+        response = self.client.get('/api/files/changes/', {'since': cursor, 'limit': 2}, secure=True)
+        self.assertEqual([change['type'] for change in response.data['changes']], ['created', 'created'])
+        self.assertEqual(response.data['changes'][1]['file']['name'], 'private.pdf')
+        self.assertTrue(response.data['has_more'])
+        response = self.client.get('/api/files/changes/', {'since': response.data['cursor']}, secure=True)
+        self.assertEqual([change['type'] for change in response.data['changes']], ['shared', 'unshared', 'deleted'])
+
+    def test_compacted_cursor_requires_resync(self):
+        for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            self.create_file(name=name)
+        first = ChangeEvent.objects.first().id
+
+        call_command('compact_changes', '--retention', '0', stdout=StringIO())
+        self.assertEqual(ChangeEvent.objects.count(), 1)  # The newest event is kept
+
+        response = self.client.get('/api/files/changes/', {'since': first}, secure=True)
+        self.assertTrue(response.data['resync_required'])
+        self.assertEqual(response.data['cursor'], first + 2)
+
+
+class EventStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='user@example.com', email='user@example.com', password='x', role=User.REGULAR
+        )
+        self.guest = User.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='x', role=User.GUEST
+        )
+        self.file = File.objects.create(
+            name='report.pdf', file='uploads/report.pdf', mime_type='application/pdf',
+            size=10, owner=self.owner, iv='aXY=',
+        )
+        self.headers = {'Authorization': f"Bearer {create_full_access_token(self.guest)['access']}"}
+
+    async def read_event(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(anext(stream), timeout=5)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('event:'):
+                lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+                return lines['event'], int(lines['id']), json.loads(lines['data'])
+
+    async def read_heartbeat(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(anext(stream), timeout=5)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith(': heartbeat'):
+                return
+
+    async def test_share_is_pushed_and_replayed_after_reconnect(self):
+        response = await AsyncClient().get('/api/files/events/', secure=True, headers=self.headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        event, cursor, _ = await self.read_event(stream)
+        self.assertEqual(event, 'ready')
+
+        await sync_to_async(FileShare.objects.create)(file=self.file, shared_by=self.owner, shared_with=self.guest)
+        event, event_id, data = await self.read_event(stream)
+        self.assertEqual(event, 'shared')
+        self.assertEqual(data['file']['name'], 'report.pdf')
+        await stream.aclose()
+
+        # A reconnecting client resumes after the last event it received
+        await sync_to_async(FileShare.objects.all().delete)()
+        response = await AsyncClient().get(
+            '/api/files/events/', secure=True, headers={**self.headers, 'Last-Event-ID': str(event_id)}
+        )
+        stream = aiter(response.streaming_content)
+        self.assertEqual((await self.read_event(stream))[0], 'unshared')
+        await stream.aclose()
+
+    @override_settings(EVENTS_HEARTBEAT_INTERVAL=0.01)
+    async def test_idle_stream_does_not_read_the_feed_between_heartbeats(self):
+        with mock.patch.object(events, 'read_changes', wraps=events.read_changes) as read_changes:
+            response = await AsyncClient().get('/api/files/events/', secure=True, headers=self.headers)
+            stream = aiter(response.streaming_content)
+            self.assertEqual((await self.read_event(stream))[0], 'ready')
+
+            # The feed is read once after the ready event, then never while idle
+            await self.read_heartbeat(stream)
+            self.assertEqual(read_changes.call_count, 1)
+            for _ in range(3):
+                await self.read_heartbeat(stream)
+            self.assertEqual(read_changes.call_count, 1)
+
+            # A notification still wakes the stream
+            await sync_to_async(FileShare.objects.create)(file=self.file, shared_by=self.owner, shared_with=self.guest)
+            self.assertEqual((await self.read_event(stream))[0], 'shared')
+            await stream.aclose()
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get('/api/files/events/', secure=True)
+        self.assertEqual(response.status_code, 401)
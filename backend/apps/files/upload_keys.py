@@ -0,0 +1,93 @@
+"""
+``Idempotency-Key`` handling for uploads.
+
+A key is claimed with a single insert before the request body is read, so
+a retry of an upload that already finished is answered from the stored file
+id and a duplicate sent while the first is still in progress is turned away
+without parsing its body. The file id is recorded in the same transaction
+that saves the file, so a key never points at an upload that rolled back.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import UploadKey
+
+KEY_MAX_LENGTH = UploadKey._meta.get_field('key').max_length
+
+
+class UploadInProgress(Exception):
+    pass
+
+
+def claim_upload_key(user, key):
+    """Reserve ``key`` for an upload by ``user``.
+
+    Returns a ``(record, replay)`` tuple; ``replay`` is true when the key
+    belongs to an upload that already completed, whose file should be
+    returned instead of storing the request. Keys past ``UPLOAD_KEY_TTL`` and
+    keys left in progress for ``UPLOAD_KEY_PENDING_TIMEOUT`` are taken over.
+    Raises ``UploadInProgress`` when another request holds the key.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return UploadKey.objects.create(user=user, key=key, created_at=now), False
+    except IntegrityError:
+        pass
+
+    record = UploadKey.objects.filter(user=user, key=key).first()
+    if record is None:
+        # Released by a failed upload in between; the client can simply retry
+        raise UploadInProgress()
+
+    age = now - record.created_at
+    if record.file_id is not None and age < timedelta(seconds=settings.UPLOAD_KEY_TTL):
+        return record, True
+    if record.file_id is None and age < timedelta(seconds=settings.UPLOAD_KEY_PENDING_TIMEOUT):
+        raise UploadInProgress()
+
+    # Conditional on the row being unchanged, so only one of several
+    # concurrent retries takes the key over
+    taken = UploadKey.objects.filter(
+        pk=record.pk, created_at=record.created_at, file_id=record.file_id
+    ).update(created_at=now, file_id=None)
+    if not taken:
+        raise UploadInProgress()
+    record.created_at, record.file_id = now, None
+    return record, False
+
+
+def complete_upload_key(record, file):
+    """Point the key at the uploaded file; call in the transaction saving it."""
+    UploadKey.objects.filter(pk=record.pk).update(file_id=file.id)
+    record.file_id = file.id
+
+
+def release_upload_key(record):
+    """Give up a key whose upload failed, so a retry can use it again."""
+    UploadKey.objects.filter(pk=record.pk, file_id=None).delete()
+
+
+def sweep_upload_keys(batch_size=None):
+    """Delete keys older than ``UPLOAD_KEY_TTL`` in batches.
+
+    Returns the number of keys deleted.
+    """
+    batch_size = batch_size or settings.UPLOAD_KEY_SWEEP_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_KEY_TTL)
+    deleted = 0
+
+    while True:
+        with transaction.atomic():
+            # Served by the created_at index
+            ids = list(
+                UploadKey.objects.filter(created_at__lt=cutoff)
+                .order_by('created_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted += UploadKey.objects.filter(id__in=ids).delete()[0]
+    return deleted
@@ -1,13 +1,24 @@
 from django.urls import path
-from . import views
+from . import events, views
 
 urlpatterns = [
     path('upload/', views.upload_file, name='upload_file'),
+    path('upload/batch/', views.upload_files_batch, name='upload_files_batch'),
     path('', views.list_files, name='list_files'),
+    path('bulk-delete/', views.bulk_delete_files, name='bulk_delete_files'),
+    path('bulk-share/', views.bulk_share_files, name='bulk_share_files'),
     path('<uuid:file_id>/download/', views.download_file, name='download_file'),
+    path('<uuid:file_id>/chunks/', views.download_file_chunks, name='download_file_chunks'),
     path('<uuid:file_id>/', views.delete_file, name='delete_file'),
     path('<uuid:file_id>/share/', views.share_file, name='share_file'),
+    path('search/', views.search, name='search'),
     path('shared_with_me/', views.shared_with_me, name='shared_with_me'),
+    path('changes/', views.list_changes, name='list_changes'),
+    path('usage/', views.storage_usage, name='storage_usage'),
+    path('stats/', views.activity_stats, name='activity_stats'),
+    path('events/', events.event_stream, name='event_stream'),
     path('<uuid:file_id>/create-share-link/', views.create_share_link, name='create_share_link'),
     path('shared/<uuid:share_id>/', views.access_shared_file, name='access_shared_file'),
+    path('shared/<uuid:share_id>/revoke/', views.revoke_share_link, name='revoke_share_link'),
+    path('shared/t/<str:token>/', views.access_shared_file_token, name='access_shared_file_token'),
 ]
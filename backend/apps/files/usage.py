@@ -0,0 +1,117 @@
+"""
+Per-user storage usage counters and quota enforcement.
+
+``StorageUsage`` rows are updated in the same transaction as the rows of the
+files they count: uploads reserve space before inserting and the ``File``
+post_delete signal releases it, so quota checks read one row instead of
+summing a user's files. ``rebuild_storage_usage`` recomputes the counters
+from the files to repair any drift.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from .models import File, StorageUsage
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, used, quota):
+        super().__init__(f'Storage quota exceeded: {used} of {quota} bytes used')
+        self.used = used
+        self.quota = quota
+
+
+def get_quota(usage):
+    return settings.STORAGE_QUOTA_BYTES if usage.quota_bytes is None else usage.quota_bytes
+
+
+def get_usage(user):
+    """Return the user's usage row, creating it from their files if missing."""
+    usage = StorageUsage.objects.filter(user=user).first()
+    if usage is None:
+        totals = File.objects.filter(owner=user).aggregate(file_count=Count('id'), total_bytes=Sum('size'))
+        usage, _ = StorageUsage.objects.get_or_create(user=user, defaults={
+            'file_count': totals['file_count'],
+            'total_bytes': totals['total_bytes'] or 0,
+        })
+    return usage
+
+
+def reserve_storage(user, file_count, total_bytes):
+    """Add files to the user's usage if they fit in the quota.
+
+    Call this inside the transaction that inserts the files, before
+    inserting them. The check and the increment are a single conditional
+    UPDATE, so concurrent uploads can't overshoot the quota together.
+    Raises ``QuotaExceeded`` when the files don't fit.
+    """
+    fits = (
+        Q(quota_bytes__isnull=True, total_bytes__lte=settings.STORAGE_QUOTA_BYTES - total_bytes)
+        | Q(quota_bytes__isnull=False, total_bytes__lte=F('quota_bytes') - total_bytes)
+    )
+    increment = {'file_count': F('file_count') + file_count, 'total_bytes': F('total_bytes') + total_bytes}
+    if StorageUsage.objects.filter(fits, user=user).update(**increment):
+        return
+
+    # Either the quota is exhausted or the user has no usage row yet
+    usage = get_usage(user)
+    if not StorageUsage.objects.filter(fits, user=user).update(**increment):
+        raise QuotaExceeded(usage.total_bytes, get_quota(usage))
+
+
+def release_storage(owner_id, file_count, total_bytes):
+    StorageUsage.objects.filter(user_id=owner_id).update(
+        file_count=F('file_count') - file_count,
+        total_bytes=F('total_bytes') - total_bytes,
+    )
+
+
+def rebuild_storage_usage(chunk_size=None):
+    """Recompute every user's counters from their files, ``chunk_size`` users at a time.
+
+    Each chunk runs in its own transaction with the users' usage rows locked,
+    so uploads and deletes of those users wait instead of being lost.
+    Returns a ``(users, drifted)`` tuple of counts.
+    """
+    User = get_user_model()
+    chunk_size = chunk_size or settings.STORAGE_USAGE_REBUILD_CHUNK_SIZE
+    users = drifted = 0
+    last_id = 0
+
+    while True:
+        user_ids = list(
+            User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        with transaction.atomic():
+            current = {
+                usage.user_id: usage
+                for usage in StorageUsage.objects.select_for_update().filter(user_id__in=user_ids)
+            }
+            totals = {
+                row['owner_id']: row
+                for row in File.objects.filter(owner_id__in=user_ids).order_by()
+                .values('owner_id').annotate(file_count=Count('id'), total_bytes=Sum('size'))
+            }
+            rows = []
+            for user_id in user_ids:
+                row = totals.get(user_id, {'file_count': 0, 'total_bytes': 0})
+                usage = current.get(user_id)
+                if usage is None or (usage.file_count, usage.total_bytes) != (row['file_count'], row['total_bytes']):
+                    drifted += 1
+                    rows.append(StorageUsage(
+                        user_id=user_id, file_count=row['file_count'], total_bytes=row['total_bytes']
+                    ))
+            StorageUsage.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['file_count', 'total_bytes'],
+            )
+        users += len(user_ids)
+
+    return users, drifted
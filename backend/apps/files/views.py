@@ -1,20 +1,64 @@
 from django.shortcuts import render
 import os
+import uuid
 import mimetypes
-from django.http import FileResponse, HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from apps.authentication.permissions import IsRegularUser, IsGuest
-from .models import File, FileShare, FileShareLink
-from .serializers import FileSerializer, FileShareSerializer, FileShareLinkSerializer
+from apps.authentication.permissions import IsAdmin, IsRegularUser, IsGuest
+from .models import ActivityEvent, ActivityRollup, ChangeEvent, File, FileShare, FileShareLink
+from .serializers import (
+    FileSerializer,
+    FileShareSerializer,
+    FileShareLinkSerializer,
+    iter_file_entries,
+    render_file_list,
+)
+from .blobs import enqueue_blob_deletions
+from .chunks import (
+    InvalidChunkRange,
+    get_byte_range,
+    get_chunk_count,
+    get_chunk_manifest,
+    parse_chunk_range,
+    read_range,
+)
+from .changes import get_changes, record_changes
+from .digests import compute_digest
+from .kms import enqueue_key_deletions
+from .share_links import get_share_link, invalidate_share_link
+from .search import InvalidCursor, search_files
+from .stats import get_activity, record_activity
+from .upload_keys import (
+    KEY_MAX_LENGTH,
+    UploadInProgress,
+    claim_upload_key,
+    complete_upload_key,
+    release_upload_key,
+)
+from .usage import QuotaExceeded, get_quota, get_usage, reserve_storage
+from .share_tokens import (
+    ExpiredShareToken,
+    InvalidShareToken,
+    RevokedShareToken,
+    make_share_token,
+    resolve_share_token,
+    revocations,
+)
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
 from django.utils import timezone
+from django.utils.http import parse_etags
 from datetime import timedelta
 from django.core.exceptions import PermissionDenied
+from core.cache import ALL_FILES, cached_list_response, invalidate, user_scope
+from core.renderers import get_stream_format, render_json, streaming_json_response
 from core.utils.sanitizers import (
     sanitize_filename, 
     validate_file_size, 
@@ -26,55 +70,235 @@ User = get_user_model()
 
 # Create your views here.
 
-@api_view(['POST'])
-@permission_classes([IsRegularUser])
-def upload_file(request):
-    if 'file' not in request.FILES:
-        return Response({
-            'error': 'No file provided'
-        }, status=status.HTTP_400_BAD_REQUEST)
-    
-    uploaded_file = request.FILES['file']
-    iv = request.POST.get('iv')
-    
+def build_uploaded_file(uploaded_file, iv, owner, chunk_size=None):
+    """Validate an uploaded file and build the unsaved File row for it.
+
+    ``chunk_size`` is given for blobs in the chunked format. Returns a
+    ``(file, error)`` tuple where exactly one item is ``None``.
+    """
     # Validate file size
     if not validate_file_size(uploaded_file.size):
-        return Response({
-            'error': 'File size exceeds maximum limit of 10MB'
-        }, status=status.HTTP_400_BAD_REQUEST)
+        return None, 'File size exceeds maximum limit of 10MB'
     
     # Sanitize and validate filename
     safe_filename = sanitize_filename(uploaded_file.name)
     
     # Validate mime type
     mime_type = uploaded_file.content_type or mimetypes.guess_type(safe_filename)[0]
-    if not validate_mime_type(mime_type):
-        return Response({
-            'error': 'Invalid file type'
-        }, status=status.HTTP_400_BAD_REQUEST)
+    if not mime_type or not validate_mime_type(mime_type):
+        return None, 'Invalid file type'
+
+    if not iv:
+        return None, 'No IV provided'
+
+    chunk_size = chunk_size or None
+    chunk_count = None
+    if chunk_size is not None:
+        try:
+            chunk_size = int(chunk_size)
+        except ValueError:
+            return None, 'chunk_size must be an integer'
+        try:
+            chunk_count = get_chunk_count(uploaded_file.size, chunk_size)
+        except ValueError as e:
+            return None, str(e)
     
     # Create file object with sanitized data
-    file = File(
+    return File(
         name=safe_filename,
         file=uploaded_file,
         mime_type=mime_type,
         size=uploaded_file.size,
-        owner=request.user,
-        iv=iv
+        owner=owner,
+        iv=iv,
+        chunk_size=chunk_size,
+        chunk_count=chunk_count,
+        # Uploads fit in FILE_UPLOAD_MAX_MEMORY_SIZE, so they are hashed from memory
+        sha256=compute_digest(uploaded_file.chunks()),
+    ), None
+
+def quota_exceeded_response(error):
+    return Response({
+        'error': 'Storage quota exceeded',
+        'used_bytes': error.used,
+        'quota_bytes': error.quota,
+    }, status=status.HTTP_403_FORBIDDEN)
+
+@api_view(['POST'])
+@permission_classes([IsRegularUser])
+def upload_file(request):
+    """Upload one encrypted file.
+
+    With an ``Idempotency-Key`` header, a retry of an upload that already
+    succeeded returns the original file without reading the request body,
+    and a retry sent while the first attempt is still running gets a 409.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if key is None:
+        return store_uploaded_file(request)
+    if not key or len(key) > KEY_MAX_LENGTH:
+        return Response({
+            'error': f'Idempotency-Key must be 1 to {KEY_MAX_LENGTH} characters'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        upload_key, replay = claim_upload_key(request.user, key)
+    except UploadInProgress:
+        response = Response({
+            'error': 'An upload with this Idempotency-Key is already in progress'
+        }, status=status.HTTP_409_CONFLICT)
+        response['Retry-After'] = '1'
+        return response
+
+    if replay:
+        file = File.objects.filter(id=upload_key.file_id, owner=request.user).first()
+        if file is None:
+            return Response({
+                'error': 'The file uploaded with this Idempotency-Key has been deleted'
+            }, status=status.HTTP_404_NOT_FOUND)
+        response = Response(FileSerializer(file).data, status=status.HTTP_201_CREATED)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    response = None
+    try:
+        response = store_uploaded_file(request, upload_key)
+        return response
+    finally:
+        if response is None or response.status_code != status.HTTP_201_CREATED:
+            release_upload_key(upload_key)
+
+def store_uploaded_file(request, upload_key=None):
+    if 'file' not in request.FILES:
+        return Response({
+            'error': 'No file provided'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    file, error = build_uploaded_file(
+        request.FILES['file'], request.POST.get('iv'), request.user, request.POST.get('chunk_size')
     )
-    file.save()
+    if error:
+        return Response({
+            'error': error
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            reserve_storage(request.user, 1, file.size)
+            file.save()
+            if upload_key is not None:
+                complete_upload_key(upload_key, file)
+    except QuotaExceeded as e:
+        return quota_exceeded_response(e)
     
     return Response(FileSerializer(file).data, status=status.HTTP_201_CREATED)
 
+@api_view(['POST'])
+@permission_classes([IsRegularUser])
+def upload_files_batch(request):
+    """Upload many encrypted files in one multipart request.
+
+    Expects the files under ``files`` and their IVs, in the same order,
+    under ``ivs``. Chunked blobs also need ``chunk_sizes``, one per file,
+    empty for files encrypted as a single message. Every file is validated
+    on its own and the valid ones are inserted together, so the response
+    lists a result per file.
+    """
+    uploaded_files = request.FILES.getlist('files')
+    ivs = request.POST.getlist('ivs')
+    chunk_sizes = request.POST.getlist('chunk_sizes') or [None] * len(uploaded_files)
+
+    if not uploaded_files:
+        return Response({
+            'error': 'No files provided'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(uploaded_files) > settings.BATCH_UPLOAD_MAX_FILES:
+        return Response({
+            'error': f'At most {settings.BATCH_UPLOAD_MAX_FILES} files can be uploaded at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(ivs) != len(uploaded_files):
+        return Response({
+            'error': 'Exactly one IV is required per file'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(chunk_sizes) != len(uploaded_files):
+        return Response({
+            'error': 'chunk_sizes must have one entry per file'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    results = []
+    pending = []
+    for index, (uploaded_file, iv, chunk_size) in enumerate(zip(uploaded_files, ivs, chunk_sizes)):
+        file, error = build_uploaded_file(uploaded_file, iv, request.user, chunk_size)
+        if error:
+            results.append({'index': index, 'name': uploaded_file.name, 'status': 'error', 'error': error})
+        else:
+            results.append(None)
+            pending.append((index, file))
+
+    if pending:
+        files = [file for _, file in pending]
+        stored = []
+        try:
+            with transaction.atomic():
+                # The batch is accepted or rejected as a whole
+                reserve_storage(request.user, len(files), sum(file.size for file in files))
+                # Written ahead of the insert, which then leaves them be, so the
+                # blobs to remove are known if anything below fails
+                for file in files:
+                    file.file.save(file.file.name, file.file.file, save=False)
+                    stored.append(file.file.name)
+                File.objects.bulk_create(files)
+                # bulk_create sends no signals, so update the change feed and the
+                # activity log and invalidate the cached lists here
+                record_changes([
+                    ChangeEvent(kind=ChangeEvent.CREATED, file_id=file.id, owner_id=file.owner_id) for file in files
+                ])
+                record_activity([
+                    ActivityEvent(
+                        kind=ActivityEvent.UPLOAD, actor_id=file.owner_id, role=request.user.role, size=file.size
+                    )
+                    for file in files
+                ])
+                invalidate(ALL_FILES, user_scope(request.user.id))
+        except QuotaExceeded as e:
+            return quota_exceeded_response(e)
+        except Exception:
+            for name in stored:
+                default_storage.delete(name)
+            raise
+
+        prefetch_related_objects(files, 'shares__shared_with')
+        for (index, _), data in zip(pending, FileSerializer(files, many=True).data):
+            results[index] = {'index': index, 'name': data['name'], 'status': 'created', 'file': data}
+
+    if len(pending) == len(results):
+        response_status = status.HTTP_201_CREATED
+    elif pending:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({'results': results}, status=response_status)
+
 @api_view(['GET'])
 @permission_classes([IsGuest])
 def list_files(request):
     # Allow admins to see all files, others only see their own
     if request.user.role == 'admin':
         files = File.objects.all()
+        scope = ALL_FILES
     else:
         files = File.objects.filter(owner=request.user)
-    return Response(FileSerializer(files, many=True).data)
+        scope = user_scope(request.user.id)
+
+    try:
+        stream_format = get_stream_format(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if stream_format:
+        return streaming_json_response(
+            request, 'list_files', [scope], stream_format,
+            lambda: iter_file_entries(files, settings.LIST_STREAM_CHUNK_SIZE),
+        )
+    return cached_list_response(request, 'list_files', [scope], lambda: render_file_list(files))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -93,11 +317,23 @@ def download_file(request, file_id):
                     'iv': file.iv,
                     'filename': file.name,
                     'mime_type': file.mime_type,
+                    'chunk_size': file.chunk_size,
+                    'chunk_count': file.chunk_count,
+                    'sha256': file.sha256,
                 })
+
+            # The digest of the stored blob is a strong validator
+            etag = f'"{file.sha256}"' if file.sha256 else None
+            if etag and etag in parse_etags(request.headers.get('If-None-Match', '')):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
                 
             # Otherwise return the file content
             response = FileResponse(file.file, content_type='application/octet-stream')
             response['Content-Disposition'] = f'attachment; filename="{file.name}"'
+            if etag:
+                response['ETag'] = etag
             return response
             
         return Response({
@@ -109,6 +345,42 @@ def download_file(request, file_id):
             'error': 'File not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_file_chunks(request, file_id):
+    """Serve the chunk manifest of a chunked file, or a range of its chunks.
+
+    Without ``chunks`` the manifest is returned. ``chunks=3`` or
+    ``chunks=3-7`` (inclusive) returns the ciphertext of those chunks,
+    which the client can decrypt on its own.
+    """
+    file = File.objects.filter(id=file_id).first()
+    if file is None:
+        return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not (request.user.role == 'admin' or
+            file.owner_id == request.user.id or
+            file.shares.filter(shared_with=request.user).exists()):
+        return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    manifest = get_chunk_manifest(file)
+    if manifest is None:
+        return Response({'error': 'File is not stored in chunks'}, status=status.HTTP_400_BAD_REQUEST)
+    if 'chunks' not in request.query_params:
+        return Response(manifest)
+
+    try:
+        first, last = parse_chunk_range(request.query_params['chunks'], file.chunk_count)
+    except InvalidChunkRange as e:
+        return Response({'error': str(e)}, status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    offset, length = get_byte_range(file, first, last)
+    blob = default_storage.open(file.file.name, 'rb')
+    response = StreamingHttpResponse(read_range(blob, offset, length), content_type='application/octet-stream')
+    response['Content-Length'] = length
+    response['Content-Range'] = f'bytes {offset}-{offset + length - 1}/{file.size}'
+    response['X-Chunk-Range'] = f'{first}-{last}'
+    return response
+
 @api_view(['DELETE'])
 @permission_classes([IsRegularUser])
 def delete_file(request, file_id):
@@ -119,14 +391,63 @@ def delete_file(request, file_id):
         else:
             file = File.objects.get(id=file_id, owner=request.user)
             
-        file.file.delete()  # Delete the actual file
-        file.delete()  # Delete the database record
+        with transaction.atomic():
+            # Share links hold a copy of the file key, so purge those too
+            key_ids = [file.id, *file.share_links.values_list('id', flat=True)]
+            file.delete()  # Delete the database record
+            enqueue_key_deletions(key_ids)
+            # The blob is unlinked by the purge_blobs worker
+            enqueue_blob_deletions([file.file.name])
         return Response(status=status.HTTP_204_NO_CONTENT)
     except File.DoesNotExist:
         return Response({
             'error': 'File not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['POST'])
+@permission_classes([IsRegularUser])
+def bulk_delete_files(request):
+    """Delete many files at once.
+
+    Rows are removed in one transaction and the blobs are unlinked later by
+    the ``purge_blobs`` worker, so the per-id results come back right away.
+    """
+    file_ids = request.data.get('ids')
+    if not isinstance(file_ids, list) or not file_ids:
+        return Response({
+            'error': 'A list of file ids is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(file_ids) > settings.BULK_DELETE_MAX_FILES:
+        return Response({
+            'error': f'At most {settings.BULK_DELETE_MAX_FILES} files can be deleted at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    results = {}
+    valid_ids = []
+    for file_id in file_ids:
+        try:
+            valid_ids.append(uuid.UUID(str(file_id)))
+        except ValueError:
+            results[str(file_id)] = 'invalid'
+
+    # Allow admins to delete any file, others only their own
+    files = File.objects.filter(id__in=valid_ids)
+    if request.user.role != 'admin':
+        files = files.filter(owner=request.user)
+
+    with transaction.atomic():
+        found = dict(files.values_list('id', 'file'))
+        # Share links hold a copy of the file key, so purge those too
+        link_ids = FileShareLink.objects.filter(file_id__in=found).values_list('id', flat=True)
+        key_ids = [*found, *link_ids]
+        File.objects.filter(id__in=found).delete()
+        enqueue_key_deletions(key_ids)
+        enqueue_blob_deletions(found.values())
+
+    for file_id in valid_ids:
+        results[str(file_id)] = 'deleted' if file_id in found else 'not_found'
+    return Response({'results': results})
+
 @api_view(['POST'])
 @permission_classes([IsRegularUser])
 def share_file(request, file_id):
@@ -167,16 +488,207 @@ def share_file(request, file_id):
     
     return Response(FileShareSerializer(share).data)
     
+@api_view(['POST'])
+@permission_classes([IsRegularUser])
+def bulk_share_files(request):
+    """Share many files with many users at once.
+
+    Returns a ``{file_id: {email: outcome}}`` matrix covering every
+    requested pair.
+    """
+    file_ids = request.data.get('file_ids')
+    emails = request.data.get('emails')
+    if not isinstance(file_ids, list) or not file_ids or not isinstance(emails, list) or not emails:
+        return Response({
+            'error': 'Lists of file ids and emails are required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(file_ids) * len(emails) > settings.BULK_SHARE_MAX_PAIRS:
+        return Response({
+            'error': f'At most {settings.BULK_SHARE_MAX_PAIRS} file and user pairs can be shared at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Sanitize emails and resolve all recipients in one query
+    sanitized_emails = {str(email): sanitize_email(str(email)) for email in emails}
+    recipients = {
+        user.email: user
+        for user in User.objects.filter(email__in={email for email in sanitized_emails.values() if email})
+    }
+
+    # Allow admins to share any file, others only their own
+    valid_ids = {}
+    for file_id in file_ids:
+        try:
+            valid_ids[str(file_id)] = uuid.UUID(str(file_id))
+        except ValueError:
+            valid_ids[str(file_id)] = None
+    files = File.objects.filter(id__in=[file_id for file_id in valid_ids.values() if file_id])
+    if request.user.role != 'admin':
+        files = files.filter(owner=request.user)
+    found_files = dict(files.values_list('id', 'owner_id'))
+
+    existing = set(
+        FileShare.objects.filter(
+            file_id__in=list(found_files),
+            shared_with__in=[user.id for user in recipients.values()]
+        ).values_list('file_id', 'shared_with_id')
+    )
+
+    results = {}
+    new_shares = []
+    for raw_id, file_id in valid_ids.items():
+        row = results[raw_id] = {}
+        for raw_email, email in sanitized_emails.items():
+            recipient = recipients.get(email)
+            if file_id not in found_files:
+                row[raw_email] = 'file_not_found'
+            elif not email:
+                row[raw_email] = 'invalid_email'
+            elif recipient is None:
+                row[raw_email] = 'user_not_found'
+            elif recipient == request.user:
+                row[raw_email] = 'cannot_share_with_self'
+            elif (file_id, recipient.id) in existing:
+                row[raw_email] = 'already_shared'
+            else:
+                row[raw_email] = 'shared'
+                existing.add((file_id, recipient.id))
+                new_shares.append(FileShare(file_id=file_id, shared_by=request.user, shared_with=recipient))
+
+    with transaction.atomic():
+        # A concurrent request may have shared some pairs since the check above;
+        # the unique constraint keeps those from being inserted twice.
+        FileShare.objects.bulk_create(new_shares, ignore_conflicts=True)
+        # bulk_create sends no signals, so update the change feed and the
+        # activity log and invalidate the cached lists here
+        record_changes([
+            ChangeEvent(
+                kind=ChangeEvent.SHARED,
+                file_id=share.file_id,
+                owner_id=found_files[share.file_id],
+                recipient_id=share.shared_with_id,
+            )
+            for share in new_shares
+        ])
+        record_activity([
+            ActivityEvent(kind=ActivityEvent.SHARE, actor_id=request.user.id, role=request.user.role)
+            for share in new_shares
+        ])
+    if new_shares:
+        invalidate(
+            ALL_FILES,
+            *(user_scope(found_files[share.file_id]) for share in new_shares),
+            *(user_scope(share.shared_with_id) for share in new_shares),
+        )
+
+    return Response({'results': results})
+
+@api_view(['GET'])
+@permission_classes([IsGuest])
+def search(request):
+    """Find files the user owns or has been shared by name.
+
+    ``q`` is matched anywhere in the name, or only at its start with
+    ``prefix=1``. Pass the returned ``next_cursor`` as ``cursor`` for the
+    next page.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.query_params.get('limit', settings.SEARCH_PAGE_SIZE))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = min(max(limit, 1), settings.SEARCH_MAX_PAGE_SIZE)
+    try:
+        results, next_cursor = search_files(
+            request.user,
+            query,
+            prefix=request.query_params.get('prefix') in ('1', 'true'),
+            cursor=request.query_params.get('cursor'),
+            limit=limit,
+        )
+    except InvalidCursor:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    return HttpResponse(
+        render_json({'results': results, 'next_cursor': next_cursor}),
+        content_type='application/json',
+    )
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def shared_with_me(request):
     shared_files = File.objects.filter(shares__shared_with=request.user)
-    serializer = FileSerializer(shared_files, many=True)
-    return Response(serializer.data)
+    return cached_list_response(
+        request,
+        'shared_with_me',
+        [user_scope(request.user.id)],
+        lambda: render_file_list(shared_files),
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_changes(request):
+    """Return changes to the user's file lists after the ``since`` cursor.
+
+    Without ``since`` the response asks for a resync: store the returned
+    cursor, then load the full lists. Replaying an event the lists already
+    reflect is harmless, so nothing is lost in between.
+    """
+    try:
+        since = int(request.query_params['since'])
+        limit = int(request.query_params.get('limit', settings.CHANGE_FEED_PAGE_SIZE))
+    except KeyError:
+        last = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        return Response({'resync_required': True, 'cursor': last, 'has_more': False, 'changes': []})
+    except ValueError:
+        return Response({'error': 'since and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = min(max(limit, 1), settings.CHANGE_FEED_PAGE_SIZE)
+    return Response(get_changes(request.user, since, limit))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def storage_usage(request):
+    usage = get_usage(request.user)
+    return Response({
+        'file_count': usage.file_count,
+        'used_bytes': usage.total_bytes,
+        'quota_bytes': get_quota(usage),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def activity_stats(request):
+    """Return upload, share and link activity per hour or day, broken down by role.
+
+    Served from the rollups, so the latest closed periods are returned and
+    the current one is not included yet.
+    """
+    period = request.query_params.get('period', ActivityRollup.HOUR)
+    if period not in dict(ActivityRollup.PERIOD_CHOICES):
+        return Response({'error': 'period must be hour or day'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.query_params.get('limit', 24))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = min(max(limit, 1), settings.STATS_MAX_PERIODS)
+    return Response({'period': period, 'buckets': get_activity(period, limit)})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_share_link(request, file_id):
+    ttl = request.data.get('ttl', settings.SHARE_LINK_DEFAULT_TTL)
+    try:
+        ttl = int(ttl)
+    except (TypeError, ValueError):
+        return Response({'error': 'ttl must be a number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 < ttl <= settings.SHARE_LINK_MAX_TTL:
+        return Response({
+            'error': f'ttl must be between 1 and {settings.SHARE_LINK_MAX_TTL} seconds'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
     try:
         # Allow admins to create share links for any file, others only their own
         if request.user.role == 'admin':
@@ -187,44 +699,100 @@ def create_share_link(request, file_id):
         share_link = FileShareLink.objects.create(
             file=file,
             created_by=request.user,
-            expires_at=timezone.now() + timedelta(seconds=10),
+            expires_at=timezone.now() + timedelta(seconds=ttl),
             iv=file.iv,
             name=file.name,
             mime_type=file.mime_type
         )
         serializer = FileShareLinkSerializer(share_link, context={'request': request})
-        return Response(serializer.data)
+        data = serializer.data
+        # Signed links are resolved from the token alone, without loading the link row
+        if request.data.get('signed') in (True, 'true', '1', 1):
+            data['token'] = make_share_token(share_link)
+        return Response(data)
     except File.DoesNotExist:
         return Response({
             'error': 'File not found'
         }, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def revoke_share_link(request, share_id):
+    try:
+        share_link = FileShareLink.objects.select_related('file').get(id=share_id)
+    except FileShareLink.DoesNotExist:
+        return Response({'error': 'Share link not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.user.role != 'admin' and request.user.id not in (share_link.created_by_id, share_link.file.owner_id):
+        return Response({'error': 'Share link not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if not share_link.is_revoked():
+        FileShareLink.objects.filter(id=share_id, revoked_at__isnull=True).update(revoked_at=timezone.now())
+    revocations.add(share_link.id)
+    invalidate_share_link(share_link.id)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+def shared_file_response(request, iv, name, mime_type, open_blob, **metadata):
+    # The blob is only opened when the content itself is requested
+    # If metadata is requested, return encryption metadata
+    if request.query_params.get('metadata'):
+        return Response({
+            'iv': iv,
+            'filename': name,
+            'mime_type': mime_type,
+            **metadata,
+        })
+
+    response = FileResponse(open_blob(), content_type=mime_type)
+    response['Content-Disposition'] = f'inline; filename="{name}"'
+    response['Content-Type'] = mime_type  # Explicitly set content type
+    return response
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def access_shared_file(request, share_id):
-    try:
-        share_link = FileShareLink.objects.get(id=share_id)
-        
-        if share_link.is_expired():
+    share_link = get_share_link(share_id)
+    if share_link is None:
+        if FileShareLink.objects.filter(id=share_id).exists():
             return Response({
                 'error': 'Share link has expired'
             }, status=status.HTTP_410_GONE)
-            
-        file = share_link.file
-        
-        # If metadata is requested, return encryption metadata
-        if request.query_params.get('metadata'):
-            return Response({
-                'iv': file.iv,
-                'filename': file.name,
-                'mime_type': file.mime_type,
-            })
-        
-        response = FileResponse(file.file, content_type=file.mime_type)
-        response['Content-Disposition'] = f'inline; filename="{file.name}"'
-        response['Content-Type'] = file.mime_type  # Explicitly set content type
-        return response
-    except FileShareLink.DoesNotExist:
         return Response({
             'error': 'Share link not found'
         }, status=status.HTTP_404_NOT_FOUND)
+
+    return shared_file_response(
+        request,
+        share_link['iv'],
+        share_link['name'],
+        share_link['mime_type'],
+        lambda: default_storage.open(share_link['path']),
+        # Entries cached before chunked blobs existed have no manifest
+        chunk_size=share_link.get('chunk_size'),
+        chunk_count=share_link.get('chunk_count'),
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def access_shared_file_token(request, token):
+    """Serve a signed share link.
+
+    Validity, expiry and revocation are checked in memory; the only query is
+    the primary key lookup of the file itself.
+    """
+    try:
+        link_id, file_id, expires_at = resolve_share_token(token)
+    except InvalidShareToken:
+        return Response({'error': 'Share link not found'}, status=status.HTTP_404_NOT_FOUND)
+    except (ExpiredShareToken, RevokedShareToken):
+        return Response({'error': 'Share link has expired'}, status=status.HTTP_410_GONE)
+
+    file = File.objects.filter(pk=file_id).only('iv', 'name', 'mime_type', 'file', 'chunk_size', 'chunk_count').first()
+    if file is None:
+        return Response({'error': 'Share link not found'}, status=status.HTTP_404_NOT_FOUND)
+    # The link id is what the file key is stored under in the KMS
+    return shared_file_response(
+        request, file.iv, file.name, file.mime_type, lambda: file.file,
+        share_id=str(link_id), expires_at=expires_at.isoformat(),
+        chunk_size=file.chunk_size, chunk_count=file.chunk_count,
+    )
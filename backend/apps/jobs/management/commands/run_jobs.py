@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from apps.jobs.queue import get_queue_depth
+from apps.jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, help='Jobs run at once by this worker')
+        parser.add_argument('--burst', action='store_true', help='Exit once no jobs are due')
+        parser.add_argument('--stats', action='store_true', help='Print the number of jobs per type and status, then exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for (name, status), count in sorted(get_queue_depth().items()):
+                self.stdout.write(f'{name:<30} {status:<10} {count}')
+            return
+
+        processed = Worker(threads=options['threads'] or settings.JOB_WORKER_THREADS).run(burst=options['burst'])
+        self.stdout.write(f'Processed {processed} jobs')
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-19 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="periodic",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name="job",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("periodic", True)),
+                fields=("name",),
+                name="jobs_job_one_periodic_per_type",
+            ),
+        ),
+    ]
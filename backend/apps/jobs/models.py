@@ -0,0 +1,50 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Unit of deferred work, run by the ``run_jobs`` worker.
+
+    Rows are inserted in the transaction of the request that hands the work
+    off, so a job exists exactly when that transaction commits. Finished
+    jobs are deleted; jobs that used up their attempts are kept as
+    ``failed`` for inspection. Each periodic job type instead has a single
+    ``periodic`` row, which is queued again after every run.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)  # Registered job type
+    payload = models.JSONField(default=dict)  # Keyword arguments of the handler
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)  # Start of the current lease
+    worker = models.CharField(max_length=100, blank=True)  # Worker running the job
+    last_error = models.TextField(blank=True)
+    periodic = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['name', 'status']),
+        ]
+        constraints = [
+            # Workers starting at the same time schedule a periodic type only once
+            models.UniqueConstraint(
+                fields=['name'], condition=models.Q(periodic=True), name='jobs_job_one_periodic_per_type'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} job #{self.id} ({self.status})"
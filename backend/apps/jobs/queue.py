@@ -0,0 +1,157 @@
+"""
+Database-backed job queue.
+
+Workers claim a job with a single conditional UPDATE that also checks the
+number of running jobs of its type, so per-type concurrency limits hold
+across any number of worker processes. A claimed job holds a lease for
+``JOB_LEASE_TIMEOUT`` seconds, which the worker renews while the job runs;
+jobs of a worker that died are queued again once their lease runs out.
+Periodic jobs are queued again ``interval`` seconds after each run instead
+of being deleted, and are never given up on for good.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Job
+from .registry import job_types
+
+
+def enqueue(name, delay=0, **payload):
+    """Queue a ``name`` job to run with ``payload`` as keyword arguments.
+
+    Call this inside the transaction making the change the job follows up
+    on, so the job is only visible to workers once that change commits.
+    """
+    if name not in job_types:
+        raise ValueError(f'Unknown job type {name!r}')
+    return Job.objects.create(name=name, payload=payload, run_at=timezone.now() + timedelta(seconds=delay))
+
+
+def schedule_periodic_jobs():
+    """Create the job of every periodic job type that doesn't have one yet."""
+    Job.objects.bulk_create(
+        [Job(name=name, periodic=True) for name, job_type in job_types.items() if job_type.interval],
+        ignore_conflicts=True,
+    )
+
+
+def get_next_run(job):
+    return timezone.now() + timedelta(seconds=job_types[job.name].interval)
+
+
+def get_retry_delay(attempts):
+    delay = settings.JOB_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(delay, settings.JOB_RETRY_MAX_DELAY))
+
+
+def get_concurrency(job_type):
+    return job_type.concurrency or settings.JOB_CONCURRENCY
+
+
+def get_max_attempts(job_type):
+    return job_type.max_attempts or settings.JOB_MAX_ATTEMPTS
+
+
+def claim_jobs(worker, limit):
+    """Mark up to ``limit`` due jobs as running for ``worker`` and return them.
+
+    Candidates are read per type, and only for types with free slots, so a
+    backlog of a type at its concurrency limit doesn't hold up the others.
+    """
+    now = timezone.now()
+    running_counts = dict(
+        Job.objects.filter(status=Job.RUNNING).order_by().values_list('name').annotate(count=Count('id'))
+    )
+    candidates = []
+    for name, job_type in job_types.items():
+        free = min(get_concurrency(job_type) - running_counts.get(name, 0), limit)
+        if free > 0:
+            candidates += (
+                Job.objects.filter(status=Job.QUEUED, name=name, run_at__lte=now)
+                .values_list('run_at', 'id', 'name')[:free]
+            )
+    candidates.sort()  # Oldest first across types
+
+    running = Job.objects.filter(name=OuterRef('name'), status=Job.RUNNING).values('name').annotate(
+        count=Count('id')
+    ).values('count')
+    claimed = []
+    for _, job_id, name in candidates:
+        if len(claimed) == limit:
+            break
+        # Another worker may have taken the job or filled the type's slots
+        # since the candidates were read, so both are checked again here
+        updated = (
+            Job.objects.filter(pk=job_id, status=Job.QUEUED)
+            .alias(running=Coalesce(Subquery(running, output_field=IntegerField()), Value(0)))
+            .filter(running__lt=get_concurrency(job_types[name]))
+            .update(status=Job.RUNNING, started_at=now, worker=worker, attempts=F('attempts') + 1)
+        )
+        if updated:
+            claimed.append(job_id)
+    return list(Job.objects.filter(pk__in=claimed))
+
+
+def renew_lease(job):
+    """Restart the lease of a job still running; returns whether it was renewed.
+
+    Fails once the job was taken from this worker, e.g. requeued after the
+    worker stalled for longer than ``JOB_LEASE_TIMEOUT``.
+    """
+    return bool(
+        Job.objects.filter(pk=job.pk, worker=job.worker, status=Job.RUNNING).update(started_at=timezone.now())
+    )
+
+
+def complete_job(job):
+    jobs = Job.objects.filter(pk=job.pk, worker=job.worker)
+    if job.periodic:
+        jobs.update(status=Job.QUEUED, worker='', attempts=0, last_error='', run_at=get_next_run(job))
+    else:
+        jobs.delete()
+
+
+def fail_job(job, error):
+    """Schedule a retry with exponential backoff, or give up after the last attempt.
+
+    A periodic job that is given up on runs again after its interval.
+    """
+    update = {'status': Job.QUEUED, 'worker': '', 'last_error': str(error)[:1000]}
+    if job.attempts >= get_max_attempts(job_types[job.name]):
+        if job.periodic:
+            update.update(attempts=0, run_at=get_next_run(job))
+        else:
+            update['status'] = Job.FAILED
+    else:
+        update['run_at'] = timezone.now() + get_retry_delay(job.attempts)
+    Job.objects.filter(pk=job.pk, worker=job.worker).update(**update)
+
+
+def requeue_expired():
+    """Queue again the running jobs whose lease has run out; returns how many.
+
+    Jobs that were on their last attempt are marked failed instead, so a job
+    that kills its worker can't take the queue down with it forever. Periodic
+    jobs are left to their interval after a last failed attempt.
+    """
+    expired = Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=settings.JOB_LEASE_TIMEOUT)
+    )
+    update = {'worker': '', 'last_error': 'Lease expired'}
+    for name, job_type in job_types.items():
+        last_attempts = expired.filter(name=name, attempts__gte=get_max_attempts(job_type))
+        if job_type.interval:
+            last_attempts.filter(periodic=True).update(
+                status=Job.QUEUED, attempts=0, run_at=timezone.now() + timedelta(seconds=job_type.interval), **update
+            )
+        last_attempts.update(status=Job.FAILED, **update)
+    return expired.update(status=Job.QUEUED, **update)
+
+
+def get_queue_depth():
+    """Return a ``{(name, status): count}`` dict of the jobs in the queue."""
+    rows = Job.objects.order_by().values('name', 'status').annotate(count=Count('id'))
+    return {(row['name'], row['status']): row['count'] for row in rows}
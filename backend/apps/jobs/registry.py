@@ -0,0 +1,27 @@
+class JobType:
+    def __init__(self, name, handler, concurrency=None, max_attempts=None, interval=None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency  # Jobs of this type running at once, across all workers
+        self.max_attempts = max_attempts
+        self.interval = interval  # Seconds between runs of a periodic job type
+
+
+job_types = {}
+
+
+def job(name, concurrency=None, max_attempts=None, interval=None):
+    """Register a function as the handler of the ``name`` job type.
+
+    The handler is called with the job's payload as keyword arguments and
+    may run more than once for the same job, so it must be idempotent.
+    ``concurrency`` and ``max_attempts`` default to ``JOB_CONCURRENCY`` and
+    ``JOB_MAX_ATTEMPTS``. With ``interval``, the workers also run the handler
+    without arguments every ``interval`` seconds.
+    """
+    def register(handler):
+        if name in job_types:
+            raise ValueError(f'Job type {name!r} is already registered')
+        job_types[name] = JobType(name, handler, concurrency, max_attempts, interval)
+        return handler
+    return register
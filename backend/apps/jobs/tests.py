@@ -0,0 +1,131 @@
+from datetime import timedelta
+from unittest import mock
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .models import Job
+from .queue import (
+    claim_jobs,
+    enqueue,
+    get_queue_depth,
+    renew_lease,
+    requeue_expired,
+    schedule_periodic_jobs,
+)
+from .registry import job, job_types
+from .worker import Worker
+
+calls = []
+
+
+@job('test_record', concurrency=2, max_attempts=2)
+def record(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise RuntimeError(f'Failed on {value}')
+
+
+@job('test_other')
+def other(value):
+    calls.append(value)
+
+
+@job('test_periodic', max_attempts=1, interval=60)
+def periodic():
+    calls.append('periodic')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_runs_and_deletes_jobs(self):
+        enqueue('test_record', value=1)
+        enqueue('test_record', value=2)
+        enqueue('test_record', delay=60, value=3)  # Not due yet
+
+        self.assertEqual(Worker().run(burst=True), 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(list(Job.objects.values_list('payload', flat=True)), [{'value': 3}])
+
+    def test_failed_jobs_are_retried_with_backoff_then_kept(self):
+        enqueue('test_record', value=1, fail=True)
+
+        Worker().run(burst=True)
+        entry = Job.objects.get()
+        self.assertEqual((entry.status, entry.attempts, entry.last_error), (Job.QUEUED, 1, 'Failed on 1'))
+        self.assertGreater(entry.run_at, timezone.now())
+
+        Job.objects.update(run_at=timezone.now())
+        Worker().run(burst=True)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(get_queue_depth(), {('test_record', Job.FAILED): 1})
+
+    def test_concurrency_limit_holds_across_workers(self):
+        for i in range(3):
+            enqueue('test_record', value=i)
+
+        self.assertEqual(len(claim_jobs('worker-a', 3)), 2)
+        self.assertEqual(claim_jobs('worker-b', 3), [])
+
+    def test_saturated_type_does_not_block_other_types(self):
+        for i in range(10):
+            enqueue('test_record', value=i)
+        self.assertEqual(len(claim_jobs('worker-a', 2)), 2)
+        enqueue('test_other', value='other')
+
+        self.assertEqual([job.name for job in claim_jobs('worker-b', 2)], ['test_other'])
+
+    @override_settings(JOB_LEASE_TIMEOUT=60)
+    def test_lease_is_renewed_until_the_job_is_taken_away(self):
+        enqueue('test_record', value=1)
+        [claimed] = claim_jobs('worker-a', 1)
+        Job.objects.update(started_at=timezone.now() - timedelta(seconds=50))
+
+        self.assertTrue(renew_lease(claimed))
+        self.assertEqual(requeue_expired(), 0)
+
+        Job.objects.update(started_at=timezone.now() - timedelta(seconds=61))
+        requeue_expired()
+        self.assertFalse(renew_lease(claimed))
+
+    def test_errors_recording_the_outcome_are_logged(self):
+        enqueue('test_record', value=1)
+
+        with mock.patch('apps.jobs.worker.complete_job', side_effect=DatabaseError('database is locked')):
+            with self.assertLogs('apps.jobs.worker', 'ERROR'):
+                self.assertEqual(Worker().run(burst=True), 1)
+        # Left running, to be retried once its lease runs out
+        self.assertEqual(Job.objects.get().status, Job.RUNNING)
+
+    @override_settings(JOB_LEASE_TIMEOUT=60)
+    def test_jobs_of_lost_workers_are_requeued(self):
+        enqueue('test_record', value=1)
+        claim_jobs('lost-worker', 1)
+        self.assertEqual(requeue_expired(), 0)
+
+        Job.objects.update(started_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(requeue_expired(), 1)
+        self.assertEqual(Worker().run(burst=True), 1)
+        self.assertEqual(calls, [1])
+
+    def test_periodic_jobs_run_again_after_their_interval(self):
+        schedule_periodic_jobs()
+        schedule_periodic_jobs()  # e.g. a second worker starting
+        self.assertEqual(Job.objects.filter(name='test_periodic').count(), 1)
+        Job.objects.exclude(name='test_periodic').delete()
+
+        self.assertEqual(Worker().run(burst=True), 1)
+        self.assertEqual(calls, ['periodic'])
+        entry = Job.objects.get()
+        self.assertEqual((entry.status, entry.attempts), (Job.QUEUED, 0))
+        self.assertGreater(entry.run_at, timezone.now() + timedelta(seconds=50))
+
+        # Giving up on a periodic job only skips to its next run
+        Job.objects.update(run_at=timezone.now())
+        with mock.patch.object(job_types['test_periodic'], 'handler', side_effect=RuntimeError('Broken')):
+            Worker().run(burst=True)
+        entry = Job.objects.get()
+        self.assertEqual((entry.status, entry.last_error), (Job.QUEUED, 'Broken'))
+        self.assertGreater(entry.run_at, timezone.now() + timedelta(seconds=50))
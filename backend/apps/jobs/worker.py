@@ -0,0 +1,132 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import DatabaseError, connection
+from core.metrics import JOB_SECONDS, JOBS_PROCESSED
+from .queue import claim_jobs, complete_job, fail_job, renew_lease, requeue_expired, schedule_periodic_jobs
+from .registry import job_types
+
+logger = logging.getLogger(__name__)
+
+
+def get_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class LeaseRenewer(threading.Thread):
+    """Renew the lease of a running job until stopped.
+
+    Keeps long jobs from being requeued, and started a second time, while
+    their handler is still running.
+    """
+
+    def __init__(self, job):
+        super().__init__(name=f'lease-{job.pk}', daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOB_LEASE_RENEW_INTERVAL):
+                try:
+                    if not renew_lease(self.job):
+                        logger.warning('Lost the lease of %s', self.job)
+                        return
+                except DatabaseError:
+                    # Retried at the next interval, well before the lease runs out
+                    logger.exception('Could not renew the lease of %s', self.job)
+        finally:
+            connection.close()  # The thread has its own connection
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def execute(job):
+    """Run one claimed job and record its outcome; returns whether it succeeded."""
+    start = time.perf_counter()
+    renewer = LeaseRenewer(job)
+    renewer.start()
+    try:
+        job_types[job.name].handler(**job.payload)
+    except Exception as e:
+        error = e
+    else:
+        error = None
+    finally:
+        renewer.stop()
+
+    try:
+        if error is None:
+            complete_job(job)
+        else:
+            fail_job(job, error)
+    except Exception:
+        # The job stays running until its lease runs out and is then retried
+        logger.exception('Could not record the outcome of %s', job)
+    JOBS_PROCESSED.labels(job.name, 'done' if error is None else 'failed').inc()
+    JOB_SECONDS.labels(job.name).observe(time.perf_counter() - start)
+    return error is None
+
+
+class Worker:
+    """Claim due jobs and run them on a pool of ``threads`` threads.
+
+    With one thread, jobs run in the calling thread, which is what tests
+    and one-off drains use.
+    """
+
+    def __init__(self, threads=1):
+        self.threads = threads
+        self.worker_id = get_worker_id()
+
+    def run(self, burst=False):
+        """Process jobs until interrupted, or until none are due with ``burst``.
+
+        A worker that runs until interrupted first schedules the periodic
+        job types. Returns the number of jobs processed.
+        """
+        if not burst:
+            schedule_periodic_jobs()
+        if self.threads == 1:
+            return self.run_inline(burst)
+
+        processed = 0
+        active = set()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while True:
+                requeue_expired()
+                jobs = claim_jobs(self.worker_id, self.threads - len(active))
+                active.update(executor.submit(self.execute_threaded, job) for job in jobs)
+                if burst and not active:
+                    return processed
+                if active:
+                    done, active = wait(active, timeout=settings.JOB_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    processed += len(done)
+                else:
+                    time.sleep(settings.JOB_POLL_INTERVAL)
+
+    def run_inline(self, burst):
+        processed = 0
+        while True:
+            requeue_expired()
+            jobs = claim_jobs(self.worker_id, 1)
+            for job in jobs:
+                execute(job)
+                processed += 1
+            if not jobs:
+                if burst:
+                    return processed
+                time.sleep(settings.JOB_POLL_INTERVAL)
+
+    def execute_threaded(self, job):
+        try:
+            return execute(job)
+        finally:
+            connection.close()  # Each worker thread has its own connection
@@ -0,0 +1,62 @@
+"""
+Compare rendering file lists with ``FileSerializer`` and ``render_file_list``.
+
+Both paths include their database queries and end with the JSON bytes sent
+to the client, so the numbers are what ``list_files`` spends on a cache miss.
+
+    python -m benchmarks.file_lists
+"""
+
+from benchmarks.harness import setup_django, measure, format_result
+
+setup_django()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from apps.authentication.models import User  # noqa: E402
+from apps.files.models import File, FileShare  # noqa: E402
+from apps.files.serializers import FileSerializer, render_file_list  # noqa: E402
+
+SIZES = (50, 1000, 5000)
+
+
+def main():
+    owner = User.objects.create_user(
+        username='owner@example.com', email='owner@example.com', password='x', role=User.REGULAR
+    )
+    recipients = [
+        User.objects.create_user(
+            username=f'r{i}@example.com', email=f'r{i}@example.com', password='x', role=User.GUEST
+        )
+        for i in range(3)
+    ]
+    renderer = JSONRenderer()
+
+    for size in SIZES:
+        File.objects.all().delete()
+        files = File.objects.bulk_create(
+            File(name=f'{i}.pdf', file=f'uploads/{owner.id}/{i}.pdf', mime_type='application/pdf',
+                 size=1024, owner=owner, iv='aXY=')
+            for i in range(size)
+        )
+        FileShare.objects.bulk_create(
+            FileShare(file=file, shared_by=owner, shared_with=recipient)
+            for file in files[::2] for recipient in recipients
+        )
+        queryset = File.objects.filter(owner=owner)
+
+        def serializer():
+            rows = queryset.select_related('owner').prefetch_related('shares__shared_with')
+            return renderer.render(FileSerializer(rows, many=True).data)
+
+        assert serializer() == render_file_list(queryset)
+        number = max(1, 2000 // size)
+        base = measure(serializer, number=number, repeat=5)
+        fast = measure(lambda: render_file_list(queryset), number=number, repeat=5)
+        print(format_result(f'FileSerializer, {size} rows', base))
+        print(format_result(f'render_file_list, {size} rows', fast))
+        print(f"{'':<40} {base['median_us'] / fast['median_us']:.1f}x, "
+              f"{size / fast['median_us'] * 1e6:,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
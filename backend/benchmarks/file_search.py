@@ -0,0 +1,107 @@
+"""
+Time filename search over a multi-million-row files table.
+
+Runs every query through the FTS5 trigram index, as a ``LIKE`` over the
+searching user's files, and through ``search_files``, which uses the index
+only for queries few names contain. One user has a typical library and the
+other owns a tenth of all files. The fixture is generated in SQL; pass ``--rows`` to
+change its size.
+
+    python -m benchmarks.file_search --rows 2000000
+"""
+
+import argparse
+from benchmarks.harness import setup_django, measure, format_result
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from apps.authentication.models import User  # noqa: E402
+from apps.files import search  # noqa: E402
+
+WORDS = ['invoice', 'report', 'photo', 'scan', 'contract', 'draft', 'budget', 'slides', 'notes', 'backup']
+EXTENSIONS = ['pdf', 'png', 'docx', 'xlsx', 'txt']
+USERS = 2000
+QUERIES = [
+    ('substring, common', 'report', False),
+    ('substring, rare', 'budget 1234', False),
+    ('prefix', 'contract 77', True),
+    ('prefix, short', 'sc', True),
+]
+
+
+def insert_fixture(rows):
+    words = ' '.join(f"WHEN {i} THEN '{word}'" for i, word in enumerate(WORDS))
+    extensions = ' '.join(f"WHEN {i} THEN '{ext}'" for i, ext in enumerate(EXTENSIONS))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s)
+            INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, is_staff,
+                                   is_active, date_joined, email, is_totp_enabled, role)
+            SELECT '!', 0, 'user' || n, '', '', 0, 1, '2024-01-01 00:00:00', 'user' || n || '@example.com',
+                   0, 'regular'
+            FROM seq
+            ''',
+            [USERS],
+        )
+        cursor.execute(
+            f'''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s)
+            INSERT INTO files_file (id, name, file, mime_type, size, owner_id, created_at, updated_at, iv)
+            SELECT lower(hex(randomblob(16))),
+                   CASE n % 10 {words} END || ' ' || (n / 10 % 10000) || '.' || CASE n % 5 {extensions} END,
+                   'uploads/' || n, 'application/pdf', 1024, CASE WHEN n % 11 = 0 THEN 1 ELSE n % %s + 1 END,
+                   '2024-01-01 00:00:00', '2024-01-01 00:00:00', 'aXY='
+            FROM seq
+            ''',
+            [rows, USERS],
+        )
+        # Every seventh file is shared with another user
+        cursor.execute(
+            '''
+            INSERT INTO files_fileshare (file_id, shared_by_id, shared_with_id, created_at)
+            SELECT id, owner_id, (owner_id + rowid) % %s + 1, '2024-01-01 00:00:00'
+            FROM files_file WHERE rowid % 7 = 0 AND (owner_id + rowid) % %s + 1 != owner_id
+            ''',
+            [USERS, USERS],
+        )
+
+
+def run_search(user, query, prefix, limit, max_matches):
+    """Search with the index used for up to ``max_matches`` matches (-1 for never)."""
+    default = settings.SEARCH_INDEX_MAX_MATCHES
+    settings.SEARCH_INDEX_MAX_MATCHES = max_matches
+    try:
+        return search.search_files(user, query, prefix=prefix, limit=limit)
+    finally:
+        settings.SEARCH_INDEX_MAX_MATCHES = default
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    insert_fixture(args.rows)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    for user in User.objects.filter(username__in=['user1', 'user2']).order_by('-username'):
+        print(f'\n{user.username}: {user.files.count():,} files owned, '
+              f'{user.received_files.count():,} shared with them, out of {args.rows:,}')
+        for label, query, prefix in QUERIES:
+            scan = lambda: run_search(user, query, prefix, args.limit, -1)  # noqa: E731
+            indexed = lambda: run_search(user, query, prefix, args.limit, args.rows)  # noqa: E731
+            auto = lambda: search.search_files(user, query, prefix=prefix, limit=args.limit)  # noqa: E731
+            assert scan() == indexed() == auto()
+            chosen = 'scan' if search.match_names(query) is None else 'index'
+            print(format_result(f'LIKE scan, {label}', measure(scan, number=3, repeat=3)))
+            print(format_result(f'trigram index, {label}', measure(indexed, number=3, repeat=3)))
+            print(format_result(f'search_files, {label}', measure(auto, number=3, repeat=3)) + f'  ({chosen})')
+
+
+if __name__ == '__main__':
+    main()
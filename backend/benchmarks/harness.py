@@ -0,0 +1,66 @@
+"""
+Shared helpers for the benchmark scripts in this package.
+
+Run a benchmark from the ``backend`` directory, e.g.::
+
+    python -m benchmarks.metrics_overhead
+"""
+
+import gc
+import os
+import statistics
+import time
+
+
+def setup_django(database=':memory:'):
+    """Configure Django for a benchmark run against a throwaway database."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+    settings.DEBUG = False  # Don't log every query
+    settings.ALLOWED_HOSTS = ['testserver']
+    import django
+    django.setup()
+    if database == ':memory:':
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+
+
+def measure(func, number=1000, repeat=7, warmup=1):
+    """Time ``func`` and return per-call statistics in microseconds.
+
+    ``func`` runs ``number`` times per round for ``repeat`` rounds; the
+    statistics are computed over the per-round averages so a single slow
+    round (a GC pause, a noisy neighbour) does not skew the median.
+    """
+    for _ in range(warmup):
+        for _ in range(number):
+            func()
+
+    rounds = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            rounds.append((time.perf_counter() - start) / number * 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return {
+        'median_us': statistics.median(rounds),
+        'min_us': min(rounds),
+        'stdev_us': statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+        'rounds': repeat,
+        'number': number,
+    }
+
+
+def format_result(name, result):
+    return (
+        f"{name:<40} median {result['median_us']:10.2f} us  "
+        f"min {result['min_us']:10.2f} us  stdev {result['stdev_us']:8.2f} us"
+    )
@@ -0,0 +1,313 @@
+"""
+End-to-end load test for the backend and the KMS.
+
+1. Start the KMS and the backend locally, e.g.::
+
+       SQLITE_PATH=/tmp/loadtest.sqlite3 python manage.py migrate
+       SQLITE_PATH=/tmp/loadtest.sqlite3 DEBUG=0 DJANGO_ALLOWED_HOSTS=localhost \\
+           gunicorn core.wsgi -w 4 -b localhost:8000
+
+2. Seed the database and the KMS::
+
+       SQLITE_PATH=/tmp/loadtest.sqlite3 python manage.py seed_loadtest \\
+           --kms-url http://localhost:5001 --output /tmp/manifest.json
+
+3. Drive the flows and write the results::
+
+       python -m benchmarks.loadtest --manifest /tmp/manifest.json \\
+           --backend-url http://localhost:8000 --kms-url http://localhost:5001 \\
+           --duration 60 --concurrency 16 --output results.json
+
+4. Compare two runs, e.g. from two commits::
+
+       python -m benchmarks.loadtest --compare before.json after.json
+
+The results file holds p50/p95/p99 latency, error counts and throughput per
+flow, together with the git commit and the run configuration.
+"""
+
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+import pyotp
+import requests
+
+# Relative frequency of each flow in the mix
+DEFAULT_FLOW_WEIGHTS = {
+    'login_2fa': 1,
+    'upload_file': 2,
+    'list_files': 6,
+    'shared_with_me': 4,
+    'download_file': 6,
+    'access_shared_file': 3,
+    'kms_get_key': 6,
+}
+
+UPLOAD_SIZE = 16 * 1024  # bytes
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, flow, duration, ok):
+        with self.lock:
+            if ok:
+                self.latencies[flow].append(duration)
+            else:
+                self.errors[flow] += 1
+
+    def summary(self, elapsed):
+        flows = {}
+        for flow in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[flow])
+            flows[flow] = {
+                'requests': len(values) + self.errors[flow],
+                'errors': self.errors[flow],
+                'throughput_rps': len(values) / elapsed,
+                'mean_ms': sum(values) / len(values) * 1000 if values else None,
+                **{
+                    f'p{pct}_ms': percentile(values, pct) * 1000 if values else None
+                    for pct in (50, 95, 99)
+                },
+            }
+        return flows
+
+
+class Session:
+    """An authenticated user driving flows over a keep-alive connection."""
+
+    def __init__(self, user, manifest, args):
+        self.user = user
+        self.manifest = manifest
+        self.args = args
+        self.http = requests.Session()
+        # The backend only accepts HTTPS, which nginx normally terminates
+        self.http.headers['X-Forwarded-Proto'] = 'https'
+        self.token = None
+
+    def login(self):
+        response = self.http.post(f'{self.args.backend_url}/api/auth/login/', json={
+            'email': self.user['email'],
+            'password': self.manifest['password'],
+        }, timeout=self.args.timeout)
+        response.raise_for_status()
+        assert response.json().get('requires_2fa'), 'Seeded users have 2FA enabled'
+
+        response = self.http.post(f'{self.args.backend_url}/api/auth/login-verify-2fa/', json={
+            'email': self.user['email'],
+            'code': pyotp.TOTP(self.user['totp_secret']).now(),
+        }, timeout=self.args.timeout)
+        response.raise_for_status()
+        self.token = response.json()['access']
+        self.http.headers['Authorization'] = f'Bearer {self.token}'
+
+    def get(self, path, **kwargs):
+        response = self.http.get(f'{self.args.backend_url}{path}', timeout=self.args.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def login_2fa(self, rng):
+        self.login()
+
+    def upload_file(self, rng):
+        response = self.http.post(
+            f'{self.args.backend_url}/api/files/upload/',
+            files={'file': ('loadtest.pdf', rng.randbytes(UPLOAD_SIZE), 'application/pdf')},
+            data={'iv': base64.b64encode(rng.randbytes(12)).decode()},
+            timeout=self.args.timeout,
+        )
+        response.raise_for_status()
+
+    def list_files(self, rng):
+        self.get('/api/files/')
+
+    def shared_with_me(self, rng):
+        self.get('/api/files/shared_with_me/')
+
+    def download_file(self, rng):
+        self.get(f'/api/files/{rng.choice(self.accessible_files)}/download/')
+
+    def access_shared_file(self, rng):
+        self.get(f'/api/files/shared/{rng.choice(self.manifest["links"])}/')
+
+    def kms_get_key(self, rng):
+        response = self.http.get(
+            f'{self.args.kms_url}/keys/{rng.choice(self.accessible_files)}',
+            timeout=self.args.timeout,
+        )
+        response.raise_for_status()
+
+    @property
+    def accessible_files(self):
+        if not hasattr(self, '_accessible_files'):
+            if self.user['role'] == 'admin':
+                files = [file['id'] for file in self.manifest['files']]
+            else:
+                files = [file['id'] for file in self.manifest['files'] if file['owner_id'] == self.user['id']]
+                files += [share['file_id'] for share in self.manifest['shares'] if share['user_id'] == self.user['id']]
+            self._accessible_files = files
+        return self._accessible_files
+
+    def allowed_flows(self):
+        flows = set(self.args.flows)
+        if self.user['role'] == 'guest':
+            flows.discard('upload_file')
+        if not self.accessible_files:
+            flows -= {'download_file', 'kms_get_key'}
+        if not self.manifest['links']:
+            flows.discard('access_shared_file')
+        return sorted(flows)
+
+
+def worker(index, manifest, args, recorder, deadline):
+    rng = random.Random(args.seed * 1000 + index)
+    users = manifest['users']
+    session = Session(users[index % len(users)], manifest, args)
+    start = time.perf_counter()
+    try:
+        session.login()
+    except (requests.RequestException, AssertionError, KeyError):
+        recorder.record('login_2fa', time.perf_counter() - start, False)
+        return
+
+    flows = session.allowed_flows()
+    weights = [args.weights[flow] for flow in flows]
+    while time.monotonic() < deadline:
+        flow = rng.choices(flows, weights)[0]
+        start = time.perf_counter()
+        try:
+            getattr(session, flow)(rng)
+            ok = True
+        except (requests.RequestException, AssertionError, KeyError, ValueError):
+            ok = False
+        recorder.record(flow, time.perf_counter() - start, ok)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__), text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(i, manifest, args, recorder, deadline))
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    results = {
+        'commit': git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'weights': {flow: args.weights[flow] for flow in args.flows},
+            'users': len(manifest['users']),
+            'files': len(manifest['files']),
+        },
+        'elapsed_seconds': elapsed,
+        'flows': recorder.summary(elapsed),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_results(results)
+
+
+def print_results(results):
+    print(f"{'flow':<20}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for flow, stats in results['flows'].items():
+        p50, p95, p99 = (f"{stats[k]:.1f}" if stats[k] is not None else '-' for k in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(
+            f"{flow:<20}{stats['requests']:>10}{stats['errors']:>8}"
+            f"{stats['throughput_rps']:>10.1f}{p50:>10}{p95:>10}{p99:>10}"
+        )
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'flow':<20}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'rps':>18}")
+    for flow in sorted(set(before['flows']) & set(after['flows'])):
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            old, new = before['flows'][flow][key], after['flows'][flow][key]
+            if old and new is not None:
+                cells.append(f'{new:.1f} ({(new - old) / old * 100:+.0f}%)')
+            else:
+                cells.append('-')
+        print(f'{flow:<20}' + ''.join(f'{cell:>18}' for cell in cells))
+
+
+def parse_weights(value):
+    weights = dict(DEFAULT_FLOW_WEIGHTS)
+    for item in value.split(','):
+        flow, weight = item.split('=')
+        if flow not in weights:
+            raise argparse.ArgumentTypeError(f'Unknown flow {flow}')
+        weights[flow] = float(weight)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--manifest', default='loadtest_manifest.json')
+    parser.add_argument('--backend-url', default='http://localhost:8000')
+    parser.add_argument('--kms-url', default='http://localhost:5001')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run for')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent simulated users')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--flows', nargs='+', choices=sorted(DEFAULT_FLOW_WEIGHTS), default=sorted(DEFAULT_FLOW_WEIGHTS))
+    parser.add_argument('--weights', type=parse_weights, default=DEFAULT_FLOW_WEIGHTS,
+                        help='Override flow weights, e.g. list_files=10,upload_file=1')
+    parser.add_argument('--output', default='loadtest_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure the per-request overhead of ``core.metrics.MetricsMiddleware``.
+
+Two figures are reported:
+
+* the middleware on its own, wrapped around a view that does nothing, which
+  isolates the cost of recording the samples;
+* the same requests sent through two full Django handler stacks, one with the
+  metrics middleware and one without.
+
+    python -m benchmarks.metrics_overhead
+"""
+
+from benchmarks.harness import setup_django, measure, format_result
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import Client, RequestFactory, override_settings  # noqa: E402
+from django.urls import resolve  # noqa: E402
+from apps.authentication.models import User  # noqa: E402
+from apps.authentication.views import create_full_access_token  # noqa: E402
+from apps.files.models import File  # noqa: E402
+from core.metrics import MetricsMiddleware  # noqa: E402
+
+METRICS_MIDDLEWARE = 'core.metrics.MetricsMiddleware'
+
+
+def build_client(**headers):
+    client = Client(**headers)
+    # Middleware is loaded on the first request, so warm the handler now
+    client.get('/api/files/', secure=True)
+    return client
+
+
+def report(name, base, with_metrics):
+    print(format_result(f'{name} without metrics', base))
+    print(format_result(f'{name} with metrics', with_metrics))
+    print(f"{'':<40} overhead {with_metrics['median_us'] - base['median_us']:+.2f} us/request")
+
+
+def bench_middleware_only():
+    request = RequestFactory().get('/api/files/')
+    request.resolver_match = resolve('/api/files/')
+
+    def view(request):
+        return HttpResponse(b'[]', content_type='application/json')
+
+    middleware = MetricsMiddleware(view)
+    report(
+        'middleware only',
+        measure(lambda: view(request), number=20000),
+        measure(lambda: middleware(request), number=20000),
+    )
+
+
+def bench_full_stack():
+    user = User.objects.create_user(
+        username='bench@example.com', email='bench@example.com', password='x', role=User.REGULAR
+    )
+    File.objects.bulk_create(
+        File(name=f'{i}.pdf', file=f'uploads/{user.id}/{i}.pdf', mime_type='application/pdf',
+             size=1024, owner=user, iv='aXY=')
+        for i in range(20)
+    )
+    token = create_full_access_token(user)['access']
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    without = [m for m in settings.MIDDLEWARE if m != METRICS_MIDDLEWARE]
+    with override_settings(MIDDLEWARE=without):
+        plain = build_client(**headers)
+    instrumented = build_client(**headers)
+
+    cases = {
+        'unauthenticated 401': lambda client: client.get('/api/files/', secure=True, HTTP_AUTHORIZATION=''),
+        'list_files (20 rows)': lambda client: client.get('/api/files/', secure=True),
+    }
+    for name, request in cases.items():
+        report(
+            name,
+            measure(lambda: request(plain), number=100),
+            measure(lambda: request(instrumented), number=100),
+        )
+
+
+def main():
+    bench_middleware_only()
+    bench_full_stack()
+
+
+if __name__ == '__main__':
+    main()
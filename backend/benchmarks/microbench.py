@@ -0,0 +1,136 @@
+"""
+Microbenchmarks for the CPU hot spots every request goes through.
+
+    python -m benchmarks.microbench                  # print results
+    python -m benchmarks.microbench --save-baseline  # update baseline.json
+    python -m benchmarks.microbench --check          # fail on regressions
+
+``--check`` exits non-zero when the median of any benchmark is slower than
+its stored baseline by more than the margin (``--margin``, or the
+``MICROBENCH_MARGIN`` environment variable, as a fraction; default 0.25).
+Baselines are machine specific, so regenerate them on the machine that runs
+the check.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from benchmarks.harness import setup_django, measure, format_result
+
+setup_django()
+
+from django.test import RequestFactory  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from apps.authentication.auth import JWTAuthentication  # noqa: E402
+from apps.authentication.models import User  # noqa: E402
+from apps.authentication.permissions import IsAdmin, IsGuest, IsRegularUser  # noqa: E402
+from apps.authentication.views import create_full_access_token  # noqa: E402
+from apps.files.models import File, FileShare  # noqa: E402
+from apps.files.serializers import FileSerializer  # noqa: E402
+from core.utils.sanitizers import sanitize_filename, validate_mime_type  # noqa: E402
+
+BASELINE_PATH = Path(__file__).with_name('baseline.json')
+DEFAULT_MARGIN = 0.25
+
+
+def build_benchmarks():
+    owner = User.objects.create_user(
+        username='owner@example.com', email='owner@example.com', password='x', role=User.REGULAR
+    )
+    recipients = [
+        User.objects.create_user(
+            username=f'r{i}@example.com', email=f'r{i}@example.com', password='x', role=User.GUEST
+        )
+        for i in range(3)
+    ]
+    files = File.objects.bulk_create(
+        File(name=f'{i}.pdf', file=f'uploads/{owner.id}/{i}.pdf', mime_type='application/pdf',
+             size=1024, owner=owner, iv='aXY=')
+        for i in range(50)
+    )
+    FileShare.objects.bulk_create(
+        FileShare(file=file, shared_by=owner, shared_with=recipient)
+        for file in files for recipient in recipients
+    )
+    # Pre-load the rows so the serializer benchmark measures serialization only
+    file_rows = list(
+        File.objects.filter(owner=owner)
+        .select_related('owner')
+        .prefetch_related('shares__shared_with')
+    )
+
+    token = create_full_access_token(owner)['access']
+    auth_request = Request(RequestFactory().get('/api/files/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+    authentication = JWTAuthentication()
+
+    permission_request = Request(RequestFactory().get('/api/files/'))
+    permission_request.user = owner
+    permissions = [IsAdmin(), IsRegularUser(), IsGuest()]
+
+    def check_permissions():
+        for permission in permissions:
+            permission.has_permission(permission_request, None)
+
+    return {
+        'jwt_authenticate': (lambda: authentication.authenticate(auth_request), 500),
+        'permission_classes': (check_permissions, 20000),
+        'sanitize_filename': (lambda: sanitize_filename('Quarterly Report – Été (final) v2.PDF'), 20000),
+        'validate_mime_type': (lambda: validate_mime_type('application/pdf'), 50000),
+        'file_serializer_50_rows': (lambda: FileSerializer(file_rows, many=True).data, 50),
+    }
+
+
+def run(names=None):
+    results = {}
+    for name, (func, number) in build_benchmarks().items():
+        if names and name not in names:
+            continue
+        results[name] = measure(func, number=number)
+        print(format_result(name, results[name]))
+    return results
+
+
+def check(results, baseline, margin):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f'{name}: no baseline, skipped')
+            continue
+        expected = baseline[name]['median_us']
+        change = (result['median_us'] - expected) / expected
+        status = 'REGRESSION' if change > margin else 'ok'
+        print(f'{name:<40} {expected:10.2f} -> {result["median_us"]:10.2f} us  {change:+7.1%}  {status}')
+        if change > margin:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the per-request CPU microbenchmarks')
+    parser.add_argument('names', nargs='*', help='Only run these benchmarks')
+    parser.add_argument('--save-baseline', action='store_true', help=f'Write the results to {BASELINE_PATH.name}')
+    parser.add_argument('--check', action='store_true', help='Compare against the baseline and fail on regressions')
+    parser.add_argument('--margin', type=float, default=float(os.getenv('MICROBENCH_MARGIN', DEFAULT_MARGIN)),
+                        help='Allowed slowdown as a fraction of the baseline median')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    results = run(args.names)
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f'Baseline written to {args.baseline}')
+
+    if args.check:
+        regressions = check(results, json.loads(args.baseline.read_text()), args.margin)
+        if regressions:
+            print(f'Slower than baseline by more than {args.margin:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare share-link resolution through the database with signed tokens.
+
+Three figures are reported per case:
+
+* resolution only: loading the link row and checking its expiry, against
+  verifying a signed token and checking the revocation deny-set;
+* resolution plus loading the file metadata, which is what every hit of the
+  share link views does before streaming the blob;
+* the full ``?metadata=1`` request through the Django handler stack.
+
+    python -m benchmarks.share_links
+"""
+
+from benchmarks.harness import setup_django, measure, format_result
+
+setup_django()
+
+from datetime import timedelta  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from apps.authentication.models import User  # noqa: E402
+from apps.authentication.views import create_full_access_token  # noqa: E402
+from apps.files.models import File, FileShareLink  # noqa: E402
+from apps.files.share_tokens import make_share_token, resolve_share_token, revocations  # noqa: E402
+
+
+def report(name, database, signed):
+    print(format_result(f'{name} (database)', database))
+    print(format_result(f'{name} (signed token)', signed))
+    print(f"{'':<40} {database['median_us'] / signed['median_us']:.1f}x, "
+          f"{1e6 / signed['median_us']:,.0f} resolutions/s with tokens")
+
+
+def main():
+    user = User.objects.create_user(
+        username='bench@example.com', email='bench@example.com', password='x', role=User.REGULAR
+    )
+    files = File.objects.bulk_create(
+        File(name=f'{i}.pdf', file=f'uploads/{user.id}/{i}.pdf', mime_type='application/pdf',
+             size=1024, owner=user, iv='aXY=')
+        for i in range(1000)
+    )
+    expires_at = timezone.now() + timedelta(days=1)
+    links = FileShareLink.objects.bulk_create(
+        FileShareLink(file=file, created_by=user, expires_at=expires_at, iv=file.iv,
+                      name=file.name, mime_type=file.mime_type)
+        for file in files
+    )
+    # A realistic deny-set: some revoked links that have not expired yet
+    FileShareLink.objects.filter(id__in=[link.id for link in links[::10]]).update(revoked_at=timezone.now())
+    revocations.refresh()
+    link = links[1]
+    token = make_share_token(link)
+
+    def resolve_from_database():
+        share_link = FileShareLink.objects.get(id=link.id)
+        share_link.is_expired() or share_link.is_revoked()
+        return share_link
+
+    report(
+        'resolve',
+        measure(resolve_from_database, number=2000),
+        measure(lambda: resolve_share_token(token), number=20000),
+    )
+
+    def resolve_token_and_file():
+        _, file_id, _ = resolve_share_token(token)
+        return File.objects.filter(pk=file_id).only('iv', 'name', 'mime_type', 'file').first()
+
+    report(
+        'resolve + file',
+        measure(lambda: resolve_from_database().file, number=2000),
+        measure(resolve_token_and_file, number=2000),
+    )
+
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {create_full_access_token(user)['access']}")
+    report(
+        'metadata request',
+        measure(lambda: client.get(f'/api/files/shared/{link.id}/?metadata=1', secure=True), number=200),
+        measure(lambda: client.get(f'/api/files/shared/t/{token}/?metadata=1', secure=True), number=200),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Caching of list responses with generation counters.
+
+Every cached list depends on one or more scopes, such as ``user:<id>`` for
+everything a user sees or ``users`` for the admin user list. Each scope has
+a generation number in the cache, and the generations are part of the key a
+list is stored under. Invalidating a scope is a single ``incr`` of its
+generation; entries stored under the old generation are never read again
+and simply expire.
+
+Generations are seeded from the clock rather than starting at 1, so a
+generation that is evicted and recreated does not bring back old entries.
+
+The same key doubles as a weak ETag: a client sending it back in
+``If-None-Match`` gets a 304 without the list being read or serialized.
+"""
+
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from core.metrics import LIST_CACHE_REQUESTS
+
+ALL_FILES = 'files:all'
+USERS = 'users'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def generation_key(scope):
+    return f'gen:{scope}'
+
+
+def new_generation():
+    return time.time_ns() // 1000
+
+
+def get_generations(scopes):
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            generation = new_generation()
+            # add() keeps whichever value a concurrent request stored first
+            if not cache.add(key, generation, timeout=None):
+                generation = cache.get(key, generation)
+            generations[key] = generation
+    return [generations[key] for key in keys]
+
+
+def bump_generations(scopes):
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_generation(), timeout=None)
+
+
+def invalidate(*scopes):
+    """Invalidate the lists that depend on any of ``scopes``.
+
+    The generations are bumped right away and again once the current
+    transaction commits, so a list rebuilt by another request from data
+    read before the commit is not served afterwards.
+    """
+    scopes = set(scopes)
+    bump_generations(scopes)
+    transaction.on_commit(lambda: bump_generations(scopes))
+
+
+def etag_matches(request, etag):
+    """Weak comparison of ``etag`` with the request's ``If-None-Match``."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    opaque = etag.removeprefix('W/')
+    return any(tag == '*' or tag.removeprefix('W/') == opaque for tag in parse_etags(header))
+
+
+def get_list_key(name, scopes):
+    """Return the cache key and weak ETag of list ``name`` in its current state."""
+    generations = get_generations(scopes)
+    key = f'list:{name}:' + ':'.join(
+        f'{scope}={generation}' for scope, generation in zip(scopes, generations)
+    )
+    etag = f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+    return key, etag
+
+
+def cached_list_response(request, name, scopes, build):
+    """Respond with list ``name``, calling ``build`` on a cache miss.
+
+    ``build`` must return plain, picklable data such as serializer output,
+    or already rendered JSON as ``bytes``. The response carries a weak ETag
+    derived from the scope generations, and a request whose
+    ``If-None-Match`` still matches gets a 304.
+    """
+    key, etag = get_list_key(name, scopes)
+
+    if etag_matches(request, etag):
+        LIST_CACHE_REQUESTS.labels(name, 'not_modified').inc()
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        data = cache.get(key)
+        if data is not None:
+            LIST_CACHE_REQUESTS.labels(name, 'hit').inc()
+        else:
+            LIST_CACHE_REQUESTS.labels(name, 'miss').inc()
+            data = build()
+            cache.set(key, data, timeout=settings.LIST_CACHE_TIMEOUT)
+        if isinstance(data, bytes):
+            response = HttpResponse(data, content_type='application/json')
+        else:
+            response = Response(data)
+
+    response['ETag'] = etag
+    # Let browsers keep the body but revalidate it on every use
+    response['Cache-Control'] = 'private, no-cache'
+    return response
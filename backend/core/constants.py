@@ -6,4 +6,8 @@ APP_VERSION = "1.0.0"
 TOTP_ISSUER = APP_NAME
 VERIFICATION_TOKEN_LIFETIME = 5  # minutes
 ACCESS_TOKEN_LIFETIME = 60  # minutes
-REFRESH_TOKEN_LIFETIME = 7  # days 
\ No newline at end of file
+REFRESH_TOKEN_LIFETIME = 7  # days 
+
+# Outbox Retry Settings (KMS key purges, blob deletions)
+OUTBOX_RETRY_BASE_DELAY = 30  # seconds
+OUTBOX_RETRY_MAX_DELAY = 3600  # seconds
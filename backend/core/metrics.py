@@ -0,0 +1,234 @@
+"""
+Prometheus instrumentation for the Django backend.
+
+Metrics are recorded by ``MetricsMiddleware`` and exposed by ``metrics_view``
+at ``/metrics`` to requests carrying ``METRICS_TOKEN``. When ``PROMETHEUS_MULTIPROC_DIR`` is set, every worker
+process writes its samples to that directory and the view aggregates them,
+so the numbers are correct behind a multi-process server. Servers that
+recycle workers should call ``prometheus_client.multiprocess.mark_process_dead``
+when a worker exits so its in-flight gauge values are dropped.
+"""
+
+import hmac
+import os
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Views whose requests move file bodies and are tracked by the in-flight gauge
+TRANSFER_VIEWS = {
+    'upload_file', 'upload_files_batch', 'download_file', 'download_file_chunks',
+    'access_shared_file', 'access_shared_file_token',
+}
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+VIEW_LATENCY = Histogram(
+    'django_view_latency_seconds',
+    'Time spent handling a request, by view',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSES = Counter(
+    'django_responses_total',
+    'Responses sent, by view and status code',
+    ['view', 'status'],
+)
+REQUEST_BYTES = Counter(
+    'django_request_bytes_total',
+    'Request body bytes received, by view',
+    ['view'],
+)
+RESPONSE_BYTES = Counter(
+    'django_response_bytes_total',
+    'Response body bytes sent, by view',
+    ['view'],
+)
+DB_QUERIES = Histogram(
+    'django_db_queries_per_request',
+    'Number of database queries executed per request, by view',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+DB_QUERY_TIME = Histogram(
+    'django_db_query_seconds_per_request',
+    'Total database query time per request, by view',
+    ['view'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+TRANSFERS_IN_FLIGHT = Gauge(
+    'django_transfers_in_flight',
+    'Uploads and downloads currently being processed',
+    ['view'],
+    multiprocess_mode='livesum',
+)
+JWT_AUTH_FAILURES = Counter(
+    'django_jwt_auth_failures_total',
+    'Rejected JWT authentication attempts, by reason',
+    ['reason'],
+)
+EVENT_STREAMS_OPEN = Gauge(
+    'django_event_streams_open',
+    'Server-Sent Events connections currently open',
+    multiprocess_mode='livesum',
+)
+LIST_CACHE_REQUESTS = Counter(
+    'django_list_cache_requests_total',
+    'List responses looked up in the cache, by list and hit, miss or not_modified',
+    ['list', 'result'],
+)
+SHARE_LINKS_SWEPT = Counter(
+    'django_share_links_swept_total',
+    'Expired share links deleted by the sweeper',
+)
+JOBS_PROCESSED = Counter(
+    'django_jobs_processed_total',
+    'Background jobs run, by job type and done or failed',
+    ['name', 'result'],
+)
+JOB_SECONDS = Histogram(
+    'django_job_seconds',
+    'Time spent running a background job, by job type',
+    ['name'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+SHARE_LINK_SWEEP_BATCH_SECONDS = Histogram(
+    'django_share_link_sweep_batch_seconds',
+    'Time spent deleting one batch of expired share links',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+class JobQueueCollector:
+    """Report the number of background jobs per type and status when scraped."""
+
+    def describe(self):
+        # Describing without collecting keeps registration from querying
+        return [self.build()]
+
+    def collect(self):
+        from apps.jobs.queue import get_queue_depth
+
+        yield self.build(get_queue_depth())
+
+    def build(self, depth=None):
+        family = GaugeMetricFamily(
+            'django_job_queue_depth', 'Background jobs in the queue, by job type and status', labels=['name', 'status']
+        )
+        for (name, status), count in (depth or {}).items():
+            family.add_metric([name, status], count)
+        return family
+
+
+JOB_QUEUE_COLLECTOR = JobQueueCollector()
+REGISTRY.register(JOB_QUEUE_COLLECTOR)
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and the time spent in them."""
+
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Record latency, payload sizes and database usage for every request."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timer = QueryTimer()
+        request._metrics_transfer = None
+
+        with connections['default'].execute_wrapper(timer):
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else UNRESOLVED_VIEW
+
+        VIEW_LATENCY.labels(view, request.method).observe(time.perf_counter() - start)
+        RESPONSES.labels(view, response.status_code).inc()
+        DB_QUERIES.labels(view).observe(timer.count)
+        DB_QUERY_TIME.labels(view).observe(timer.duration)
+
+        request_bytes = int(request.META.get('CONTENT_LENGTH') or 0)
+        if request_bytes:
+            REQUEST_BYTES.labels(view).inc(request_bytes)
+        response_bytes = (
+            response.get('Content-Length')
+            if response.streaming else len(response.content)
+        )
+        if response_bytes:
+            RESPONSE_BYTES.labels(view).inc(int(response_bytes))
+
+        transfer = request._metrics_transfer
+        if transfer is not None:
+            if response.streaming:
+                # Streamed downloads are still in flight until the body has
+                # been sent and the server closes the response.
+                response._resource_closers.append(transfer.dec)
+            else:
+                transfer.dec()
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        if url_name in TRANSFER_VIEWS:
+            request._metrics_transfer = TRANSFERS_IN_FLIGHT.labels(url_name)
+            request._metrics_transfer.inc()
+        return None
+
+    def process_exception(self, request, exception):
+        # The response will be an error page, so stop counting the transfer
+        if request._metrics_transfer is not None:
+            request._metrics_transfer.dec()
+            request._metrics_transfer = None
+        return None
+
+
+def metrics_view(request):
+    """Expose metrics in the Prometheus text format to holders of ``METRICS_TOKEN``."""
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme != 'Bearer' or not token:
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return HttpResponse(status=403)
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(JOB_QUEUE_COLLECTOR)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,143 @@
+"""
+Publish/subscribe of change notifications to open event streams.
+
+Messages carry no payload: a publish on a channel only wakes the streams
+subscribed to it, which then read the new events from the change feed. That
+keeps live delivery and ``Last-Event-ID`` replay on the same code path, and
+lets many notifications for one stream collapse into a single read.
+
+``InProcessBroker`` only reaches streams served by the publishing process.
+With ``EVENTS_BROKER_URL`` set, ``RedisBroker`` relays publishes through
+Redis, so streams served by a separate ASGI process or another node are
+woken too. Each process holds one Redis subscription however many streams
+it serves.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from django.conf import settings
+
+CHANNEL_PREFIX = 'events:'
+ALL_USERS = 'all'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Wake-up flag for one stream, set from any thread."""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    def clear(self):
+        """Forget earlier notifications; call before reading the feed."""
+        self.event.clear()
+
+    async def wait(self, timeout):
+        """Return whether a notification arrived within ``timeout`` seconds."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def __aenter__(self):
+        await self.broker.add(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.broker.remove(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels):
+        return Subscription(self, channels)
+
+    async def add(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscriptions[channel].add(subscription)
+
+    def remove(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscriptions[channel].discard(subscription)
+                if not self.subscriptions[channel]:
+                    del self.subscriptions[channel]
+
+    def publish(self, channels):
+        self.dispatch(channels)
+
+    def dispatch(self, channels):
+        with self.lock:
+            subscriptions = set().union(*(self.subscriptions.get(channel, ()) for channel in channels))
+        for subscription in subscriptions:
+            subscription.notify()
+
+
+class RedisBroker(InProcessBroker):
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.client = None
+        self.listener = None
+
+    def publish(self, channels):
+        import redis
+
+        if self.client is None:
+            self.client = redis.Redis.from_url(self.url)
+        with self.client.pipeline(transaction=False) as pipeline:
+            for channel in channels:
+                pipeline.publish(CHANNEL_PREFIX + channel, b'')
+            pipeline.execute()
+
+    async def add(self, subscription):
+        await super().add(subscription)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        import redis
+        import redis.asyncio
+
+        while self.subscriptions:
+            client = redis.asyncio.Redis.from_url(self.url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                # Publishes may have been missed while disconnected
+                self.dispatch(list(self.subscriptions))
+                async for message in pubsub.listen():
+                    self.dispatch([message['channel'].decode().removeprefix(CHANNEL_PREFIX)])
+            except (OSError, redis.RedisError):
+                await asyncio.sleep(settings.EVENTS_BROKER_RETRY_DELAY)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            url = settings.EVENTS_BROKER_URL
+            _broker = RedisBroker(url) if url else InProcessBroker()
+        return _broker
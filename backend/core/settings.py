@@ -14,6 +14,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -67,9 +68,11 @@ INSTALLED_APPS = [
     # Local apps
     'apps.authentication.apps.AuthenticationConfig',
     'apps.files.apps.FilesConfig',
+    'apps.jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -107,11 +110,36 @@ WSGI_APPLICATION = 'core.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': '/data/db.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', '/data/db.sqlite3'),
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use Redis when REDIS_URL is set so all workers share one cache, otherwise
+# fall back to a per-process local-memory cache.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Upper bound on how long a cached list lives; lists are invalidated on writes
+LIST_CACHE_TIMEOUT = int(os.getenv('LIST_CACHE_TIMEOUT', 300))  # seconds
+# Rows fetched per database round trip by streamed listings (?stream=json|ndjson)
+LIST_STREAM_CHUNK_SIZE = 2000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -175,6 +203,7 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:5173",
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # Add to your existing settings
 AUTH_USER_MODEL = 'authentication.User'
@@ -182,3 +211,82 @@ AUTH_USER_MODEL = 'authentication.User'
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+DATA_UPLOAD_MAX_NUMBER_FILES = 500
+BATCH_UPLOAD_MAX_FILES = 500
+BULK_DELETE_MAX_FILES = 1000
+BULK_SHARE_MAX_PAIRS = 10000
+BLOB_DELETE_BATCH_SIZE = 500
+
+# Upload idempotency settings
+# Retries carrying the same Idempotency-Key within this window get the original file back
+UPLOAD_KEY_TTL = int(os.getenv('UPLOAD_KEY_TTL', 24 * 3600))  # seconds
+# A key still in progress after this long is assumed abandoned and may be taken over
+UPLOAD_KEY_PENDING_TIMEOUT = 600  # seconds
+UPLOAD_KEY_SWEEP_BATCH_SIZE = 1000
+
+# Share link settings
+SHARE_LINK_DEFAULT_TTL = int(os.getenv('SHARE_LINK_DEFAULT_TTL', 10))  # seconds
+SHARE_LINK_MAX_TTL = int(os.getenv('SHARE_LINK_MAX_TTL', 7 * 24 * 3600))  # seconds
+# Revocations of signed links reach other processes within this many seconds
+SHARE_LINK_REVOCATION_REFRESH = int(os.getenv('SHARE_LINK_REVOCATION_REFRESH', 30))
+# Expired links are kept this long so they still report as expired rather than missing
+SHARE_LINK_SWEEP_GRACE = int(os.getenv('SHARE_LINK_SWEEP_GRACE', 3600))  # seconds
+SHARE_LINK_SWEEP_BATCH_SIZE = 1000
+
+# Chunked blob settings
+CHUNK_SIZE_MIN = 16 * 1024  # bytes of plaintext per chunk
+CHUNK_SIZE_MAX = 16 * 1024 * 1024
+CHUNK_READ_BLOCK_SIZE = 64 * 1024  # bytes read from storage at a time when serving chunks
+
+# File search settings
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 200
+# Queries matching more names than this skip the name index
+SEARCH_INDEX_MAX_MATCHES = 2000
+
+# Change feed settings
+CHANGE_FEED_RETENTION = int(os.getenv('CHANGE_FEED_RETENTION', 7 * 24 * 3600))  # seconds
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_COMPACT_BATCH_SIZE = 5000
+
+# Storage quota settings
+# Per-user default; StorageUsage.quota_bytes overrides it for individual users
+STORAGE_QUOTA_BYTES = int(os.getenv('STORAGE_QUOTA_BYTES', 1024 ** 3))
+STORAGE_USAGE_REBUILD_CHUNK_SIZE = 1000
+
+# Admin statistics settings
+# Periods are rolled up this long after they end, once their writes have committed
+STATS_ROLLUP_SETTLE_DELAY = int(os.getenv('STATS_ROLLUP_SETTLE_DELAY', 300))  # seconds
+STATS_MAX_PERIODS = 24 * 31
+
+# Background job settings
+JOB_WORKER_THREADS = int(os.getenv('JOB_WORKER_THREADS', 4))
+JOB_CONCURRENCY = 4  # Default limit of running jobs per type, across all workers
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_DELAY = 10  # seconds, doubled after every failed attempt
+JOB_RETRY_MAX_DELAY = 3600  # seconds
+JOB_LEASE_TIMEOUT = 600  # seconds without a lease renewal before a job is assumed lost
+JOB_LEASE_RENEW_INTERVAL = 60  # seconds between lease renewals of a running job
+JOB_POLL_INTERVAL = 1  # seconds
+USER_DELETE_BATCH_SIZE = 500  # files deleted per transaction when removing a user
+
+# Event stream settings
+# Redis relays change notifications to the ASGI process serving the streams.
+# Streams only read the feed when notified, so without a broker they miss
+# writes made by other processes, such as the WSGI server.
+EVENTS_BROKER_URL = os.getenv('EVENTS_BROKER_URL', os.getenv('REDIS_URL'))
+EVENTS_BROKER_RETRY_DELAY = 1  # seconds
+EVENTS_HEARTBEAT_INTERVAL = int(os.getenv('EVENTS_HEARTBEAT_INTERVAL', 15))  # seconds
+EVENTS_RETRY_INTERVAL = 5  # seconds before an EventSource reconnects
+
+# Key Management Service settings
+KMS_URL = os.getenv('KMS_URL', 'http://kms:5001')
+KMS_API_TOKEN = os.getenv('KMS_API_TOKEN')  # No default, key purges refuse to run without it
+KMS_TIMEOUT = float(os.getenv('KMS_TIMEOUT', 5))  # seconds
+KMS_POOL_SIZE = int(os.getenv('KMS_POOL_SIZE', 10))
+KMS_DELETE_BATCH_SIZE = int(os.getenv('KMS_DELETE_BATCH_SIZE', 500))
+
+# Metrics settings
+METRICS_ENABLED = int(os.getenv('METRICS_ENABLED', 0))
+# Bearer token Prometheus sends to scrape /metrics, which is refused without one
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads.
+
+    ``rate`` tokens are added per second, up to a burst of ``rate``. Taking
+    more than a full bucket at once, like a large read against a bytes per
+    second budget, leaves the bucket in debt, which later callers wait out.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if not self.rate:
+            return
+        needed = min(amount, self.rate)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
@@ -9,5 +9,16 @@ rm -f /app/backend/db.sqlite3
 # Apply the existing, version-controlled migrations
 python /app/backend/manage.py migrate --noinput
 
+# Share Prometheus metrics between the server and background processes
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Run deferred work such as account deletions, and the periodic outbox
+# purges, sweeps, change feed compaction and activity rollups, in the background
+python /app/backend/manage.py run_jobs &
+
+# Serve the Server-Sent Events stream from the ASGI application
+uvicorn core.asgi:application --app-dir /app/backend --host 0.0.0.0 --port 8001 --no-access-log &
+
 # Start server
 python /app/backend/manage.py runserver 0.0.0.0:8000 
\ No newline at end of file
@@ -8,5 +8,9 @@ done
 
 >&2 echo "Postgres is up - executing command"
 
+# Aggregate Prometheus metrics across uvicorn worker processes
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Start the FastAPI application with the correct module path
 exec uvicorn src.main:app --host 0.0.0.0 --port 5001 --reload
\ No newline at end of file
@@ -2,15 +2,52 @@ import React, { useCallback, useState } from 'react';
 import { useDropzone } from 'react-dropzone';
 import { Box, Typography, LinearProgress, Button, Modal } from '@mui/material';
 import CloudUploadIcon from '@mui/icons-material/CloudUpload';
+import axios from 'axios';
 import api from '../../services/api';
 import toast from 'react-hot-toast';
-import { encryptFile, storeKeyForFile } from '../../utils/encryption';
+import { DEFAULT_CHUNK_SIZE, encryptFile, encryptFileChunked, storeKeyForFile } from '../../utils/encryption';
 import { Buffer } from 'buffer';
 import { FileType } from '../../types/file';
 import { validateFile } from '../../utils/validators';
 
+const UPLOAD_ATTEMPTS = 3;
+
+// Every attempt carries the same Idempotency-Key, so a retry after a lost
+// response gets the file stored by the first attempt instead of a duplicate
+const postUpload = async (formData: FormData) => {
+  const idempotencyKey = crypto.randomUUID();
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await api.post('/api/files/upload/', formData, {
+        headers: {
+          'Content-Type': 'multipart/form-data',
+          'Idempotency-Key': idempotencyKey,
+        }
+      });
+    } catch (error) {
+      // Retry when no response arrived or the first attempt is still running
+      const retryable = axios.isAxiosError(error) && (!error.response || error.response.status === 409);
+      if (!retryable || attempt >= UPLOAD_ATTEMPTS) {
+        throw error;
+      }
+      await new Promise((resolve) => setTimeout(resolve, attempt * 1000));
+    }
+  }
+};
+
+// Files larger than one chunk use the chunked format so they can be
+// decrypted piece by piece; chunkSize is null for single-message blobs
+const encryptForUpload = async (file: File) => {
+  const fileData = await file.arrayBuffer();
+  const chunked = fileData.byteLength > DEFAULT_CHUNK_SIZE;
+  const { encryptedData, iv, key } = chunked
+    ? await encryptFileChunked(fileData)
+    : await encryptFile(fileData);
+  return { encryptedData, iv, key, chunkSize: chunked ? DEFAULT_CHUNK_SIZE : null };
+};
+
 interface FileUploaderProps {
-  onUploadComplete: (file: FileType) => void;
+  onUploadComplete: (files: FileType[]) => void;
 }
 
 export const FileUploader: React.FC<FileUploaderProps> = ({ onUploadComplete }) => {
@@ -21,9 +58,71 @@ export const FileUploader: React.FC<FileUploaderProps> = ({ onUploadComplete })
   const handleOpen = () => setOpen(true);
   const handleClose = () => setOpen(false);
 
+  const uploadBatch = async (files: File[]) => {
+    const validFiles = files.filter((file) => {
+      const validation = validateFile(file);
+      if (!validation.isValid) {
+        toast.error(`${file.name}: ${validation.message}`);
+      }
+      return validation.isValid;
+    });
+    if (validFiles.length === 0) return;
+
+    setUploading(true);
+    setProgress(0);
+
+    try {
+      // Encrypt every file with its own key and IV
+      const encrypted = await Promise.all(validFiles.map(encryptForUpload));
+
+      const formData = new FormData();
+      validFiles.forEach((file, index) => {
+        const { encryptedData, iv, chunkSize } = encrypted[index];
+        formData.append('files', new File([encryptedData], file.name, { type: file.type }));
+        formData.append('ivs', Buffer.from(iv).toString('base64'));
+        // One entry per file, empty for single-message blobs
+        formData.append('chunk_sizes', chunkSize ? String(chunkSize) : '');
+      });
+
+      const response = await api.post('/api/files/upload/batch/', formData, {
+        headers: {
+          'Content-Type': 'multipart/form-data',
+        }
+      });
+
+      // Store the encryption key of every uploaded file in KMS
+      const results: { index: number; name: string; status: string; error?: string; file?: FileType }[] =
+        response.data.results;
+      const created = results.filter((result) => result.status === 'created' && result.file);
+      await Promise.all(
+        created.map((result) => storeKeyForFile(result.file!.id, encrypted[result.index].key))
+      );
+
+      results
+        .filter((result) => result.status === 'error')
+        .forEach((result) => toast.error(`${result.name}: ${result.error}`));
+      if (created.length > 0) {
+        toast.success(`${created.length} file${created.length > 1 ? 's' : ''} uploaded successfully`);
+        await onUploadComplete(created.map((result) => result.file!));
+      }
+      handleClose();
+    } catch (error) {
+      console.error('Upload failed:', error);
+      toast.error('Failed to upload files');
+    } finally {
+      setUploading(false);
+      setProgress(0);
+    }
+  };
+
   const onDrop = useCallback(async (acceptedFiles: File[]) => {
     if (acceptedFiles.length === 0) return;
 
+    if (acceptedFiles.length > 1) {
+      await uploadBatch(acceptedFiles);
+      return;
+    }
+
     const file = acceptedFiles[0];
     
     // Validate file before upload
@@ -38,21 +137,18 @@ export const FileUploader: React.FC<FileUploaderProps> = ({ onUploadComplete })
 
     try {
       // Encrypt file and get the key
-      const { encryptedData, iv, key } = await encryptFile(
-        await file.arrayBuffer()
-      );
+      const { encryptedData, iv, key, chunkSize } = await encryptForUpload(file);
 
       const encryptedFile = new File([encryptedData], file.name, { type: file.type });
       const formData = new FormData();
       formData.append('file', encryptedFile);
       formData.append('iv', Buffer.from(iv).toString('base64'));
+      if (chunkSize) {
+        formData.append('chunk_size', String(chunkSize));
+      }
 
       // Upload encrypted file
-      const response = await api.post('/api/files/upload/', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        }
-      });
+      const response = await postUpload(formData);
       
       // Store the encryption key in KMS after successful file upload
       await storeKeyForFile(response.data.id, key);
@@ -68,7 +164,7 @@ export const FileUploader: React.FC<FileUploaderProps> = ({ onUploadComplete })
         url: response.data.url,
         owner: response.data.owner
       };
-      await onUploadComplete(fileData);
+      await onUploadComplete([fileData]);
       handleClose();
     } catch (error) {
       console.error('Upload failed:', error);
@@ -81,7 +177,7 @@ export const FileUploader: React.FC<FileUploaderProps> = ({ onUploadComplete })
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     onDrop,
-    multiple: false
+    multiple: true
   });
 
   return (
@@ -148,7 +244,7 @@ export const FileUploader: React.FC<FileUploaderProps> = ({ onUploadComplete })
             <input {...getInputProps()} />
             <CloudUploadIcon sx={{ fontSize: 48, color: 'primary.main', mb: 1 }} />
             <Typography variant="h6" gutterBottom>
-              {isDragActive ? 'Drop the file here' : 'Drag & drop a file here, or click to select'}
+              {isDragActive ? 'Drop the files here' : 'Drag & drop files here, or click to select'}
             </Typography>
             <Typography variant="body2" color="text.secondary">
               Files are encrypted before uploading for security
@@ -1,10 +1,9 @@
 import FileViewerComponent from 'react-file-viewer';
 import { Box, CircularProgress, Modal, Typography, Button } from '@mui/material';
 import DownloadIcon from '@mui/icons-material/Download';
-import { decryptFile, getKeyFromKMS } from '../../utils/encryption';
+import { decryptDownloadedFile, getKeyFromKMS } from '../../utils/encryption';
 import { useState, useEffect } from 'react';
 import api from '../../services/api';
-import { Buffer } from 'buffer';
 import toast from 'react-hot-toast';
 
 interface FileViewerModalProps {
@@ -100,7 +99,7 @@ export const FileViewerModal = ({
       const metadata = await api.get(`/api/files/shared/${fileId}/`, {
         params: { metadata: true }
       });
-      const { iv, mime_type } = metadata.data;
+      const { mime_type } = metadata.data;
       setMimeType(mime_type);
       
       // Get the encryption key for the shared file
@@ -111,15 +110,9 @@ export const FileViewerModal = ({
         responseType: 'arraybuffer'
       });
       
-      const ivArray = new Uint8Array(Buffer.from(iv, 'base64'));
+      const decryptedData = await decryptDownloadedFile(response.data, metadata.data, key);
       
-      const decryptedData = await decryptFile({
-        encryptedData: response.data,
-        iv: ivArray,
-        key,
-      });
-      
-      const blob = new Blob([decryptedData]);
+      const blob = new Blob(decryptedData);
       const url = URL.createObjectURL(blob);
       setFileUrl(url);
       
@@ -146,7 +139,7 @@ export const FileViewerModal = ({
       const metadata = await api.get(`/api/files/${fileId}/download/`, {
         params: { metadata: true }
       });
-      const { iv, mime_type } = metadata.data;
+      const { mime_type } = metadata.data;
       setMimeType(mime_type);
       
       // Get the key from KMS
@@ -157,15 +150,9 @@ export const FileViewerModal = ({
         responseType: 'arraybuffer',
       });
       
-      const ivArray = new Uint8Array(Buffer.from(iv, 'base64'));
-      
-      const decryptedData = await decryptFile({
-        encryptedData: response.data,
-        iv: ivArray,
-        key,
-      });
+      const decryptedData = await decryptDownloadedFile(response.data, metadata.data, key);
       
-      const blob = new Blob([decryptedData]);
+      const blob = new Blob(decryptedData);
       const url = URL.createObjectURL(blob);
       
       setFileUrl(url);
@@ -118,4 +118,114 @@ export const importKey = async (keyData: string): Promise<CryptoKey> => {
 
 export const storeKeyForFile = async (fileId: string, key: CryptoKey): Promise<void> => {
   await storeKeyInKMS(fileId, key);
-};
\ No newline at end of file
+};
+
+// Chunked format: the plaintext is split into chunks of `chunkSize` bytes
+// (the last one may be shorter) and each chunk is encrypted on its own, so
+// any range of chunks can be fetched and decrypted without the rest of the
+// file. Chunk i uses the base IV with i XORed into its last four bytes, and
+// authenticates whether it is the final chunk so truncation is detected.
+export const TAG_SIZE = 16;
+export const DEFAULT_CHUNK_SIZE = 256 * 1024;
+
+export interface ChunkedEncryptionResult extends EncryptionResult {
+  chunkSize: number;
+  chunkCount: number;
+}
+
+export const deriveChunkIv = (baseIv: Uint8Array, index: number): Uint8Array => {
+  const iv = new Uint8Array(baseIv);
+  const view = new DataView(iv.buffer);
+  view.setUint32(iv.length - 4, view.getUint32(iv.length - 4) ^ index);
+  return iv;
+};
+
+const chunkAdditionalData = (isLast: boolean): Uint8Array => new Uint8Array([isLast ? 1 : 0]);
+
+export const encryptFileChunked = async (
+  fileData: ArrayBuffer,
+  chunkSize: number = DEFAULT_CHUNK_SIZE,
+): Promise<ChunkedEncryptionResult> => {
+  const iv = window.crypto.getRandomValues(new Uint8Array(12));
+  const key = await generateEncryptionKey();
+  const chunkCount = Math.max(Math.ceil(fileData.byteLength / chunkSize), 1);
+  const encryptedData = new Uint8Array(fileData.byteLength + chunkCount * TAG_SIZE);
+
+  for (let index = 0; index < chunkCount; index++) {
+    const chunk = fileData.slice(index * chunkSize, (index + 1) * chunkSize);
+    const encryptedChunk = await window.crypto.subtle.encrypt(
+      {
+        name: 'AES-GCM',
+        iv: deriveChunkIv(iv, index),
+        additionalData: chunkAdditionalData(index === chunkCount - 1),
+      },
+      key,
+      chunk
+    );
+    encryptedData.set(new Uint8Array(encryptedChunk), index * (chunkSize + TAG_SIZE));
+  }
+
+  return { encryptedData: encryptedData.buffer, iv, key, chunkSize, chunkCount };
+};
+
+export interface ChunkRangeParams {
+  encryptedData: ArrayBuffer; // Ciphertext of chunks `first` to `first + n - 1`, as served by the chunks endpoint
+  iv: Uint8Array;
+  key: CryptoKey;
+  chunkSize: number;
+  chunkCount: number;
+  first: number;
+}
+
+// Decrypt a contiguous range of chunks, e.g. one fetched with
+// `/api/files/<id>/chunks/?chunks=first-last`
+export const decryptChunkRange = async ({
+  encryptedData,
+  iv,
+  key,
+  chunkSize,
+  chunkCount,
+  first,
+}: ChunkRangeParams): Promise<ArrayBuffer[]> => {
+  const stride = chunkSize + TAG_SIZE;
+  const chunks: ArrayBuffer[] = [];
+  for (let offset = 0, index = first; offset < encryptedData.byteLength; offset += stride, index++) {
+    chunks.push(await window.crypto.subtle.decrypt(
+      {
+        name: 'AES-GCM',
+        iv: deriveChunkIv(iv, index),
+        additionalData: chunkAdditionalData(index === chunkCount - 1),
+      },
+      key,
+      encryptedData.slice(offset, offset + stride)
+    ));
+  }
+  return chunks;
+};
+
+export interface EncryptionMetadata {
+  iv: string; // base64
+  chunk_size?: number | null;
+  chunk_count?: number | null;
+}
+
+// Decrypt a whole downloaded blob in either format, as described by the
+// metadata the download and share link endpoints return
+export const decryptDownloadedFile = async (
+  encryptedData: ArrayBuffer,
+  { iv, chunk_size, chunk_count }: EncryptionMetadata,
+  key: CryptoKey,
+): Promise<ArrayBuffer[]> => {
+  const ivArray = new Uint8Array(Buffer.from(iv, 'base64'));
+  if (!chunk_size || !chunk_count) {
+    return [await decryptFile({ encryptedData, iv: ivArray, key })];
+  }
+  return decryptChunkRange({
+    encryptedData,
+    iv: ivArray,
+    key,
+    chunkSize: chunk_size,
+    chunkCount: chunk_count,
+    first: 0,
+  });
+};
@@ -1,6 +1,7 @@
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import os
 import base64
+from .metrics import CRYPTO_LATENCY
 
 # Load master key from environment variable
 MASTER_KEY = os.environ.get('KMS_MASTER_KEY')
@@ -11,12 +12,14 @@ if not MASTER_KEY:
 master_key_bytes = base64.b64decode(MASTER_KEY)
 aes_gcm = AESGCM(master_key_bytes)
 
+@CRYPTO_LATENCY.labels('encrypt').time()
 def encrypt_key(key_data: bytes) -> tuple[bytes, bytes]:
     """Encrypt a key using the master key"""
     nonce = os.urandom(12)
     encrypted_key = aes_gcm.encrypt(nonce, key_data, None)
     return encrypted_key, nonce
 
+@CRYPTO_LATENCY.labels('decrypt').time()
 def decrypt_key(encrypted_key: bytes, nonce: bytes) -> bytes:
     """Decrypt a key using the master key"""
     return aes_gcm.decrypt(nonce, encrypted_key, None) 
\ No newline at end of file
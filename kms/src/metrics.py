@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+# When PROMETHEUS_MULTIPROC_DIR is set every uvicorn worker writes its samples
+# to that directory and /metrics aggregates them across workers.
+
+REQUEST_LATENCY = Histogram(
+    'kms_request_latency_seconds',
+    'Time spent handling a request, by route',
+    ['route', 'method'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+RESPONSES = Counter(
+    'kms_responses_total',
+    'Responses sent, by route and status code',
+    ['route', 'status'],
+)
+DB_QUERY_LATENCY = Histogram(
+    'kms_db_query_seconds',
+    'Time spent executing database statements, by statement type',
+    ['statement'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+CRYPTO_LATENCY = Histogram(
+    'kms_crypto_seconds',
+    'Time spent wrapping and unwrapping keys with the master key',
+    ['operation'],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'kms_db_pool_checked_out',
+    'Database connections currently checked out of the pool',
+    multiprocess_mode='livesum',
+)
+DB_POOL_CAPACITY = Gauge(
+    'kms_db_pool_capacity',
+    'Maximum number of connections the pool will open',
+    multiprocess_mode='livesum',
+)
+EVENT_LOOP_LAG = Histogram(
+    'kms_event_loop_lag_seconds',
+    'Delay between when a loop callback was due and when it ran',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+EVENT_LOOP_PROBE_INTERVAL = 0.5  # seconds
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Record latency and status code for every request"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The router stores the matched route in the scope during dispatch
+        route = request.scope.get('route')
+        path = route.path if route is not None else UNMATCHED_ROUTE
+        REQUEST_LATENCY.labels(path, request.method).observe(time.perf_counter() - start)
+        RESPONSES.labels(path, status).inc()
+
+
+def instrument_engine(engine, max_overflow=0):
+    """Attach query timing and pool utilization listeners to an engine
+
+    ``max_overflow`` is the one the engine was created with, which the pool
+    doesn't expose.
+    """
+    pool = engine.pool
+    if hasattr(pool, 'size'):
+        DB_POOL_CAPACITY.set(pool.size() + max(max_overflow, 0))
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start'].pop()
+        DB_QUERY_LATENCY.labels(statement.split(None, 1)[0].upper()).observe(duration)
+
+    @event.listens_for(pool, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(pool, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_PROBE_INTERVAL):
+    """Periodically measure how late the event loop wakes up a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - expected, 0))
+
+
+def metrics_endpoint():
+    """Expose metrics in the Prometheus text format"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
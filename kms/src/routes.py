@@ -1,15 +1,21 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from sqlalchemy.orm import Session
 import base64
+import hmac
 import os
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 from .database import get_db
 from .models import KeyEntry
 from .crypto import encrypt_key, decrypt_key
 
 router = APIRouter()
 
+# Shared secret of the backend, the only caller allowed to delete keys
+SERVICE_TOKEN = os.getenv("KMS_API_TOKEN")
+if not SERVICE_TOKEN:
+    raise ValueError("Service token not configured!")
+
 # Add Pydantic model for the request
 class KeyRequest(BaseModel):
     encryption_key: str
@@ -18,6 +24,19 @@ class KeyCopyRequest(BaseModel):
     copy_from_file_id: str
     copy_to_file_id: str
 
+class KeyDeleteRequest(BaseModel):
+    file_ids: List[str] = Field(..., max_length=1000)
+
+def verify_service_token(authorization: str = Header(None)):
+    """Reject requests that don't carry the backend's service token."""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="No authorization token provided")
+    scheme, _, token = authorization.partition(" ")
+    if scheme != "Bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    if not hmac.compare_digest(token.encode(), SERVICE_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
 @router.post("/keys/{file_id}")
 async def store_key(
     file_id: str,
@@ -53,7 +72,7 @@ async def store_key(
         db.add(key_entry)
         db.commit()
         return {"status": "success"}
-    except Exception as e:
+    except Exception:
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to store key")
 
@@ -89,7 +108,7 @@ async def get_key(
         
         decrypted_key = decrypt_key(encrypted_key, nonce)
         return {"encryption_key": base64.b64encode(decrypted_key).decode()}
-    except Exception as e:
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to decrypt key")
 
 @router.post("/copy")
@@ -123,10 +142,55 @@ async def copy_key(
         db.add(new_key_entry)
         db.commit()
         return {"status": "success"}
-    except Exception as e:
+    except Exception:
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to copy key")
 
+@router.delete("/keys/{file_id}")
+async def delete_key(
+    file_id: str,
+    db: Session = Depends(get_db),
+    _: None = Depends(verify_service_token)
+):
+    """Delete the encryption key for a file"""
+    try:
+        deleted = db.query(KeyEntry).filter(KeyEntry.file_id == file_id).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to delete key")
+    
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Key not found")
+    return {"status": "success"}
+
+@router.post("/delete")
+async def delete_keys(
+    key_delete: KeyDeleteRequest,
+    db: Session = Depends(get_db),
+    _: None = Depends(verify_service_token)
+):
+    """Delete the encryption keys for a batch of files.
+
+    Deleting a key that does not exist is not an error, so callers can safely
+    retry a batch; those ids are reported back under ``not_found``.
+    """
+    file_ids = list(dict.fromkeys(key_delete.file_ids))
+    try:
+        query = db.query(KeyEntry).filter(KeyEntry.file_id.in_(file_ids))
+        existing = {file_id for (file_id,) in query.with_entities(KeyEntry.file_id)}
+        query.delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to delete keys")
+    
+    return {
+        "status": "success",
+        "deleted": [file_id for file_id in file_ids if file_id in existing],
+        "not_found": [file_id for file_id in file_ids if file_id not in existing],
+    }
+
 def verify_auth(auth_token: str, file_id: str) -> bool:
     """Verify the authentication token and user's permission to access the file"""
     # TODO: Implement authentication verification
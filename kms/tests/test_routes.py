@@ -0,0 +1,57 @@
+import base64
+import os
+import tempfile
+import unittest
+
+# The KMS reads its configuration at import time
+_data_dir = tempfile.TemporaryDirectory()
+os.environ.setdefault("KMS_MASTER_KEY", base64.b64encode(os.urandom(32)).decode())
+os.environ["DATABASE_URL"] = f"sqlite:///{_data_dir.name}/kms.db"
+os.environ["KMS_API_TOKEN"] = "service-token"
+
+from fastapi.testclient import TestClient
+from src.main import app
+from src.database import SessionLocal
+from src.models import KeyEntry
+
+
+class KeyDeletionTests(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        key = base64.b64encode(os.urandom(32)).decode()
+        for file_id in ("a", "b"):
+            response = self.client.post(
+                f"/keys/{file_id}", json={"encryption_key": key}, headers={"Authorization": "Bearer user-token"}
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def tearDown(self):
+        with SessionLocal() as db:
+            db.query(KeyEntry).delete()
+            db.commit()
+
+    def remaining_keys(self):
+        with SessionLocal() as db:
+            return sorted(file_id for (file_id,) in db.query(KeyEntry.file_id))
+
+    def test_delete_requires_the_service_token(self):
+        for headers, status in [
+            ({}, 401),
+            ({"Authorization": "Bearer"}, 401),
+            ({"Authorization": "Bearer user-token"}, 403),
+        ]:
+            self.assertEqual(self.client.delete("/keys/a", headers=headers).status_code, status)
+            response = self.client.post("/delete", json={"file_ids": ["a", "b"]}, headers=headers)
+            self.assertEqual(response.status_code, status)
+        self.assertEqual(self.remaining_keys(), ["a", "b"])
+
+    def test_delete_with_the_service_token(self):
+        headers = {"Authorization": "Bearer service-token"}
+        self.assertEqual(self.client.delete("/keys/a", headers=headers).status_code, 200)
+        response = self.client.post("/delete", json={"file_ids": ["a", "b"]}, headers=headers)
+        self.assertEqual(response.json()["not_found"], ["a"])
+        self.assertEqual(self.remaining_keys(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()